@@ -0,0 +1,320 @@
+"""Banco de pruebas de rendimiento con un inventario sintético.
+
+Genera una base de datos reproducible (misma semilla, mismos datos) y mide
+las rutas reales de la aplicación sin abrir ventanas: las mismas llamadas a
+InventarioDB que hacen load_products, search_products, load_movements y
+add_product, y las exportaciones a CSV y PDF. Los resultados se guardan en
+JSON para comparar versiones.
+
+    python benchmark.py --size medium --output antes.json
+    python benchmark.py --size medium --output despues.json --compare antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from inventario_core import (
+    InventarioDB, export_products_csv, suspend_search_index, create_search_index, schema_version,
+)
+
+# Tamaños predefinidos: (productos, movimientos)
+SIZES = {
+    'small': (1000, 10000),
+    'medium': (100000, 1000000),
+    'large': (1000000, 10000000),
+}
+
+GENERATE_BATCH = 50000
+# Filas que pide la lista virtual al abrir: visibles más el margen de PAGE_BUFFER
+FIRST_PAGE = 130
+ANCHOR_STEP = 500  # el mismo paso que usa la lista virtual
+SEARCH_TERMS = ['tornillo', 'acero 12', 'azul', 'P0000123', 'xyz-no-existe']
+
+WORDS = [
+    'tornillo', 'tuerca', 'arandela', 'clavo', 'martillo', 'llave', 'cable', 'tubo',
+    'codo', 'valvula', 'cinta', 'pintura', 'brocha', 'lija', 'broca', 'taladro',
+]
+ADJECTIVES = ['acero', 'cobre', 'plastico', 'galvanizado', 'rojo', 'azul', 'negro', 'blanco']
+
+# ----------------------------
+# Generador de datos
+# ----------------------------
+def generate(db_file, products, movements, categories=50, seed=1, progress=None):
+    """Crea una base de datos sintética; con la misma semilla los datos son idénticos"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+    rng = random.Random(seed)
+    db = InventarioDB(db_file)
+    # Igual que en la importación masiva: el índice de búsqueda se regenera al final
+    suspend_search_index(db.conn)
+
+    with db.transaction():
+        db.conn.executemany(
+            "INSERT INTO categorias (id, nombre) VALUES (?, ?)",
+            ((i, f"Categoría {i:03d}") for i in range(1, categories + 1))
+        )
+
+    inicio = datetime(2025, 1, 1)
+    for start in range(0, products, GENERATE_BATCH):
+        rows = []
+        for i in range(start, min(start + GENERATE_BATCH, products)):
+            nombre = f"{rng.choice(WORDS)} {rng.choice(ADJECTIVES)} {rng.randint(1, 50)}"
+            fecha = inicio + timedelta(seconds=rng.randint(0, 365 * 86400))
+            rows.append((i + 1, f"P{i + 1:08d}", nombre, round(rng.uniform(0.5, 500), 2),
+                         rng.randint(0, 1000), rng.randint(1, categories),
+                         fecha.strftime('%Y-%m-%d %H:%M:%S')))
+        with db.transaction():
+            db.conn.executemany(
+                "INSERT INTO productos (id, codigo, nombre, precio, stock, categoria_id, fecha_creacion) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        if progress:
+            progress('productos', start + len(rows), products)
+
+    for start in range(0, movements, GENERATE_BATCH):
+        rows = []
+        for _ in range(min(GENERATE_BATCH, movements - start)):
+            fecha = inicio + timedelta(seconds=rng.randint(0, 365 * 86400))
+            rows.append((rng.randint(1, products), 'entrada' if rng.random() < 0.6 else 'salida',
+                         rng.randint(1, 50), fecha.strftime('%Y-%m-%d %H:%M:%S')))
+        with db.transaction():
+            db.conn.executemany(
+                "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, ?, ?, ?)", rows
+            )
+        if progress:
+            progress('movimientos', start + len(rows), movements)
+
+    create_search_index(db.conn)
+    db.execute("ANALYZE")
+    db.conn.commit()
+    db.close()
+
+def ensure_database(db_file, products, movements, seed, regenerate=False, progress=None):
+    """Reutiliza la base generada si coinciden los parámetros; devuelve los segundos de generación"""
+    params = {'products': products, 'movements': movements, 'seed': seed}
+    meta_file = db_file + '.json'
+    if not regenerate and os.path.exists(db_file) and os.path.exists(meta_file):
+        with open(meta_file, encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta.get('params') == params:
+            return meta['seconds']
+
+    inicio = time.perf_counter()
+    generate(db_file, products, movements, seed=seed, progress=progress)
+    seconds = time.perf_counter() - inicio
+    with open(meta_file, 'w', encoding='utf-8') as file:
+        json.dump({'params': params, 'seconds': seconds}, file)
+    return seconds
+
+# ----------------------------
+# Mediciones
+# ----------------------------
+def measure(func, repeat):
+    """Ejecuta ``func`` ``repeat`` veces y devuelve estadísticas en milisegundos"""
+    times = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'repeat': repeat,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.fmean(times), 3),
+        'max_ms': round(max(times), 3),
+    }
+
+def build_benchmarks(db, workdir, products):
+    """Devuelve (nombre, función, repeticiones) para cada ruta medida"""
+    rng = random.Random(2)
+
+    def load_products():
+        # Lo que hace la lista virtual al abrir: recuento y primera ventana
+        db.count_products()
+        db.fetch_products_page(None, FIRST_PAGE)
+
+    anchors = {}
+
+    def scroll_anchors():
+        # Claves cada ANCHOR_STEP filas, que la lista calcula en el primer salto largo
+        anchors.clear()
+        anchors[0] = None
+        for i, key in enumerate(db.product_anchor_keys(ANCHOR_STEP)):
+            anchors[(i + 1) * ANCHOR_STEP] = key
+
+    def scroll_jump():
+        # Arrastrar el scrollbar a una posición al azar, como VirtualList._jump
+        if not anchors:
+            scroll_anchors()
+        target = rng.randrange(max(1, products))
+        nearest = target - target % ANCHOR_STEP
+        db.fetch_products_page(anchors.get(nearest), FIRST_PAGE, target - nearest)
+
+    def search_products():
+        for term in SEARCH_TERMS:
+            ids = db.search_product_ids(term)
+            db.fetch_products_by_ids(list(ids[:FIRST_PAGE]))
+
+    def load_movements():
+        db.fetch_movements_page()
+
+    def load_movements_filtered():
+        db.fetch_movements_page(tipo='salida', desde='2025-03-01', hasta='2025-03-31')
+
+    def load_movements_deep():
+        # Desplazarse 50 páginas hacia atrás en el historial
+        before = None
+        for _ in range(50):
+            rows = db.fetch_movements_page(before)
+            if not rows:
+                break
+            before = (rows[-1][4], rows[-1][0])
+
+    def load_summary():
+        # Panel de resumen: lee las tablas que mantienen los triggers
+        db.inventory_summary()
+        db.category_summary()
+
+    counter = iter(range(10 ** 9))
+
+    def add_product():
+        # Alta, edición y baja para dejar la base como estaba
+        n = next(counter)
+        row = db.insert_product(f"BENCH{n:08d}", f"producto de prueba {n}", 10.0, 5, "Categoría 001")
+        db.update_product(row[0], row[1], row[2], 12.5, 8, "Categoría 002")
+        db.delete_product(row[0])
+
+    def export_csv():
+        export_products_csv(db, os.path.join(workdir, 'productos.csv'))
+
+    def export_pdf():
+        from reportes import InventoryReport
+        InventoryReport(db).build(os.path.join(workdir, 'productos.pdf'))
+
+    return [
+        ('load_products', load_products, 20),
+        ('scroll_anchors', scroll_anchors, 5),
+        ('scroll_jump', scroll_jump, 20),
+        ('search_products', search_products, 10),
+        ('load_movements', load_movements, 20),
+        ('load_movements_filtered', load_movements_filtered, 20),
+        ('load_movements_deep', load_movements_deep, 5),
+        ('load_summary', load_summary, 50),
+        ('add_product', add_product, 50),
+        ('export_csv', export_csv, 1),
+        ('export_pdf', export_pdf, 1),
+    ]
+
+def run(db_file, products, only=None, skip=(), repeat_scale=1.0, log=print):
+    db = InventarioDB(db_file)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for nombre, func, repeat in build_benchmarks(db, workdir, products):
+                if (only and nombre not in only) or nombre in skip:
+                    continue
+                try:
+                    results[nombre] = measure(func, max(1, round(repeat * repeat_scale)))
+                except ImportError as e:  # fpdf no instalado
+                    results[nombre] = {'skipped': str(e)}
+                log(f"{nombre:26} {json.dumps(results[nombre])}")
+    finally:
+        db.close()
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(results, baseline):
+    """Imprime la variación de la mediana respecto a un resultado anterior"""
+    print(f"\n{'operación':26} {'antes ms':>10} {'ahora ms':>10} {'cambio':>8}", file=sys.stderr)
+    for nombre, actual in results.items():
+        anterior = baseline.get('results', {}).get(nombre)
+        if not anterior or 'median_ms' not in anterior or 'median_ms' not in actual:
+            continue
+        cambio = (actual['median_ms'] / anterior['median_ms'] - 1) * 100 if anterior['median_ms'] else 0.0
+        print(f"{nombre:26} {anterior['median_ms']:10.2f} {actual['median_ms']:10.2f} {cambio:+7.1f}%", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el rendimiento con un inventario sintético")
+    parser.add_argument("--size", choices=list(SIZES), default='small', help="tamaño predefinido")
+    parser.add_argument("--products", type=int, help="cantidad de productos (reemplaza --size)")
+    parser.add_argument("--movements", type=int, help="cantidad de movimientos (reemplaza --size)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="base de datos generada (por defecto bench_<productos>.db)")
+    parser.add_argument("--regenerate", action="store_true", help="vuelve a generar aunque ya exista")
+    parser.add_argument("--only", nargs="*", help="mide solo estas operaciones")
+    parser.add_argument("--skip", nargs="*", default=[], help="omite estas operaciones")
+    parser.add_argument("--repeat-scale", type=float, default=1.0, help="multiplica las repeticiones")
+    parser.add_argument("--output", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    products, movements = SIZES[args.size]
+    products = args.products if args.products is not None else products
+    movements = args.movements if args.movements is not None else movements
+    db_file = args.db or f"bench_{products}.db"
+
+    def progress(tabla, done, total):
+        sys.stderr.write(f"\rGenerando {tabla}: {done}/{total}   ")
+        if done == total:
+            sys.stderr.write("\n")
+
+    log = lambda line: print(line, file=sys.stderr)
+    generated = ensure_database(db_file, products, movements, args.seed, args.regenerate, progress)
+    results = run(db_file, products, args.only, args.skip, args.repeat_scale, log)
+
+    conn = sqlite3.connect(db_file)
+    data = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'dataset': {
+            'products': products,
+            'movements': movements,
+            'seed': args.seed,
+            'schema_version': schema_version(conn),
+            'db_bytes': os.path.getsize(db_file),
+            'generate_seconds': round(generated, 2),
+        },
+        'results': results,
+    }
+    conn.close()
+
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare(results, json.load(file))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Caché en disco de los reportes exportados (CSV y PDF).
+
+El mismo reporte se exporta muchas veces al día aunque el inventario no
+haya cambiado. Cada reporte generado se guarda con una clave formada por
+el tipo de reporte, sus parámetros (búsqueda, compresión), la base de
+datos de origen y los contadores de cambios que mantienen los triggers
+(tabla ``contadores``). Si al pedirlo otra vez los contadores siguen
+iguales, se copia el archivo guardado en lugar de volver a generarlo.
+Los contadores se leen antes de generar: si algo cambia mientras tanto,
+el reporte queda guardado con la clave anterior y no se vuelve a usar.
+
+La carpeta tiene un tamaño máximo; al pasarlo se borran los reportes
+usados hace más tiempo (cada uso actualiza la fecha del archivo). Un PDF
+servido desde la caché conserva la fecha de generación original, que es
+también la de sus datos.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+REPORT_CACHE_DIR = 'cache_reportes'
+REPORT_CACHE_MAX_MB = 200
+REPORT_CACHE_VERSION = 1  # se incrementa si cambia el contenido de algún reporte
+CACHED_NOTE = " (sin cambios en la base: copiado de la caché de reportes)"
+
+# Contadores de los que depende cada tipo de reporte
+REPORT_COUNTERS = {
+    'csv': ('productos', 'categorias'),
+    'pdf': ('productos', 'categorias'),
+}
+
+def report_cache_dir(db):
+    """Carpeta 'cache_reportes' junto a la base; contra un servidor, en la carpeta actual"""
+    if db.db_file is None:
+        return REPORT_CACHE_DIR
+    return os.path.join(os.path.dirname(os.path.abspath(db.db_file)), REPORT_CACHE_DIR)
+
+class ReportCache:
+    """Reportes guardados en ``folder``: ``<clave>.<ext>`` y sus datos en ``<clave>.json``"""
+
+    def __init__(self, folder=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MAX_MB * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def key(self, kind, source, params, counters):
+        text = json.dumps([REPORT_CACHE_VERSION, kind, source, params, counters], sort_keys=True)
+        return f"{kind}-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]}"
+
+    def _paths(self, key, ext):
+        return os.path.join(self.folder, key + ext), os.path.join(self.folder, key + '.json')
+
+    def get(self, key, ext, file_path):
+        """Copia el reporte guardado en ``file_path`` y devuelve sus datos, o None si no está"""
+        path, meta = self._paths(key, ext)
+        try:
+            with open(meta, encoding='utf-8') as file:
+                result = json.load(file)
+            _copy(path, file_path)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # uso más reciente: es lo último que se borra
+        return result
+
+    def put(self, key, ext, file_path, result):
+        """Guarda una copia del reporte recién generado y aplica el tamaño máximo"""
+        if os.path.getsize(file_path) > self.max_bytes:
+            return False
+        os.makedirs(self.folder, exist_ok=True)
+        path, meta = self._paths(key, ext)
+        _copy(file_path, path)
+        with open(meta, 'w', encoding='utf-8') as file:
+            json.dump(result, file)
+        self.evict()
+        return True
+
+    def entries(self):
+        """(fecha de uso, bytes, rutas) de cada reporte guardado"""
+        entries = []
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            base, ext = name.split('.', 1) if '.' in name else (name, '')
+            if ext in ('json', '') or name.endswith('.part'):
+                continue
+            path = os.path.join(self.folder, name)
+            meta = os.path.join(self.folder, base + '.json')
+            try:
+                stat = os.stat(path)
+                size = stat.st_size + (os.path.getsize(meta) if os.path.exists(meta) else 0)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, (path, meta)))
+        return entries
+
+    def evict(self):
+        """Borra los reportes usados hace más tiempo hasta quedar bajo el máximo"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, paths in entries:
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, paths in self.entries():
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+def _copy(source, target):
+    """Copia a un temporal junto al destino y lo renombra: nunca queda un archivo a medias"""
+    part = f"{target}.{os.getpid()}-{threading.get_ident()}.part"
+    try:
+        shutil.copyfile(source, part)
+        os.replace(part, target)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+def _extension(file_path):
+    return '.csv.gz' if file_path.endswith('.csv.gz') else os.path.splitext(file_path)[1] or '.dat'
+
+def cached_report(cache, db, kind, params, file_path, build, refresh=False, warn=None):
+    """Genera un reporte con ``build(file_path)`` o lo copia de la caché si la base no cambió.
+
+    ``build`` devuelve los datos del reporte (filas, páginas...) que se
+    guardan junto al archivo, o None si se canceló. Devuelve (datos,
+    servido_desde_caché). Con ``cache`` None siempre se genera; con
+    ``refresh`` se genera igual pero se guarda para la próxima vez. Si no
+    se puede guardar en la caché el reporte igual se entrega: el aviso va a
+    ``warn(mensaje)`` o, sin ella, a stderr.
+    """
+    if cache is None:
+        return build(file_path), False
+    counters = db.change_counters()
+    source = os.path.abspath(db.db_file) if db.db_file else db.url  # RemoteDB no tiene archivo
+    key = cache.key(kind, source, params, {name: counters.get(name) for name in REPORT_COUNTERS[kind]})
+    ext = _extension(file_path)
+
+    result = None if refresh else cache.get(key, ext, file_path)
+    if result is not None:
+        return result, True
+    result = build(file_path)
+    if result is not None:
+        try:
+            cache.put(key, ext, file_path, result)
+        except OSError as e:
+            message = f"No se pudo guardar el reporte en la caché: {e}"
+            if warn:
+                warn(message)
+            else:
+                print(message, file=sys.stderr)
+    return result, False
@@ -0,0 +1,399 @@
+"""Línea de comandos del inventario para tareas programadas (cron, servidores).
+
+Solo carga inventario_core, sin tkinter; fpdf se importa únicamente para
+el subcomando ``reporte``.
+
+    python cli.py importar productos.csv --errores errores.csv
+    python cli.py exportar inventario.csv.gz --buscar tornillo
+    python cli.py reporte inventario.pdf --orden=-precio
+    python cli.py stock --maximo 5
+    python cli.py movimientos recepcion.csv --tipo entrada
+    python cli.py resumen --categorias
+    python cli.py archivar --meses 12 --compactar
+    python cli.py mensual P-001 --desde 2024-01
+    python cli.py minimo 20 --categoria Tornillos
+    python cli.py reponer reponer.csv
+    python cli.py respaldar --conservar 14
+    python cli.py verificar respaldos/inventario-20250131-183000.db.gz --completo
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+from datetime import date
+from sqlite3 import Error
+
+from inventario_core import (
+    InventarioDB, QueryMonitor, MovementBatchError, DB_FILE, MOVEMENT_KINDS, PRODUCT_HEADERS, PRODUCT_SORTS,
+    ALERT_HEADERS,
+    archive_movements, export_products_csv, export_stock_alerts_csv, import_products, read_movement_sheet,
+)
+from respaldos import BACKUP_DIR, BACKUP_KEEP, backup_database, restore_backup, verify_backup
+from cache_reportes import CACHED_NOTE, ReportCache, cached_report, report_cache_dir
+
+def print_progress(done, total=None):
+    if total:
+        sys.stderr.write(f"\r{done}/{total}")
+    else:
+        sys.stderr.write(f"\r{done}")
+    sys.stderr.flush()
+
+def cmd_import(db, args):
+    report = import_products(
+        db, args.archivo,
+        create_categories=not args.sin_categorias_nuevas,
+        progress=print_progress if args.progreso else None,
+        batch=args.lote,
+    )
+    if args.progreso:
+        sys.stderr.write("\n")
+    print(report.summary())
+    if report.errors:
+        if args.errores:
+            report.write_errors(args.errores)
+            print(f"Errores guardados en {args.errores}")
+        else:
+            for line, message in report.errors[:20]:
+                print(f"  línea {line}: {message}", file=sys.stderr)
+        return 1
+    return 0
+
+def cmd_export(db, args):
+    compress = args.gzip or args.archivo.endswith('.gz')
+    written, cached = cached_report(
+        ReportCache(report_cache_dir(db)), db, 'csv', {'buscar': args.buscar, 'gzip': compress, 'orden': args.orden},
+        args.archivo,
+        lambda path: export_products_csv(db, path, search=args.buscar, compress=compress,
+                                         progress=print_progress if args.progreso else None, sort=args.orden),
+        refresh=args.sin_cache,
+    )
+    if args.progreso and not cached:
+        sys.stderr.write("\n")
+    print(f"{written} productos exportados a {args.archivo}" + (CACHED_NOTE if cached else ""))
+    return 0
+
+def cmd_report(db, args):
+    from reportes import InventoryReport  # fpdf solo se carga para este subcomando
+
+    report = InventoryReport(db, search=args.buscar, workers=args.procesos, sort=args.orden)
+    stats, cached = cached_report(
+        ReportCache(report_cache_dir(db)), db, 'pdf', {'buscar': args.buscar, 'orden': args.orden}, args.archivo,
+        lambda path: report.build(path, progress=print_progress if args.progreso else None),
+        refresh=args.sin_cache,
+    )
+    if cached:
+        print(f"{stats['pages']} páginas, {stats['rows']} productos{CACHED_NOTE}")
+        return 0
+    if args.progreso:
+        sys.stderr.write("\n")
+    print(f"{stats['pages']} páginas, {stats['rows']} productos en {stats['seconds']:.1f} s "
+          f"({stats['pages_per_second']:.0f} páginas/s)")
+    return 0
+
+def cmd_stock(db, args):
+    writer = csv.writer(sys.stdout, delimiter='\t' if args.formato == 'tabla' else ',')
+    writer.writerow(PRODUCT_HEADERS[:5])
+
+    if args.codigos:
+        found = 0
+        for codigo in args.codigos:
+            producto_id = db.product_id_by_code(codigo)
+            if producto_id is None:
+                print(f"No existe un producto con código {codigo}", file=sys.stderr)
+                continue
+            writer.writerow(db.fetch_product(producto_id)[1:6])
+            found += 1
+        return 0 if found == len(args.codigos) else 1
+
+    shown = 0
+    for rows in db.iter_products(args.buscar):
+        for row in rows:
+            if args.maximo is not None and row[4] > args.maximo:
+                continue
+            writer.writerow(row[1:6])
+            shown += 1
+            if args.limite and shown >= args.limite:
+                return 0
+    return 0
+
+def cmd_movements(db, args):
+    lines, numbers, errors = read_movement_sheet(args.archivo, args.tipo)
+    try:
+        stock = db.apply_movements(lines, numbers, errors)
+    except MovementBatchError as e:
+        print(f"Planilla rechazada, no se aplicó ningún movimiento ({len(e.errors)} líneas con error)",
+              file=sys.stderr)
+        for line, message in e.errors[:20]:
+            print(f"  línea {line}: {message}", file=sys.stderr)
+        if args.errores:
+            with open(args.errores, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(["Línea", "Error"])
+                writer.writerows(e.errors)
+            print(f"Errores guardados en {args.errores}", file=sys.stderr)
+        return 1
+    print(f"{len(lines)} movimientos aplicados a {len(stock)} productos")
+    return 0
+
+def cmd_summary(db, args):
+    if args.recalcular:
+        db.rebuild_summaries()
+    resumen = db.inventory_summary()
+    print(f"Productos: {resumen['productos']}")
+    print(f"Unidades en stock: {resumen['unidades']}")
+    print(f"Valor del inventario: {resumen['valor']:.2f}")
+    for tipo, nombre in (('entrada', 'Entradas'), ('salida', 'Salidas')):
+        movimientos, cantidad = resumen[tipo]
+        print(f"{nombre}: {cantidad} unidades en {movimientos} movimientos")
+    if args.categorias:
+        writer = csv.writer(sys.stdout, delimiter='\t')
+        writer.writerow(["Categoría", "Productos", "Unidades", "Valor"])
+        for nombre, productos, unidades, valor in db.category_summary():
+            writer.writerow([nombre, productos, unidades, f"{valor:.2f}"])
+    return 0
+
+def months_ago(meses, hoy=None):
+    """Primer día del mes de hace ``meses`` meses, como 'AAAA-MM-DD'"""
+    hoy = hoy or date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - meses
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}-01"
+
+def cmd_archive(db, args):
+    before = args.antes or months_ago(args.meses)
+    report = archive_movements(
+        db, before, batch=args.lote, compact=args.compactar,
+        progress=print_progress if args.progreso else None,
+    )
+    if args.progreso:
+        sys.stderr.write("\n")
+    print(f"{report['movimientos']} movimientos anteriores a {before} archivados en {report['archivo']} "
+          f"({report['segundos']:.1f} s)")
+    return 0
+
+def cmd_monthly(db, args):
+    producto_id = None
+    if args.codigo:
+        producto_id = db.product_id_by_code(args.codigo)
+        if producto_id is None:
+            print(f"No existe un producto con código {args.codigo}", file=sys.stderr)
+            return 1
+    writer = csv.writer(sys.stdout, delimiter='\t')
+    writer.writerow(["Mes", "Tipo", "Movimientos", "Cantidad"])
+    writer.writerows(db.monthly_movements(producto_id, args.desde, args.hasta))
+    return 0
+
+def cmd_threshold(db, args):
+    if args.producto:
+        producto_id = db.product_id_by_code(args.producto)
+        if producto_id is None:
+            print(f"No existe un producto con código {args.producto}", file=sys.stderr)
+            return 1
+    else:
+        categoria_id = db.categories.id(args.categoria)
+        if categoria_id is None:
+            print(f"No existe la categoría {args.categoria}", file=sys.stderr)
+            return 1
+    
+    if args.cantidad is None and not args.quitar:
+        if args.producto:
+            propio, categoria = db.product_threshold(producto_id)
+            if propio is not None:
+                print(f"Stock mínimo de {args.producto}: {propio}")
+            elif categoria is not None:
+                print(f"Stock mínimo de {args.producto}: {categoria} (el de su categoría)")
+            else:
+                print(f"{args.producto} no tiene stock mínimo")
+        else:
+            minimo = {id_: minimo for id_, _, minimo in db.category_thresholds()}.get(categoria_id)
+            print(f"Stock mínimo de {args.categoria}: {minimo if minimo is not None else 'ninguno'}")
+        return 0
+    
+    minimo = None if args.quitar else args.cantidad
+    if args.producto:
+        db.set_product_threshold(producto_id, minimo)
+    else:
+        db.set_category_threshold(categoria_id, minimo)
+    print(f"{db.alert_count()} productos por reponer")
+    return 0
+
+def cmd_reorder(db, args):
+    if args.archivo:
+        written = export_stock_alerts_csv(db, args.archivo)
+        print(f"{written} productos por reponer guardados en {args.archivo}")
+        return 0
+    writer = csv.writer(sys.stdout, delimiter='\t' if args.formato == 'tabla' else ',')
+    writer.writerow(ALERT_HEADERS)
+    writer.writerows(row[1:] for row in db.stock_alerts())
+    return 0
+
+def backup_dir(db, args):
+    """Carpeta de respaldos: la indicada o 'respaldos' junto a la base"""
+    return args.destino or os.path.join(os.path.dirname(os.path.abspath(db.db_file)), BACKUP_DIR)
+
+def cmd_backup(db, args):
+    stats = backup_database(
+        db.db_file, backup_dir(db, args), compress=not args.sin_comprimir, keep=args.conservar,
+        progress=print_progress if args.progreso else None,
+    )
+    if args.progreso:
+        sys.stderr.write("\n")
+    for path in stats['archivos']:
+        print(f"Respaldo guardado en {path}")
+    print(f"{stats['bytes'] / 1e6:.1f} MB ({stats['comprimido'] / 1e6:.1f} MB en disco) en {stats['segundos']:.1f} s, "
+          f"{stats['mb_por_segundo']:.1f} MB/s; paso más largo {stats['paso_max_ms']:.0f} ms")
+    for path in stats['eliminados']:
+        print(f"Respaldo antiguo eliminado: {path}")
+    return 0
+
+def cmd_verify(db, args):
+    info = verify_backup(args.archivo, full=args.completo)
+    print(f"Respaldo válido: versión {info['version']}, {info['paginas']} páginas")
+    for table in ('productos', 'categorias', 'movimientos'):
+        if table in info:
+            print(f"  {table}: {info[table]}")
+    return 0
+
+def cmd_restore(db, args):
+    info = restore_backup(args.archivo, db.db_file, backup_dir(db, args), keep_current=not args.sin_copia,
+                          progress=print_progress if args.progreso else None)
+    if args.progreso:
+        sys.stderr.write("\n")
+    for path in info['respaldo_previo'] or []:
+        print(f"La base anterior se guardó en {path}")
+    print(f"Restaurado {args.archivo}: {info.get('productos', 0)} productos")
+    if info['historial']:
+        print(f"Historial archivado restaurado desde {info['historial']}")
+    elif info['historial_apartado']:
+        print(f"El respaldo no tiene historial archivado; el anterior se guardó en {info['historial_apartado']}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Inventario sin interfaz gráfica")
+    parser.add_argument("--db", default=DB_FILE, help=f"archivo de la base de datos (por defecto {DB_FILE})")
+    parser.add_argument("--progreso", action="store_true", help="muestra el avance en stderr")
+    parser.add_argument("--diagnostico", metavar="ARCHIVO",
+                        help="guarda en JSON los tiempos de cada sentencia SQL y las consultas lentas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("importar", help="importa productos desde CSV (.csv, .csv.gz) o Excel (.xlsx)")
+    p.add_argument("archivo")
+    p.add_argument("--errores", help="guarda las filas con error en este CSV")
+    p.add_argument("--sin-categorias-nuevas", action="store_true",
+                   help="rechaza las filas con categorías que no existen en vez de crearlas")
+    p.add_argument("--lote", type=int, default=50000, help="filas por transacción")
+    p.set_defaults(func=cmd_import)
+
+    sort_choices = [prefix + column for column in PRODUCT_SORTS for prefix in ('', '-')]
+
+    p = sub.add_parser("exportar", help="exporta los productos a CSV")
+    p.add_argument("archivo", help="si termina en .gz se comprime")
+    p.add_argument("--buscar", help="exporta solo los productos que coinciden")
+    p.add_argument("--gzip", action="store_true", help="comprime aunque el nombre no termine en .gz")
+    p.add_argument("--orden", choices=sort_choices,
+                   help="columna de orden; descendente con '-' delante: --orden=-precio")
+    p.add_argument("--sin-cache", action="store_true", help="genera el archivo aunque la base no haya cambiado")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("reporte", help="genera el reporte PDF de inventario")
+    p.add_argument("archivo")
+    p.add_argument("--buscar", help="incluye solo los productos que coinciden")
+    p.add_argument("--procesos", type=int, help="procesos para generar páginas en paralelo")
+    p.add_argument("--orden", choices=sort_choices,
+                   help="columna de orden; descendente con '-' delante: --orden=-precio")
+    p.add_argument("--sin-cache", action="store_true", help="genera el PDF aunque la base no haya cambiado")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("stock", help="consulta el stock de productos")
+    p.add_argument("codigos", nargs="*", help="códigos de producto; sin códigos lista todos")
+    p.add_argument("--buscar", help="filtra por código, nombre o categoría")
+    p.add_argument("--maximo", type=int, help="solo productos con stock menor o igual")
+    p.add_argument("--limite", type=int, help="cantidad máxima de filas")
+    p.add_argument("--formato", choices=["tabla", "csv"], default="tabla")
+    p.set_defaults(func=cmd_stock)
+
+    p = sub.add_parser("movimientos", help="aplica una planilla de entradas y salidas en una sola transacción")
+    p.add_argument("archivo", help="CSV o Excel con columnas codigo, tipo, cantidad")
+    p.add_argument("--tipo", choices=MOVEMENT_KINDS,
+                   help="tipo de las líneas sin columna tipo (recepción o despacho)")
+    p.add_argument("--errores", help="guarda las líneas rechazadas en este CSV")
+    p.set_defaults(func=cmd_movements)
+
+    p = sub.add_parser("resumen", help="totales del inventario (valor, unidades, entradas y salidas)")
+    p.add_argument("--categorias", action="store_true", help="agrega el detalle por categoría")
+    p.add_argument("--recalcular", action="store_true",
+                   help="recalcula los resúmenes desde las tablas antes de mostrarlos")
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser("archivar", help="mueve los movimientos antiguos al archivo del historial")
+    corte = p.add_mutually_exclusive_group(required=True)
+    corte.add_argument("--antes", metavar="AAAA-MM-DD", help="archiva los movimientos anteriores a esta fecha")
+    corte.add_argument("--meses", type=int, help="conserva en la base principal solo los últimos N meses")
+    p.add_argument("--lote", type=int, default=50000, help="movimientos por transacción")
+    p.add_argument("--compactar", action="store_true", help="ejecuta VACUUM al terminar para achicar la base")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("mensual", help="entradas y salidas por mes, incluido el historial archivado")
+    p.add_argument("codigo", nargs="?", help="código de producto; sin código suma todos")
+    p.add_argument("--desde", metavar="AAAA-MM", help="primer mes")
+    p.add_argument("--hasta", metavar="AAAA-MM", help="último mes")
+    p.set_defaults(func=cmd_monthly)
+
+    p = sub.add_parser("minimo", help="consulta o fija el stock mínimo de un producto o de una categoría")
+    p.add_argument("cantidad", nargs="?", type=int, help="nuevo stock mínimo; sin cantidad muestra el actual")
+    objetivo = p.add_mutually_exclusive_group(required=True)
+    objetivo.add_argument("--producto", metavar="CODIGO")
+    objetivo.add_argument("--categoria", metavar="NOMBRE",
+                          help="vale para los productos de la categoría sin mínimo propio")
+    p.add_argument("--quitar", action="store_true",
+                   help="borra el mínimo (el producto vuelve a usar el de su categoría)")
+    p.set_defaults(func=cmd_threshold)
+
+    p = sub.add_parser("reponer", help="productos por debajo de su stock mínimo")
+    p.add_argument("archivo", nargs="?", help="guarda la lista en este CSV en lugar de mostrarla")
+    p.add_argument("--formato", choices=["tabla", "csv"], default="tabla")
+    p.set_defaults(func=cmd_reorder)
+
+    p = sub.add_parser("respaldar", help="respalda la base en uso sin detener la aplicación")
+    p.add_argument("--destino", help="carpeta de respaldos (por defecto 'respaldos' junto a la base)")
+    p.add_argument("--conservar", type=int, default=BACKUP_KEEP, help="respaldos que se conservan; 0 no borra ninguno")
+    p.add_argument("--sin-comprimir", action="store_true", help="guarda el .db sin gzip")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("verificar", help="comprueba la integridad de un respaldo")
+    p.add_argument("archivo")
+    p.add_argument("--completo", action="store_true", help="integrity_check completo (más lento)")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("restaurar", help="reemplaza la base por un respaldo verificado")
+    p.add_argument("archivo")
+    p.add_argument("--destino", help="carpeta donde se guarda la copia de la base actual")
+    p.add_argument("--sin-copia", action="store_true", help="no respalda la base actual antes de restaurar")
+    p.set_defaults(func=cmd_restore)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    monitor = QueryMonitor() if args.diagnostico else None
+    try:
+        db = InventarioDB(args.db, monitor=monitor)
+    except Exception as e:
+        print(f"No se pudo abrir la base de datos: {e}", file=sys.stderr)
+        return 2
+    try:
+        with db.timed(args.comando):
+            return args.func(db, args)
+    except BrokenPipeError:
+        return 0
+    except (ValueError, OSError, Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        db.close()
+        if monitor is not None:
+            monitor.dump(args.diagnostico)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # el reporte usa un pool de procesos
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Acceso al inventario a través de servidor.py con la interfaz de InventarioDB.
+
+La aplicación usa RemoteDB en lugar de InventarioDB cuando se inicia con
+``--servidor``; cada hilo de trabajo tiene su propia conexión HTTP
+persistente. Los errores de validación del servidor llegan como
+``ValueError`` y los de comunicación o de base de datos como
+``RemoteError``, que hereda de ``sqlite3.Error`` para que los manejadores
+existentes los muestren igual.
+"""
+import http.client
+import json
+import time
+from array import array
+from itertools import accumulate
+from sqlite3 import Error
+from urllib.parse import urlsplit, urlencode, quote
+
+from inventario_core import (
+    OperationStats, SearchIndex, MovementBatchError, MOVEMENT_PAGE, PRODUCT_SORT, PRODUCT_SORTS, sort_key,
+)
+from servidor import SERVER_PORT
+
+IDS_PER_REQUEST = 200  # id por petición al pedir productos por id (limita el largo de la URL)
+
+class RemoteError(Error):
+    """El servidor no respondió o informó un error de base de datos"""
+
+class RemoteCategories:
+    """Categorías del servidor con la interfaz de lectura de CategoryCache"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def items(self):
+        """(id, nombre) ordenados por nombre"""
+        return [tuple(item) for item in self.db.get('/categorias')]
+
+    def names(self):
+        return [nombre for _, nombre in self.items()]
+
+    def ids(self):
+        return {nombre: categoria_id for categoria_id, nombre in self.items()}
+
+    def id(self, nombre):
+        return self.ids().get(nombre)
+
+    def name(self, categoria_id):
+        return dict(self.items()).get(categoria_id)
+
+    def invalidate(self):
+        pass
+
+class RemoteDB(OperationStats):
+    """Cliente HTTP/JSON de servidor.py con los métodos de InventarioDB que usa la aplicación"""
+
+    def __init__(self, url, monitor=None, timeout=30):
+        parts = urlsplit(url if '://' in url else 'http://' + url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or SERVER_PORT
+        self.url = f"http://{self.host}:{self.port}"
+        self.timeout = timeout
+        self.db_file = None  # no hay archivo local: los reportes no usan procesos
+        self.http = None
+        self.monitor = monitor
+        # nombre de operación -> [llamadas, segundos acumulados]
+        self.stats = {}
+        self.categories = RemoteCategories(self)
+        self.fts_enabled = self.get('/estado')['fts']  # también comprueba que el servidor responda
+
+    # ---- HTTP ----
+    def request(self, method, path, params=None, body=None):
+        if params:
+            query = {name: value for name, value in params.items() if value is not None}
+            if query:
+                path += '?' + urlencode(query)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+
+        for intento in (1, 2):
+            if self.http is None:
+                self.http = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.http.request(method, path, data, headers)
+                response = self.http.getresponse()
+                payload = json.loads(response.read() or b'{}')
+                break
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.http.close()
+                self.http = None
+                # Una conexión persistente que el servidor cerró se reintenta una
+                # vez, solo para lecturas: repetir una escritura podría duplicarla
+                if intento == 2 or method != 'GET':
+                    raise RemoteError(f"No se pudo comunicar con el servidor {self.url}: {e}")
+
+        if response.status == 200:
+            return payload.get('resultado')
+        message = payload.get('error') or response.reason
+        if payload.get('detalle'):
+            raise MovementBatchError([tuple(error) for error in payload['detalle']])
+        if 400 <= response.status < 500:
+            raise ValueError(message)
+        raise RemoteError(message)
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params)
+
+    def interrupt(self):
+        # La consulta termina en el servidor; la tarea cancelada descarta el resultado
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if self.http is not None:
+            self.http.close()
+            self.http = None
+
+    def change_stamp(self):
+        """Cambia con cada grupo de escrituras confirmado por el servidor"""
+        return self.get('/estado')['version']
+
+    def change_counters(self):
+        return self.get('/contadores')
+
+    def connection_overhead(self, repeticiones=20):
+        """Como InventarioDB.connection_overhead, con una conexión HTTP por petición"""
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request('GET', '/estado', headers={'Connection': 'close'})
+                conn.getresponse().read()
+            except (OSError, http.client.HTTPException) as e:
+                raise RemoteError(f"No se pudo comunicar con el servidor {self.url}: {e}")
+            finally:
+                conn.close()
+        por_conexion = (time.perf_counter() - inicio) / repeticiones * 1000
+
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            self.get('/estado')
+        persistente = (time.perf_counter() - inicio) / repeticiones * 1000
+
+        return {
+            'por_conexion_ms': por_conexion,
+            'persistente_ms': persistente,
+            'ahorro_ms': por_conexion - persistente,
+        }
+
+    # ---- productos ----
+    def count_products(self, search=None, producto_id=None):
+        return self.get('/productos/total', {'buscar': search, 'producto': producto_id})
+
+    def fetch_products_page(self, after=None, limit=100, offset=0, reverse=False, search=None, sort=None):
+        rows = self.get('/productos', {
+            'despues': json.dumps(list(after)) if after is not None else None,
+            'limite': limit,
+            'desplazamiento': offset or None,
+            'inverso': 1 if reverse else None,
+            'buscar': search,
+            'orden': sort,
+        })
+        return [tuple(row) for row in rows]
+
+    def product_anchor_keys(self, step, search=None, sort=None):
+        keys = self.get('/productos/anclas', {'paso': step, 'buscar': search, 'orden': sort})
+        return [tuple(key) for key in keys]
+
+    def product_keys_at(self, positions, search=None, sort=None):
+        if not positions:
+            return []
+        keys = self.get('/productos/claves', {'posiciones': json.dumps(list(positions)), 'buscar': search,
+                                              'orden': sort})
+        return [tuple(key) for key in keys]
+
+    def product_column_lengths(self, search=None):
+        return self.get('/productos/anchos', {'buscar': search})
+
+    def iter_products(self, search=None, batch=1000, after=None, sort=None):
+        """Recorre los productos del filtro por páginas con clave (valor, id)"""
+        key = sort_key(sort, PRODUCT_SORTS, PRODUCT_SORT)
+        while True:
+            rows = self.fetch_products_page(after, batch, search=search, sort=sort)
+            if not rows:
+                break
+            yield rows
+            if len(rows) < batch:
+                break
+            after = key(rows[-1])
+
+    def fetch_products_by_ids(self, ids):
+        ids = list(ids)
+        rows = []
+        for i in range(0, len(ids), IDS_PER_REQUEST):
+            chunk = ids[i:i + IDS_PER_REQUEST]
+            rows += [tuple(row) for row in self.get('/productos/por-ids', {'ids': json.dumps(chunk)})]
+        return rows
+
+    def search_product_ids(self, search, sort=None):
+        return array('q', self.get('/productos/buscar', {'q': search, 'orden': sort}))
+
+    def search_index(self, search, stamp=None, sort=None):
+        result = self.get('/productos/indice', {'q': search, 'orden': sort})
+        ids = array('q', result['ids'])
+        textos = result['textos']
+        if textos is None:
+            return SearchIndex(search, result['tokens'], ids, stamp=stamp)
+        starts = list(accumulate(map(len, textos), initial=0))
+        return SearchIndex(search, result['tokens'], ids, "".join(textos), starts, stamp)
+
+    def product_id_by_code(self, codigo):
+        return self.get('/productos/codigo/' + quote(codigo, safe=''))
+
+    def fetch_product(self, producto_id):
+        row = self.get(f'/productos/{producto_id}')
+        return tuple(row) if row is not None else None
+
+    def fetch_movements_page(self, before=None, limit=MOVEMENT_PAGE, tipo=None,
+                             desde=None, hasta=None, producto_id=None, sort=None):
+        rows = self.get('/movimientos', {
+            'antes': json.dumps(list(before)) if before is not None else None,
+            'limite': limit,
+            'tipo': tipo,
+            'desde': desde,
+            'hasta': hasta,
+            'producto': producto_id,
+            'orden': sort,
+        })
+        return [tuple(row) for row in rows]
+
+    # ---- resúmenes ----
+    def inventory_summary(self):
+        resumen = self.get('/resumen')
+        resumen.pop('categorias')
+        for tipo in ('entrada', 'salida'):
+            resumen[tipo] = tuple(resumen[tipo])
+        return resumen
+
+    def category_summary(self):
+        return [tuple(row) for row in self.get('/resumen')['categorias']]
+
+    def product_summary(self, producto_id):
+        return tuple(self.get(f'/productos/{producto_id}/resumen'))
+
+    # ---- alertas de reposición ----
+    def alert_count(self):
+        return self.get('/alertas/total')
+
+    def stock_alerts(self):
+        return [tuple(row) for row in self.get('/alertas')]
+
+    def product_threshold(self, producto_id):
+        row = self.get(f'/productos/{producto_id}/minimo')
+        return tuple(row) if row is not None else None
+
+    def category_thresholds(self):
+        return [tuple(row) for row in self.get('/categorias/minimos')]
+
+    # ---- escritura ----
+    def insert_product(self, codigo, nombre, precio, stock, categoria):
+        body = {'codigo': codigo, 'nombre': nombre, 'precio': precio, 'stock': stock, 'categoria': categoria}
+        return tuple(self.request('POST', '/productos', body=body))
+
+    def update_product(self, producto_id, codigo, nombre, precio, stock, categoria):
+        body = {'codigo': codigo, 'nombre': nombre, 'precio': precio, 'stock': stock, 'categoria': categoria}
+        return tuple(self.request('PUT', f'/productos/{producto_id}', body=body))
+
+    def delete_product(self, producto_id):
+        return tuple(self.request('DELETE', f'/productos/{producto_id}'))
+
+    def set_product_threshold(self, producto_id, minimo):
+        return tuple(self.request('PUT', f'/productos/{producto_id}/minimo', body={'minimo': minimo}))
+
+    def set_category_threshold(self, categoria_id, minimo):
+        return tuple(self.request('PUT', f'/categorias/{categoria_id}/minimo', body={'minimo': minimo}))
+
+    def insert_category(self, nombre):
+        return tuple(self.request('POST', '/categorias', body={'nombre': nombre}))
+
+    def update_category(self, categoria_id, nombre):
+        return tuple(self.request('PUT', f'/categorias/{categoria_id}', body={'nombre': nombre}))
+
+    def delete_category(self, categoria_id):
+        return self.request('DELETE', f'/categorias/{categoria_id}')
+
+    def apply_movements(self, lines, line_numbers=None, rejected=()):
+        body = {'lineas': [list(line) for line in lines],
+                'numeros': list(line_numbers) if line_numbers is not None else None,
+                'rechazadas': [list(error) for error in rejected]}
+        stock = self.request('POST', '/movimientos/lote', body=body)
+        return {int(producto_id): actual for producto_id, actual in stock.items()}
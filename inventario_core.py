@@ -0,0 +1,2219 @@
+"""Núcleo del inventario: base de datos, búsqueda, importación y exportación.
+
+No depende de tkinter ni de fpdf, así que lo pueden usar la aplicación de
+escritorio, la línea de comandos (cli.py) y los procesos de reportes.
+"""
+import sqlite3
+from sqlite3 import Error
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import accumulate
+from array import array
+import bisect
+import os
+import threading
+import time
+import unicodedata
+
+# ----------------------------
+# Configuración de la Base de Datos
+# ----------------------------
+DB_FILE = 'inventario.db'
+
+# PRAGMA que se aplican a cada conexión abierta
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-32000",      # ~32 MB de caché de páginas
+    "PRAGMA mmap_size=268435456",    # 256 MB de E/S mapeada en memoria
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+]
+
+def archive_path(db_file=DB_FILE):
+    """Archivo del historial archivado: inventario.db -> inventario_archivo.db"""
+    base, ext = os.path.splitext(db_file)
+    return f"{base}_archivo{ext or '.db'}"
+
+def create_connection(db_file=DB_FILE):
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file, cached_statements=256)
+        return conn
+    except Error as e:
+        print(e)
+    return conn
+
+def configure_connection(conn):
+    """Aplica los PRAGMA de rendimiento a una conexión"""
+    c = conn.cursor()
+    for pragma in PRAGMAS:
+        try:
+            c.execute(pragma)
+        except Error as e:
+            print(e)
+
+def create_tables(conn):
+    sql_scripts = [
+        """CREATE TABLE IF NOT EXISTS categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL UNIQUE
+        );""",
+        """CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT NOT NULL UNIQUE,
+            nombre TEXT NOT NULL,
+            precio REAL NOT NULL,
+            stock INTEGER NOT NULL,
+            categoria_id INTEGER,
+            fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (categoria_id) REFERENCES categorias(id)
+        );""",
+        """CREATE TABLE IF NOT EXISTS movimientos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            producto_id INTEGER,
+            tipo TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            fecha TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (producto_id) REFERENCES productos(id)
+        );""",
+    ]
+    
+    try:
+        c = conn.cursor()
+        for script in sql_scripts:
+            c.execute(script)
+        conn.commit()
+    except Error as e:
+        print(e)
+    
+    migrate(conn)
+    create_search_index(conn)
+
+# ----------------------------
+# Resúmenes del inventario
+# ----------------------------
+# Tablas de totales que mantienen los triggers de la migración 4, para que el
+# panel de resumen no recorra productos ni movimientos:
+#   resumen_categorias: productos, unidades y valor (precio * stock) por
+#       categoría; categoria_id 0 agrupa los productos sin categoría.
+#   resumen_productos: entradas y salidas acumuladas de cada producto.
+#   resumen_tipos: cantidad de movimientos y unidades por tipo.
+# Los movimientos solo se insertan; al borrar un producto sus totales se
+# descuentan de una vez usando su fila de resumen_productos.
+SUMMARY_REBUILD = [
+    "DELETE FROM resumen_categorias",
+    """INSERT INTO resumen_categorias (categoria_id, productos, unidades, valor)
+       SELECT IFNULL(categoria_id, 0), COUNT(*), SUM(stock), SUM(precio * stock)
+       FROM productos GROUP BY IFNULL(categoria_id, 0)""",
+    "DELETE FROM resumen_productos",
+    """INSERT INTO resumen_productos (producto_id, entradas, salidas, n_entradas, n_salidas, ultimo_movimiento)
+       SELECT producto_id,
+              SUM(CASE WHEN tipo = 'entrada' THEN cantidad ELSE 0 END),
+              SUM(CASE WHEN tipo = 'salida' THEN cantidad ELSE 0 END),
+              SUM(tipo = 'entrada'), SUM(tipo = 'salida'), MAX(fecha)
+       FROM movimientos WHERE producto_id IN (SELECT id FROM productos)
+       GROUP BY producto_id""",
+    "DELETE FROM resumen_tipos",
+    """INSERT INTO resumen_tipos (tipo, movimientos, cantidad)
+       SELECT 'entrada', IFNULL(SUM(n_entradas), 0), IFNULL(SUM(entradas), 0) FROM resumen_productos
+       UNION ALL
+       SELECT 'salida', IFNULL(SUM(n_salidas), 0), IFNULL(SUM(salidas), 0) FROM resumen_productos""",
+]
+
+# Después de la migración 5 parte del historial está archivado: al recalcular
+# se suman a resumen_productos los totales mensuales que quedaron en la base
+# principal y se rehace resumen_tipos
+ARCHIVED_SUMMARY_REBUILD = [
+    """INSERT INTO resumen_productos (producto_id, entradas, salidas, n_entradas, n_salidas, ultimo_movimiento)
+       SELECT producto_id,
+              SUM(CASE WHEN tipo = 'entrada' THEN cantidad ELSE 0 END),
+              SUM(CASE WHEN tipo = 'salida' THEN cantidad ELSE 0 END),
+              SUM(CASE WHEN tipo = 'entrada' THEN movimientos ELSE 0 END),
+              SUM(CASE WHEN tipo = 'salida' THEN movimientos ELSE 0 END), MAX(ultimo)
+       FROM movimientos_mensuales WHERE producto_id IN (SELECT id FROM productos)
+       GROUP BY producto_id
+       ON CONFLICT(producto_id) DO UPDATE SET
+           entradas = entradas + excluded.entradas,
+           salidas = salidas + excluded.salidas,
+           n_entradas = n_entradas + excluded.n_entradas,
+           n_salidas = n_salidas + excluded.n_salidas,
+           ultimo_movimiento = MAX(IFNULL(ultimo_movimiento, ''), excluded.ultimo_movimiento)""",
+    *SUMMARY_REBUILD[-2:],
+]
+
+# ----------------------------
+# Alertas de reposición
+# ----------------------------
+# Cada producto puede tener su propio stock mínimo; si no lo tiene usa el
+# de su categoría, y sin ninguno de los dos no genera alertas. Los triggers
+# de la migración 7 mantienen en alertas_stock los productos que quedaron
+# por debajo del mínimo (con la fecha en que bajaron), así que el panel
+# de reposición lee unas pocas filas en lugar de recorrer el catálogo. El
+# stock solo cambia con UPDATE productos (también al registrar
+# movimientos), de modo que basta con los triggers de productos y de
+# categorías. La vista productos_bajo_minimo calcula lo mismo desde las
+# tablas; la usa ALERT_REBUILD para comprobar o rehacer las alertas.
+ALERT_REBUILD = [
+    "DELETE FROM alertas_stock WHERE producto_id NOT IN (SELECT producto_id FROM productos_bajo_minimo)",
+    """INSERT INTO alertas_stock (producto_id, stock, minimo)
+       SELECT producto_id, stock, minimo FROM productos_bajo_minimo WHERE true
+       ON CONFLICT(producto_id) DO UPDATE SET stock = excluded.stock, minimo = excluded.minimo""",
+]
+
+ALERT_HEADERS = ["Código", "Nombre", "Categoría", "Stock", "Mínimo", "Faltan", "Bajo el mínimo desde"]
+
+# ----------------------------
+# Archivo del historial
+# ----------------------------
+# Los movimientos anteriores a una fecha de corte se mueven a otro archivo
+# SQLite que se adjunta con ATTACH como ``archivo``; su esquema no usa
+# migraciones porque solo contiene la tabla de movimientos y sus índices.
+ARCHIVE_SCHEMA = [
+    "PRAGMA archivo.journal_mode=WAL",
+    """CREATE TABLE IF NOT EXISTS archivo.movimientos (
+        id INTEGER PRIMARY KEY,
+        producto_id INTEGER,
+        tipo TEXT NOT NULL,
+        cantidad INTEGER NOT NULL,
+        fecha TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS archivo.idx_movimientos_fecha ON movimientos(fecha)",
+    "CREATE INDEX IF NOT EXISTS archivo.idx_movimientos_tipo_fecha ON movimientos(tipo, fecha)",
+    "CREATE INDEX IF NOT EXISTS archivo.idx_movimientos_producto ON movimientos(producto_id, fecha)",
+]
+
+# ----------------------------
+# Migraciones del esquema
+# ----------------------------
+# La versión aplicada se guarda en PRAGMA user_version: la migración N deja
+# la base en la versión N. Solo se agregan migraciones al final de la lista,
+# nunca se modifican las ya publicadas.
+MIGRATIONS = [
+    # 1: índices para las consultas frecuentes
+    [
+        # Paginación de productos por nombre (incluye el rowid)
+        "CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre)",
+        # UPDATE ... SET categoria_id = NULL al borrar una categoría
+        "CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos(categoria_id)",
+        # DELETE de movimientos al borrar un producto e historial por producto
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_producto ON movimientos(producto_id, fecha)",
+        # Listado de movimientos por fecha y filtrado por tipo, sin leer la tabla
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos(fecha, producto_id, tipo, cantidad)",
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_tipo_fecha ON movimientos(tipo, fecha, producto_id, cantidad)",
+    ],
+    # 2: el historial se pagina por (fecha, id); con columnas extra entre
+    # fecha y el rowid el orden por id necesitaba un ordenamiento temporal
+    [
+        "DROP INDEX IF EXISTS idx_movimientos_fecha",
+        "DROP INDEX IF EXISTS idx_movimientos_tipo_fecha",
+        "CREATE INDEX idx_movimientos_fecha ON movimientos(fecha)",
+        "CREATE INDEX idx_movimientos_tipo_fecha ON movimientos(tipo, fecha)",
+    ],
+    # 3: contadores de cambios mantenidos por triggers, para invalidar cachés
+    # aunque los cambios vengan de otra conexión
+    [
+        """CREATE TABLE IF NOT EXISTS contadores (
+            nombre TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""",
+        "INSERT OR IGNORE INTO contadores (nombre, valor) VALUES ('categorias', 0)",
+        """CREATE TRIGGER IF NOT EXISTS categorias_version_ai AFTER INSERT ON categorias BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'categorias';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS categorias_version_au AFTER UPDATE ON categorias BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'categorias';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS categorias_version_ad AFTER DELETE ON categorias BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'categorias';
+        END""",
+    ],
+    # 4: resúmenes del inventario mantenidos por triggers (ver SUMMARY_REBUILD)
+    [
+        """CREATE TABLE IF NOT EXISTS resumen_categorias (
+            categoria_id INTEGER PRIMARY KEY,
+            productos INTEGER NOT NULL DEFAULT 0,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            valor REAL NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_productos (
+            producto_id INTEGER PRIMARY KEY,
+            entradas INTEGER NOT NULL DEFAULT 0,
+            salidas INTEGER NOT NULL DEFAULT 0,
+            n_entradas INTEGER NOT NULL DEFAULT 0,
+            n_salidas INTEGER NOT NULL DEFAULT 0,
+            ultimo_movimiento TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_tipos (
+            tipo TEXT PRIMARY KEY,
+            movimientos INTEGER NOT NULL DEFAULT 0,
+            cantidad INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS productos_resumen_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO resumen_categorias (categoria_id, productos, unidades, valor)
+            VALUES (IFNULL(NEW.categoria_id, 0), 1, NEW.stock, NEW.precio * NEW.stock)
+            ON CONFLICT(categoria_id) DO UPDATE SET
+                productos = productos + 1,
+                unidades = unidades + excluded.unidades,
+                valor = valor + excluded.valor;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS productos_resumen_au AFTER UPDATE OF precio, stock, categoria_id ON productos BEGIN
+            UPDATE resumen_categorias SET
+                productos = productos - 1,
+                unidades = unidades - OLD.stock,
+                valor = valor - OLD.precio * OLD.stock
+            WHERE categoria_id = IFNULL(OLD.categoria_id, 0);
+            INSERT INTO resumen_categorias (categoria_id, productos, unidades, valor)
+            VALUES (IFNULL(NEW.categoria_id, 0), 1, NEW.stock, NEW.precio * NEW.stock)
+            ON CONFLICT(categoria_id) DO UPDATE SET
+                productos = productos + 1,
+                unidades = unidades + excluded.unidades,
+                valor = valor + excluded.valor;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS productos_resumen_ad AFTER DELETE ON productos BEGIN
+            UPDATE resumen_categorias SET
+                productos = productos - 1,
+                unidades = unidades - OLD.stock,
+                valor = valor - OLD.precio * OLD.stock
+            WHERE categoria_id = IFNULL(OLD.categoria_id, 0);
+            UPDATE resumen_tipos SET
+                movimientos = movimientos - IFNULL((SELECT n_entradas FROM resumen_productos WHERE producto_id = OLD.id), 0),
+                cantidad = cantidad - IFNULL((SELECT entradas FROM resumen_productos WHERE producto_id = OLD.id), 0)
+            WHERE tipo = 'entrada';
+            UPDATE resumen_tipos SET
+                movimientos = movimientos - IFNULL((SELECT n_salidas FROM resumen_productos WHERE producto_id = OLD.id), 0),
+                cantidad = cantidad - IFNULL((SELECT salidas FROM resumen_productos WHERE producto_id = OLD.id), 0)
+            WHERE tipo = 'salida';
+            DELETE FROM resumen_productos WHERE producto_id = OLD.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS movimientos_resumen_ai AFTER INSERT ON movimientos
+        WHEN NEW.producto_id IS NOT NULL BEGIN
+            INSERT INTO resumen_productos (producto_id, entradas, salidas, n_entradas, n_salidas, ultimo_movimiento)
+            VALUES (NEW.producto_id,
+                    CASE WHEN NEW.tipo = 'entrada' THEN NEW.cantidad ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'salida' THEN NEW.cantidad ELSE 0 END,
+                    NEW.tipo = 'entrada', NEW.tipo = 'salida', NEW.fecha)
+            ON CONFLICT(producto_id) DO UPDATE SET
+                entradas = entradas + excluded.entradas,
+                salidas = salidas + excluded.salidas,
+                n_entradas = n_entradas + excluded.n_entradas,
+                n_salidas = n_salidas + excluded.n_salidas,
+                ultimo_movimiento = MAX(ultimo_movimiento, excluded.ultimo_movimiento);
+            UPDATE resumen_tipos SET movimientos = movimientos + 1, cantidad = cantidad + NEW.cantidad
+            WHERE tipo = NEW.tipo;
+        END""",
+        *SUMMARY_REBUILD,
+    ],
+    # 5: archivo del historial (ver archive_movements): totales mensuales de
+    # los movimientos archivados y fechas de corte de cada archivado
+    [
+        """CREATE TABLE IF NOT EXISTS movimientos_mensuales (
+            producto_id INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            movimientos INTEGER NOT NULL DEFAULT 0,
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            ultimo TEXT,
+            PRIMARY KEY (producto_id, mes, tipo)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS archivo_cortes (
+            hasta TEXT PRIMARY KEY,
+            movimientos INTEGER NOT NULL DEFAULT 0,
+            fecha TEXT DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID""",
+    ],
+    # 6: orden de la lista de productos por precio, stock y fecha (ver
+    # PRODUCT_SORTS); código y nombre ya tienen índice
+    [
+        "CREATE INDEX IF NOT EXISTS idx_productos_precio ON productos(precio)",
+        "CREATE INDEX IF NOT EXISTS idx_productos_stock ON productos(stock)",
+        "CREATE INDEX IF NOT EXISTS idx_productos_fecha ON productos(fecha_creacion)",
+    ],
+    # 7: stock mínimo por producto y por categoría y alertas de reposición
+    # mantenidas por triggers (ver ALERT_REBUILD)
+    [
+        "ALTER TABLE productos ADD COLUMN stock_minimo INTEGER",
+        "ALTER TABLE categorias ADD COLUMN stock_minimo INTEGER",
+        """CREATE TABLE IF NOT EXISTS alertas_stock (
+            producto_id INTEGER PRIMARY KEY,
+            stock INTEGER NOT NULL,
+            minimo INTEGER NOT NULL,
+            desde TEXT DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # Índice parcial: solo contiene los productos bajo su mínimo propio,
+        # que son pocos; SQLite lo actualiza al cruzar el umbral
+        "CREATE INDEX IF NOT EXISTS idx_productos_bajo_minimo ON productos(stock_minimo) WHERE stock < stock_minimo",
+        """CREATE VIEW IF NOT EXISTS productos_bajo_minimo AS
+            SELECT id AS producto_id, stock, stock_minimo AS minimo
+            FROM productos WHERE stock < stock_minimo
+            UNION ALL
+            SELECT p.id, p.stock, c.stock_minimo
+            FROM categorias c JOIN productos p ON p.categoria_id = c.id
+            WHERE c.stock_minimo IS NOT NULL AND p.stock_minimo IS NULL AND p.stock < c.stock_minimo""",
+        """CREATE TRIGGER IF NOT EXISTS productos_alerta_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO alertas_stock (producto_id, stock, minimo)
+            SELECT NEW.id, NEW.stock, u.minimo FROM (
+                SELECT IFNULL(NEW.stock_minimo, (SELECT stock_minimo FROM categorias WHERE id = NEW.categoria_id)) AS minimo
+            ) u WHERE NEW.stock < u.minimo;
+        END""",
+        # Las ediciones que no tocan stock, mínimo ni categoría no hacen nada;
+        # un producto que sigue bajo el mínimo conserva la fecha en que bajó
+        """CREATE TRIGGER IF NOT EXISTS productos_alerta_au AFTER UPDATE OF stock, stock_minimo, categoria_id ON productos
+        WHEN OLD.stock IS NOT NEW.stock OR OLD.stock_minimo IS NOT NEW.stock_minimo
+             OR OLD.categoria_id IS NOT NEW.categoria_id BEGIN
+            DELETE FROM alertas_stock WHERE producto_id = NEW.id AND NOT IFNULL(
+                NEW.stock < IFNULL(NEW.stock_minimo, (SELECT stock_minimo FROM categorias WHERE id = NEW.categoria_id)), 0);
+            INSERT INTO alertas_stock (producto_id, stock, minimo)
+            SELECT NEW.id, NEW.stock, u.minimo FROM (
+                SELECT IFNULL(NEW.stock_minimo, (SELECT stock_minimo FROM categorias WHERE id = NEW.categoria_id)) AS minimo
+            ) u WHERE NEW.stock < u.minimo
+            ON CONFLICT(producto_id) DO UPDATE SET stock = excluded.stock, minimo = excluded.minimo;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS productos_alerta_ad AFTER DELETE ON productos BEGIN
+            DELETE FROM alertas_stock WHERE producto_id = OLD.id;
+        END""",
+        # El mínimo de una categoría alcanza a sus productos sin mínimo propio
+        """CREATE TRIGGER IF NOT EXISTS categorias_alerta_au AFTER UPDATE OF stock_minimo ON categorias
+        WHEN OLD.stock_minimo IS NOT NEW.stock_minimo BEGIN
+            DELETE FROM alertas_stock WHERE producto_id IN (
+                SELECT id FROM productos
+                WHERE categoria_id = NEW.id AND stock_minimo IS NULL AND NOT IFNULL(stock < NEW.stock_minimo, 0));
+            INSERT INTO alertas_stock (producto_id, stock, minimo)
+            SELECT id, stock, NEW.stock_minimo FROM productos
+            WHERE categoria_id = NEW.id AND stock_minimo IS NULL AND stock < NEW.stock_minimo
+            ON CONFLICT(producto_id) DO UPDATE SET minimo = excluded.minimo;
+        END""",
+    ],
+    # 8: contador de cambios de productos, para saber si un reporte guardado
+    # sigue vigente aunque el cambio venga de otro proceso (ver cache_reportes)
+    [
+        "INSERT OR IGNORE INTO contadores (nombre, valor) VALUES ('productos', 0)",
+        """CREATE TRIGGER IF NOT EXISTS productos_version_ai AFTER INSERT ON productos BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS productos_version_au AFTER UPDATE ON productos BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS productos_version_ad AFTER DELETE ON productos BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+    ],
+    # 9: una carga masiva sube el contador una vez por lote y no por fila
+    # (ver counted_once); la pausa es un dato, el esquema no cambia en cada lote
+    [
+        "CREATE TABLE IF NOT EXISTS contadores_pausa (nombre TEXT PRIMARY KEY) WITHOUT ROWID",
+        "DROP TRIGGER IF EXISTS productos_version_ai",
+        "DROP TRIGGER IF EXISTS productos_version_au",
+        "DROP TRIGGER IF EXISTS productos_version_ad",
+        """CREATE TRIGGER productos_version_ai AFTER INSERT ON productos
+           WHEN NOT EXISTS (SELECT 1 FROM contadores_pausa WHERE nombre = 'productos') BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+        """CREATE TRIGGER productos_version_au AFTER UPDATE ON productos
+           WHEN NOT EXISTS (SELECT 1 FROM contadores_pausa WHERE nombre = 'productos') BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+        """CREATE TRIGGER productos_version_ad AFTER DELETE ON productos
+           WHEN NOT EXISTS (SELECT 1 FROM contadores_pausa WHERE nombre = 'productos') BEGIN
+            UPDATE contadores SET valor = valor + 1 WHERE nombre = 'productos';
+        END""",
+    ],
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Aplica las migraciones pendientes y devuelve la versión final.
+
+    Cada migración corre en su propia transacción junto con el cambio de
+    user_version, así que una actualización interrumpida no deja la base a
+    medias. BEGIN IMMEDIATE toma el bloqueo de escritura antes de releer la
+    versión, por si otro proceso migra al mismo tiempo. Si se aplicó algo
+    se ejecuta ANALYZE para que el planificador conozca los índices nuevos.
+    """
+    conn.commit()
+    version = schema_version(conn)
+    if version > len(migrations):
+        print(f"La base de datos tiene la versión {version}, más nueva que esta aplicación ({len(migrations)})")
+        return version
+    
+    applied = False
+    while version < len(migrations):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            version = schema_version(conn)
+            if version >= len(migrations):
+                conn.rollback()
+                break
+            for sql in migrations[version]:
+                conn.execute(sql)
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied = True
+        except Error as e:
+            print(f"Error en la migración {version + 1}: {e}")
+            conn.rollback()
+            return version
+    
+    if applied:
+        try:
+            conn.execute("ANALYZE")
+            conn.commit()
+        except Error as e:
+            print(e)
+    return version
+
+# ----------------------------
+# Índice de búsqueda de texto completo (FTS5)
+# ----------------------------
+SEARCH_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts (rowid, codigo, nombre, categoria)
+        VALUES (new.id, new.codigo, new.nombre,
+                (SELECT nombre FROM categorias WHERE id = new.categoria_id));
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF codigo, nombre, categoria_id ON productos BEGIN
+        UPDATE productos_fts
+        SET codigo = new.codigo,
+            nombre = new.nombre,
+            categoria = (SELECT nombre FROM categorias WHERE id = new.categoria_id)
+        WHERE rowid = old.id;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+        DELETE FROM productos_fts WHERE rowid = old.id;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS categorias_fts_au AFTER UPDATE OF nombre ON categorias BEGIN
+        UPDATE productos_fts SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM productos WHERE categoria_id = new.id);
+    END;""",
+]
+SEARCH_TRIGGER_NAMES = ['productos_fts_ai', 'productos_fts_au', 'productos_fts_ad', 'categorias_fts_au']
+
+def create_search_index(conn):
+    """Crea el índice FTS5 de productos y lo llena si es nuevo.
+
+    Usa el tokenizador trigram, que permite buscar por prefijo y por
+    cualquier subcadena de tres o más caracteres. Devuelve False si la
+    versión de SQLite no soporta FTS5 con trigram. Si faltaba algún
+    trigger (importación masiva interrumpida) el índice también se regenera.
+    """
+    try:
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+        ).fetchone()
+        placeholders = ", ".join("?" * len(SEARCH_TRIGGER_NAMES))
+        triggers = conn.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+            SEARCH_TRIGGER_NAMES
+        ).fetchone()[0]
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts
+                        USING fts5(codigo, nombre, categoria, tokenize = 'trigram')""")
+        for trigger in SEARCH_TRIGGERS:
+            conn.execute(trigger)
+        if not existe or triggers < len(SEARCH_TRIGGER_NAMES):
+            rebuild_search_index(conn)
+        conn.commit()
+        return True
+    except Error as e:
+        print(e)
+        conn.rollback()
+        return False
+
+def suspend_search_index(conn):
+    """Quita los triggers del índice FTS5 durante una carga masiva.
+
+    Regenerar el índice al final es varias veces más rápido que mantenerlo
+    fila a fila; create_search_index() vuelve a crear los triggers y lo
+    regenera.
+    """
+    for name in SEARCH_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.commit()
+
+# Triggers que suben el contador 'productos' fila por fila (migración 8)
+@contextmanager
+def counted_once(db, nombre='productos'):
+    """Sube el contador ``nombre`` una sola vez por todo el bloque en lugar de por fila.
+
+    Debe usarse dentro de una transacción. Mientras dura, una fila en
+    contadores_pausa hace que los triggers del contador no hagan nada
+    (migración 9); como se agrega y se quita en la misma transacción, las
+    otras conexiones nunca ven el contador en pausa.
+    """
+    db.execute("INSERT OR IGNORE INTO contadores_pausa (nombre) VALUES (?)", (nombre,))
+    try:
+        yield
+    finally:
+        db.execute("DELETE FROM contadores_pausa WHERE nombre = ?", (nombre,))
+    db.execute("UPDATE contadores SET valor = valor + 1 WHERE nombre = ?", (nombre,))
+
+def rebuild_search_index(conn):
+    """Vuelve a generar el contenido del índice FTS5 desde las tablas"""
+    conn.execute("DELETE FROM productos_fts")
+    conn.execute("""
+        INSERT INTO productos_fts (rowid, codigo, nombre, categoria)
+        SELECT p.id, p.codigo, p.nombre, c.nombre
+        FROM productos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+    """)
+    conn.execute("INSERT INTO productos_fts (productos_fts) VALUES ('optimize')")
+
+def build_search_query(search):
+    """Traduce el texto buscado a condiciones sobre productos_fts.
+
+    Las palabras de tres o más letras van a una expresión MATCH (todas
+    deben aparecer como subcadena); las más cortas no caben en un trigrama
+    y se comprueban con LIKE sobre las columnas del índice.
+    """
+    where, params = [], []
+    tokens = search.split()
+    
+    match = " ".join('"' + t.replace('"', '""') + '"' for t in tokens if len(t) >= 3)
+    if match:
+        where.append("productos_fts MATCH ?")
+        params.append(match)
+    
+    for token in tokens:
+        if len(token) < 3:
+            where.append("(codigo LIKE ? OR nombre LIKE ? OR categoria LIKE ?)")
+            params.extend([f"%{token}%"] * 3)
+    
+    return where, params, bool(match)
+
+# Máximo de filas cuyo texto se guarda para refinar una búsqueda en memoria
+SEARCH_TEXT_MAX = 200000
+
+def search_tokens(search, fts=True):
+    """Subcadenas que debe contener cada fila, como las compara la consulta"""
+    if fts:
+        return [token.lower() for token in search.split()]
+    return [search.strip().lower()]
+
+class SearchIndex:
+    """Resultado de una búsqueda con el texto de cada fila, para refinarlo sin consultar.
+
+    Si una búsqueda nueva solo agrega letras o palabras a la anterior (cada
+    subcadena vieja está dentro de alguna nueva) su resultado es un
+    subconjunto del anterior y se obtiene filtrando aquí. El texto de todas
+    las filas va en un único ``str`` (código, nombre y categoría en
+    minúsculas, una fila tras otra) con sus posiciones de inicio en una
+    lista: así se busca la subcadena más larga con ``str.find`` sobre
+    todo el bloque y solo se revisan las filas donde aparece.
+    """
+
+    def __init__(self, search, tokens, ids, blob=None, starts=None, stamp=None):
+        self.search = search
+        self.tokens = tokens
+        self.ids = ids
+        self.blob = blob        # None si el resultado superó SEARCH_TEXT_MAX
+        self.starts = starts    # len(ids) + 1 posiciones dentro de blob
+        self.stamp = stamp      # InventarioDB.change_stamp() al consultar
+
+    @staticmethod
+    def row_text(codigo, nombre, categoria):
+        return f"{codigo}\t{nombre}\t{categoria or ''}\n".lower()
+
+    def covers(self, tokens):
+        """Indica si el resultado de ``tokens`` está contenido en este"""
+        if self.blob is None or not tokens:
+            return False
+        return all(any(old in new for new in tokens) for old in self.tokens)
+
+    def narrow(self, search, tokens):
+        """Filtra en memoria y devuelve el SearchIndex de la búsqueda refinada"""
+        blob, starts = self.blob, self.starts
+        key = max(tokens, key=len)
+        others = [t for t in tokens if t is not key]
+
+        rows = []
+        row = 0
+        pos = blob.find(key)
+        while pos != -1:
+            row = bisect.bisect_right(starts, pos, row) - 1  # las posiciones solo avanzan
+            end = starts[row + 1]
+            if not others or all(t in blob[starts[row]:end] for t in others):
+                rows.append(row)
+            pos = blob.find(key, end)
+
+        if len(rows) == len(self.ids):
+            return SearchIndex(search, tokens, self.ids, blob, starts, self.stamp)
+        ids = array('q', [self.ids[row] for row in rows])
+        parts = [blob[starts[row]:starts[row + 1]] for row in rows]
+        new_starts = list(accumulate(map(len, parts), initial=0))
+        return SearchIndex(search, tokens, ids, "".join(parts), new_starts, self.stamp)
+
+PRODUCT_HEADERS = ["Código", "Nombre", "Precio", "Stock", "Categoría", "Fecha Creación"]
+
+# Filas por página del historial de movimientos
+MOVEMENT_PAGE = 200
+
+# Valores del filtro de tipo -> valor guardado en movimientos.tipo
+MOVEMENT_TYPES = {"Todos": None, "Entradas": "entrada", "Salidas": "salida"}
+
+PRODUCT_SELECT = """
+    SELECT p.id, p.codigo, p.nombre, p.precio, p.stock,
+           c.nombre, p.fecha_creacion
+    FROM productos p
+    LEFT JOIN categorias c ON p.categoria_id = c.id
+"""
+
+# Órdenes de las listas: nombre -> (columnas, posición de cada una en la
+# fila). Cada orden termina en el id para que la clave de paginación sea
+# única, y cada uno tiene un índice que entrega las filas ya ordenadas en
+# ambos sentidos (el rowid va al final de toda entrada de índice). La
+# categoría y el producto de un movimiento no se ofrecen: ordenar por el
+# nombre de otra tabla obliga a ordenar el resultado completo.
+PRODUCT_SORTS = {
+    'codigo': (('p.codigo', 'p.id'), (1, 0)),
+    'nombre': (('p.nombre', 'p.id'), (2, 0)),
+    'precio': (('p.precio', 'p.id'), (3, 0)),
+    'stock': (('p.stock', 'p.id'), (4, 0)),
+    'fecha': (('p.fecha_creacion', 'p.id'), (6, 0)),
+}
+PRODUCT_SORT = 'nombre'
+
+MOVEMENT_SORTS = {
+    'fecha': (('m.fecha', 'm.id'), (4, 0)),
+    'tipo': (('m.tipo', 'm.fecha', 'm.id'), (2, 4, 0)),
+}
+MOVEMENT_SORT = '-fecha'
+
+def sort_order(sort, sorts, default):
+    """Traduce 'precio' o '-precio' (descendente) a (columnas, posiciones, descendente)"""
+    sort = sort or default
+    desc = sort.startswith('-')
+    if sort.lstrip('-') not in sorts:
+        raise ValueError(f"Orden no válido: {sort}")
+    columns, positions = sorts[sort.lstrip('-')]
+    return columns, positions, desc
+
+def order_sql(columns, desc, reverse=False):
+    """Cláusula ORDER BY; ``reverse`` recorre el orden al revés (página anterior)"""
+    direction = "DESC" if desc != reverse else "ASC"
+    return ", ".join(f"{column} {direction}" for column in columns)
+
+def keyset_sql(columns, desc, reverse=False):
+    """Condición 'después de la clave' en el orden indicado"""
+    operator = "<" if desc != reverse else ">"
+    return f"({', '.join(columns)}) {operator} ({', '.join('?' * len(columns))})"
+
+def sort_key(sort, sorts, default):
+    """Función fila -> clave de paginación del orden"""
+    positions = sort_order(sort, sorts, default)[1]
+    return lambda row: tuple(row[i] for i in positions)
+
+# ----------------------------
+# Instrumentación
+# ----------------------------
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = 'consultas_lentas.log'
+# Límites superiores (ms) de los intervalos de los histogramas de latencia
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+def normalize_sql(sql):
+    """Una línea, y las listas de parámetros de IN (...) reducidas a una"""
+    sql = " ".join(sql.split())
+    while "?, ?, ?" in sql:
+        sql = sql.replace("?, ?, ?", "?, ?")
+    return sql.replace("?, ?", "?, ...")
+
+class QueryMonitor:
+    """Métricas de sentencias SQL y de latencia de la interfaz.
+
+    Se comparte entre todas las conexiones de la aplicación (hilos de
+    trabajo incluidos), por eso cada registro toma un lock.
+    InventarioDB.execute/query/executemany miden tiempo y filas de cada
+    sentencia. Las que superan ``slow_ms`` se guardan con su EXPLAIN QUERY
+    PLAN y, si hay ``slow_log``, se anotan en ese archivo.
+
+    Con ``trace`` se engancha además el trace callback de SQLite, que ve
+    también las sentencias internas de triggers y FTS5. Solo se usa para
+    contarlas: llega con los valores ya sustituidos y su costo por
+    sentencia duplica el tiempo de las búsquedas FTS, así que está
+    desactivado por defecto.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, slow_log=None, max_slow=200, trace=False):
+        self.slow_ms = slow_ms
+        self.trace = trace
+        self.slow_log = slow_log
+        self.max_slow = max_slow
+        self.lock = threading.Lock()
+        self.keys = {}  # sql -> sql normalizado
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            # sql -> [llamadas, segundos, máximo, filas]
+            self.statements = {}
+            self.traced = 0  # sentencias vistas por el trace de SQLite
+            # nombre -> [llamadas, segundos, máximo, conteo por intervalo]
+            self.handlers = {}
+            self.slow = []
+
+    def attach(self, db):
+        if self.trace:
+            db.conn.set_trace_callback(self._trace)
+
+    def _trace(self, sql):
+        with self.lock:
+            self.traced += 1
+
+    def observe(self, db, sql, params, seconds, rows):
+        """Registra una sentencia medida por InventarioDB; ``rows`` es None si no se conoce"""
+        key = self.keys.get(sql)
+        if key is None:
+            if len(self.keys) > 2000:
+                self.keys.clear()
+            key = self.keys[sql] = normalize_sql(sql)
+        with self.lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += rows or 0
+        if seconds * 1000 >= self.slow_ms:
+            self._slow_query(db, key, sql, params, seconds, rows)
+
+    def _slow_query(self, db, key, sql, params, seconds, rows):
+        try:
+            plan = [row[3] for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except Error as e:
+            plan = [f"(sin plan: {e})"]
+        entry = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'sql': key,
+            'params': repr(params)[:200],
+            'plan': plan,
+        }
+        with self.lock:
+            self.slow.append(entry)
+            del self.slow[:-self.max_slow]
+        if self.slow_log:
+            try:
+                with open(self.slow_log, 'a', encoding='utf-8') as file:
+                    file.write(f"{entry['time']} {entry['ms']} ms, {rows if rows is not None else '?'} filas: {key}\n"
+                               f"    parámetros: {entry['params']}\n")
+                    for line in plan:
+                        file.write(f"    {line}\n")
+            except OSError as e:
+                print(e)
+
+    def handler(self, nombre, seconds):
+        """Suma una llamada al histograma de latencia de un manejador"""
+        ms = seconds * 1000
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, ms)
+        with self.lock:
+            entry = self.handlers.get(nombre)
+            if entry is None:
+                entry = self.handlers[nombre] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS_MS) + 1)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3][bucket] += 1
+
+    @staticmethod
+    def percentile(buckets, fraction):
+        """Límite del intervalo que contiene el percentil (aproximado por arriba)"""
+        target = fraction * sum(buckets)
+        acumulado = 0
+        for i, count in enumerate(buckets):
+            acumulado += count
+            if count and acumulado >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None  # más que el último
+        return 0
+
+    def snapshot(self):
+        """Métricas actuales como dict listo para JSON"""
+        with self.lock:
+            statements = [
+                {'sql': sql, 'calls': e[0], 'total_ms': round(e[1] * 1000, 3),
+                 'avg_ms': round(e[1] * 1000 / e[0], 3), 'max_ms': round(e[2] * 1000, 3), 'rows': e[3]}
+                for sql, e in self.statements.items()
+            ]
+            traced = self.traced if self.trace else None
+            handlers = {
+                nombre: {'calls': e[0], 'avg_ms': round(e[1] * 1000 / e[0], 3), 'max_ms': round(e[2] * 1000, 3),
+                         'p50_ms': self.percentile(e[3], 0.5), 'p95_ms': self.percentile(e[3], 0.95),
+                         'histogram': dict(zip([f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"], e[3]))}
+                for nombre, e in self.handlers.items()
+            }
+            slow = list(self.slow)
+        statements.sort(key=lambda e: e['total_ms'], reverse=True)
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'slow_ms': self.slow_ms,
+            'handlers': handlers,
+            'statements': statements,
+            'traced_statements': traced,
+            'slow_queries': slow,
+        }
+
+    def report(self, top=15):
+        """Resumen en texto para el panel de diagnóstico"""
+        data = self.snapshot()
+        lines = [f"Desde {data['since']}", "", "Latencia por operación (ms):",
+                 f"  {'operación':28} {'llamadas':>8} {'media':>8} {'p50':>6} {'p95':>6} {'máx':>8}"]
+        mayor = f">{LATENCY_BUCKETS_MS[-1]}"
+        for nombre, h in sorted(data['handlers'].items()):
+            p50 = h['p50_ms'] if h['p50_ms'] is not None else mayor
+            p95 = h['p95_ms'] if h['p95_ms'] is not None else mayor
+            lines.append(f"  {nombre:28} {h['calls']:8} {h['avg_ms']:8.1f} {p50:>6} {p95:>6} {h['max_ms']:8.1f}")
+        
+        lines += ["", f"Sentencias con más tiempo acumulado (de {len(data['statements'])}):",
+                  f"  {'total ms':>9} {'veces':>7} {'media':>7} {'máx':>7} {'filas':>8}  sentencia"]
+        for e in data['statements'][:top]:
+            lines.append(f"  {e['total_ms']:9.1f} {e['calls']:7} {e['avg_ms']:7.2f} {e['max_ms']:7.1f} "
+                         f"{e['rows']:8}  {e['sql'][:110]}")
+        
+        if data['traced_statements'] is not None:
+            lines += ["", f"Sentencias ejecutadas según el trace de SQLite (con triggers y FTS5): "
+                          f"{data['traced_statements']}"]
+        
+        lines += ["", f"Consultas lentas (≥ {data['slow_ms']} ms): {len(data['slow_queries'])}"]
+        for e in data['slow_queries'][-10:]:
+            filas = e['rows'] if e['rows'] is not None else '?'
+            lines.append(f"  {e['time']}  {e['ms']} ms, {filas} filas: {e['sql'][:110]}")
+            lines += [f"      {line}" for line in e['plan']]
+        return "\n".join(lines)
+
+    def dump(self, file_path, extra=None):
+        import json
+        
+        data = self.snapshot()
+        if extra:
+            data.update(extra)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=2, ensure_ascii=False)
+
+class CategoryCache:
+    """Mapas nombre->id e id->nombre de las categorías en memoria.
+
+    Las operaciones de categorías de InventarioDB actualizan el caché
+    directamente. Los cambios hechos por otras conexiones (hilos de
+    trabajo, otros procesos) se detectan con PRAGMA data_version, que no
+    lee ninguna tabla, y solo entonces se consulta el contador 'categorias'
+    que mantienen los triggers para decidir si hay que recargar.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.by_name = None
+        self.by_id = None
+        self._sorted = None
+        self.data_version = None
+        self.version = None
+
+    def _stored_version(self):
+        row = self.db.query_one("SELECT valor FROM contadores WHERE nombre = 'categorias'")
+        return row[0] if row else None
+
+    def _load(self):
+        self.version = self._stored_version()
+        rows = self.db.query("SELECT id, nombre FROM categorias")
+        self.by_id = dict(rows)
+        self.by_name = {nombre: categoria_id for categoria_id, nombre in rows}
+        self._sorted = None
+
+    def _check(self):
+        data_version = self.db.query_one("PRAGMA data_version")[0]
+        if self.by_name is None:
+            self.data_version = data_version
+            self._load()
+        elif data_version != self.data_version:
+            self.data_version = data_version
+            if self._stored_version() != self.version:
+                self._load()
+
+    def invalidate(self):
+        self.by_name = self.by_id = self._sorted = None
+
+    def id(self, nombre):
+        self._check()
+        return self.by_name.get(nombre)
+
+    def name(self, categoria_id):
+        self._check()
+        return self.by_id.get(categoria_id)
+
+    def items(self):
+        """(id, nombre) ordenados por nombre"""
+        self._check()
+        if self._sorted is None:
+            self._sorted = sorted(self.by_id.items(), key=lambda item: item[1])
+        return self._sorted
+
+    def names(self):
+        return [nombre for _, nombre in self.items()]
+
+    def ids(self):
+        """Mapa nombre -> id para resolver muchas filas seguidas (solo lectura)"""
+        self._check()
+        return self.by_name
+
+    # ---- cambios hechos por esta conexión ----
+    def _own_change(self):
+        # El commit propio no cambia data_version; el contador avanzó en uno.
+        # Si avanzó más, otra conexión cambió categorías justo antes: se recarga
+        if self.by_name is not None:
+            stored = self._stored_version()
+            if self.version is None or stored != self.version + 1:
+                self.invalidate()
+                return
+            self.version = stored
+        self._sorted = None
+
+    def add(self, categoria_id, nombre):
+        if self.by_name is not None:
+            self.by_id[categoria_id] = nombre
+            self.by_name[nombre] = categoria_id
+        self._own_change()
+
+    def rename(self, categoria_id, nombre):
+        if self.by_name is not None:
+            self.by_name.pop(self.by_id.get(categoria_id), None)
+            self.by_id[categoria_id] = nombre
+            self.by_name[nombre] = categoria_id
+        self._own_change()
+
+    def remove(self, categoria_id):
+        if self.by_name is not None:
+            self.by_name.pop(self.by_id.pop(categoria_id, None), None)
+        self._own_change()
+
+class OperationStats:
+    """Tiempos por operación de la aplicación; requiere ``stats`` y ``monitor``"""
+
+    @contextmanager
+    def timed(self, nombre):
+        """Acumula el tiempo empleado por una operación de la aplicación"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(nombre, time.perf_counter() - inicio)
+
+    def record(self, nombre, segundos):
+        registro = self.stats.setdefault(nombre, [0, 0.0])
+        registro[0] += 1
+        registro[1] += segundos
+        if self.monitor is not None:
+            self.monitor.handler(nombre, segundos)
+
+class InventarioDB(OperationStats):
+    """Capa de acceso a datos con una única conexión persistente.
+
+    La conexión se abre una sola vez, se configura con WAL y caché de
+    páginas y reutiliza las sentencias preparadas entre operaciones.
+    Cada operación puede medirse con ``timed`` para comparar tiempos.
+    """
+
+    def __init__(self, db_file=DB_FILE, setup=True, monitor=None):
+        self.db_file = db_file
+        self.setup = setup
+        self.conn = create_connection(db_file)
+        if self.conn is None:
+            raise Error(f"No se pudo abrir la base de datos {db_file}")
+        self.monitor = monitor
+        if monitor is not None:
+            monitor.attach(self)
+        configure_connection(self.conn)
+        # Las conexiones auxiliares (hilos y procesos de trabajo) no tocan el esquema
+        if setup:
+            create_tables(self.conn)
+        self.fts_enabled = self.query_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'productos_fts'"
+        ) is not None
+        # nombre de operación -> [llamadas, segundos acumulados]
+        self.stats = {}
+        self.categories = CategoryCache(self)
+        self.grouped = False
+        self.archive_file = archive_path(db_file)
+        self.archive_attached = False
+        if setup:
+            # El escritor del servidor trabaja siempre dentro de una transacción
+            # y allí ya no puede adjuntar el archivo
+            self.attach_archive()
+
+    def execute(self, sql, params=()):
+        if self.monitor is None:
+            return self.conn.execute(sql, params)
+        inicio = time.perf_counter()
+        cursor = self.conn.execute(sql, params)
+        # Para SELECT las filas se leen después: rowcount es -1
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        self.monitor.observe(self, sql, params, time.perf_counter() - inicio, rows)
+        return cursor
+
+    def executemany(self, sql, seq_of_params):
+        if self.monitor is None:
+            return self.conn.executemany(sql, seq_of_params)
+        seq_of_params = list(seq_of_params)
+        inicio = time.perf_counter()
+        cursor = self.conn.executemany(sql, seq_of_params)
+        self.monitor.observe(self, sql, seq_of_params[0] if seq_of_params else (),
+                             time.perf_counter() - inicio, cursor.rowcount)
+        return cursor
+
+    def query(self, sql, params=()):
+        if self.monitor is None:
+            return self.conn.execute(sql, params).fetchall()
+        inicio = time.perf_counter()
+        rows = self.conn.execute(sql, params).fetchall()
+        self.monitor.observe(self, sql, params, time.perf_counter() - inicio, len(rows))
+        return rows
+
+    def query_one(self, sql, params=()):
+        if self.monitor is None:
+            return self.conn.execute(sql, params).fetchone()
+        inicio = time.perf_counter()
+        row = self.conn.execute(sql, params).fetchone()
+        self.monitor.observe(self, sql, params, time.perf_counter() - inicio, 1 if row else 0)
+        return row
+
+    def _product_filter(self, search):
+        """Condiciones WHERE y parámetros para el texto de búsqueda"""
+        if not search or not search.strip():
+            return [], []
+        if self.fts_enabled:
+            where, params, _ = build_search_query(search)
+            sql = "p.id IN (SELECT rowid FROM productos_fts WHERE " + " AND ".join(where) + ")"
+            return [sql], params
+        pattern = f"%{search}%"
+        return ["(p.codigo LIKE ? OR p.nombre LIKE ? OR c.nombre LIKE ?)"], [pattern] * 3
+
+    def search_product_ids(self, search, sort=None):
+        """Devuelve los id de los productos que coinciden, del más al menos relevante.
+
+        Con ``sort`` (ver PRODUCT_SORTS) se ordenan por esa columna.
+        """
+        # Un texto solo con espacios no filtra: devuelve todos en el orden del listado
+        if not self.fts_enabled or sort or not search.split():
+            where, params = self._product_filter(search)
+            columns, _, desc = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)
+            sql = "SELECT p.id FROM productos p LEFT JOIN categorias c ON p.categoria_id = c.id"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY " + order_sql(columns, desc)
+            return array('q', (row[0] for row in self.execute(sql, params)))
+        
+        where, params, ranked = build_search_query(search)
+        sql = "SELECT rowid FROM productos_fts WHERE " + " AND ".join(where)
+        sql += " ORDER BY rank" if ranked else " ORDER BY nombre"
+        return array('q', (row[0] for row in self.execute(sql, params)))
+
+    def search_index(self, search, stamp=None, sort=None):
+        """Como search_product_ids, pero guarda además el texto de cada fila"""
+        if self.fts_enabled and not sort and search.split():
+            where, params, ranked = build_search_query(search)
+            sql = "SELECT rowid, codigo, nombre, categoria FROM productos_fts WHERE " + " AND ".join(where)
+            sql += " ORDER BY rank" if ranked else " ORDER BY nombre"
+        else:
+            where, params = self._product_filter(search)
+            columns, _, desc = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)
+            sql = "SELECT p.id, p.codigo, p.nombre, c.nombre FROM productos p LEFT JOIN categorias c ON p.categoria_id = c.id"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY " + order_sql(columns, desc)
+        
+        ids = array('q')
+        parts = []
+        starts = [0]
+        total = 0
+        row_text = SearchIndex.row_text
+        for producto_id, codigo, nombre, categoria in self.execute(sql, params):
+            ids.append(producto_id)
+            if parts is not None:
+                text = row_text(codigo, nombre, categoria)
+                parts.append(text)
+                total += len(text)
+                starts.append(total)
+                if len(parts) > SEARCH_TEXT_MAX:
+                    parts = starts = None  # demasiado grande para guardarlo en memoria
+        
+        tokens = search_tokens(search, self.fts_enabled)
+        if parts is None:
+            return SearchIndex(search, tokens, ids, stamp=stamp)
+        return SearchIndex(search, tokens, ids, "".join(parts), starts, stamp)
+
+    def change_counters(self):
+        """{tabla: contador} de la tabla contadores; solo aumentan, también al restaurar un respaldo"""
+        return dict(self.query("SELECT nombre, valor FROM contadores"))
+
+    def change_stamp(self):
+        """Marca de los datos que usa la búsqueda; cambia con cada escritura en productos o categorías.
+
+        Sale de los contadores que mantienen los triggers, así que es la misma
+        en todas las conexiones: un hilo puede comparar la marca que tomó otro.
+        """
+        counters = self.change_counters()
+        return (counters.get('productos'), counters.get('categorias'))
+
+    def fetch_products_by_ids(self, ids):
+        """Devuelve los productos indicados en el mismo orden que ``ids``"""
+        rows = {}
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in self.query(PRODUCT_SELECT + f" WHERE p.id IN ({placeholders})", chunk):
+                rows[row[0]] = row
+        return [rows[i] for i in ids if i in rows]
+
+    def count_products(self, search=None, producto_id=None):
+        where, params = self._product_filter(search)
+        if producto_id is not None:
+            where.append("p.id = ?")
+            params.append(producto_id)
+        sql = "SELECT COUNT(*) FROM productos p"
+        if where:
+            sql += " LEFT JOIN categorias c ON p.categoria_id = c.id WHERE " + " AND ".join(where)
+        return self.query_one(sql, params)[0]
+
+    def fetch_products_page(self, after=None, limit=100, offset=0, reverse=False, search=None, sort=None):
+        """Devuelve una página de productos en el orden ``sort`` (por defecto nombre).
+
+        ``after`` es la clave (valor, id) de la última fila ya mostrada; la
+        página empieza justo después de ella (o justo antes si ``reverse``),
+        así que el coste no crece con la posición dentro de la lista.
+        """
+        columns, _, desc = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)
+        where, params = self._product_filter(search)
+        if after is not None:
+            where.append(keyset_sql(columns, desc, reverse))
+            params.extend(after)
+        
+        sql = PRODUCT_SELECT
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_sql(columns, desc, reverse)} LIMIT ? OFFSET ?"
+        
+        rows = self.query(sql, params + [limit, offset])
+        if reverse:
+            rows.reverse()
+        return rows
+
+    def _numbered_keys(self, search, sort):
+        """Subconsulta con la clave de orden (k0, k1) y el número de fila n"""
+        columns, _, desc = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)
+        where, params = self._product_filter(search)
+        sql = f"""
+            SELECT k0, k1 FROM (
+                SELECT {columns[0]} AS k0, {columns[1]} AS k1,
+                       ROW_NUMBER() OVER (ORDER BY {order_sql(columns, desc)}) AS n
+                FROM productos p
+                LEFT JOIN categorias c ON p.categoria_id = c.id
+        """
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql, params
+
+    def product_anchor_keys(self, step, search=None, sort=None):
+        """Claves (valor, id) de las filas en las posiciones step-1, 2*step-1, ..."""
+        sql, params = self._numbered_keys(search, sort)
+        sql += ") WHERE n % ? = 0 ORDER BY n"
+        return self.query(sql, params + [step])
+
+    def product_keys_at(self, positions, search=None, sort=None):
+        """Claves (valor, id) de las filas en las posiciones indicadas (base 1)"""
+        if not positions:
+            return []
+        sql, params = self._numbered_keys(search, sort)
+        placeholders = ", ".join("?" * len(positions))
+        sql += f") WHERE n IN ({placeholders}) ORDER BY n"
+        return self.query(sql, params + list(positions))
+
+    def product_column_lengths(self, search=None):
+        """Longitud máxima de cada columna visible de productos"""
+        where, params = self._product_filter(search)
+        sql = """
+            SELECT MAX(LENGTH(p.codigo)), MAX(LENGTH(p.nombre)),
+                   MAX(LENGTH(PRINTF('%.2f', p.precio))), MAX(LENGTH(p.stock)),
+                   MAX(LENGTH(c.nombre)), MAX(LENGTH(p.fecha_creacion))
+            FROM productos p
+            LEFT JOIN categorias c ON p.categoria_id = c.id
+        """
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return [length or 0 for length in self.query_one(sql, params)]
+
+    def iter_products(self, search=None, batch=1000, after=None, sort=None):
+        """Recorre los productos del filtro por lotes desde un único cursor"""
+        columns, _, desc = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)
+        where, params = self._product_filter(search)
+        if after is not None:
+            where.append(keyset_sql(columns, desc))
+            params.extend(after)
+        sql = PRODUCT_SELECT
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + order_sql(columns, desc)
+        
+        cursor = self.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield rows
+
+    def fetch_movements_page(self, before=None, limit=MOVEMENT_PAGE, tipo=None,
+                             desde=None, hasta=None, producto_id=None, sort=None):
+        """Página del historial, por defecto de más reciente a más antiguo.
+
+        ``before`` es la clave de la última fila ya mostrada en el orden
+        ``sort`` (ver MOVEMENT_SORTS); ``desde`` y ``hasta`` son fechas
+        'AAAA-MM-DD' inclusivas. Cada filtro tiene su índice, que también da
+        el orden: (fecha), (tipo, fecha) y (producto_id, fecha), siempre
+        seguidos del rowid. Si la página llega a fechas anteriores al corte
+        se completa con el archivo del historial (ver archive_movements).
+        """
+        columns, positions, desc = sort_order(sort, MOVEMENT_SORTS, MOVEMENT_SORT)
+        where, params = [], []
+        if producto_id is not None:
+            where.append("m.producto_id = ?")
+            params.append(producto_id)
+        if tipo is not None:
+            where.append("m.tipo = ?")
+            params.append(tipo)
+        if desde:
+            where.append("m.fecha >= ?")
+            params.append(desde)
+        if hasta:
+            where.append("m.fecha < date(?, '+1 day')")
+            params.append(hasta)
+        if before is not None:
+            where.append(keyset_sql(columns, desc))
+            params.extend(before)
+        
+        query = """
+            SELECT m.id, p.nombre, m.tipo, m.cantidad, m.fecha
+            FROM {tabla} m
+            JOIN productos p ON m.producto_id = p.id
+        """
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {order_sql(columns, desc)} LIMIT ?"
+        params.append(limit)
+        
+        rows = self.query(query.format(tabla="main.movimientos"), params)
+        corte = self.archive_cutoff()
+        by_date = columns[0] == 'm.fecha'
+        if (corte is None or (desde and desde >= corte)
+                or (by_date and desc and len(rows) == limit and rows[-1][4] >= corte)
+                or (by_date and not desc and before is not None and before[0] >= corte)
+                or not self.attach_archive()):
+            return rows
+        # La página llega a fechas archivadas: se completa con la misma consulta
+        # sobre el archivo. Un archivado interrumpido puede dejar una fila en ambas
+        ids = {row[0] for row in rows}
+        rows += [row for row in self.query(query.format(tabla="archivo.movimientos"), params)
+                 if row[0] not in ids]
+        rows.sort(key=lambda row: tuple(row[i] for i in positions), reverse=desc)
+        return rows[:limit]
+
+    def product_id_by_code(self, codigo):
+        row = self.query_one("SELECT id FROM productos WHERE codigo = ?", (codigo,))
+        return row[0] if row else None
+
+    # ---- archivo del historial ----
+    def attach_archive(self, create=False):
+        """Adjunta el archivo del historial como ``archivo`` y devuelve si quedó disponible.
+
+        ATTACH no puede ejecutarse dentro de una transacción: en ese caso
+        solo se informa si ya estaba adjunto.
+        """
+        if self.archive_attached:
+            return True
+        if self.conn.in_transaction or not (create or os.path.exists(self.archive_file)):
+            return False
+        try:
+            self.conn.execute("ATTACH DATABASE ? AS archivo", (self.archive_file,))
+            self.conn.execute("PRAGMA archivo.cache_size=-32000")  # el PRAGMA general solo aplica a main
+        except Error as e:
+            print(e)
+            return False
+        try:
+            if create:
+                for sql in ARCHIVE_SCHEMA:
+                    self.conn.execute(sql)
+                self.conn.commit()
+            elif self.conn.execute(
+                "SELECT 1 FROM archivo.sqlite_master WHERE type = 'table' AND name = 'movimientos'"
+            ).fetchone() is None:
+                self.conn.execute("DETACH DATABASE archivo")
+                return False
+        except Error as e:
+            print(e)
+            self.conn.rollback()
+            self.conn.execute("DETACH DATABASE archivo")
+            return False
+        self.archive_attached = True
+        return True
+
+    def archive_cutoff(self):
+        """Fecha 'AAAA-MM-DD' antes de la cual el historial está en el archivo, o None"""
+        return self.query_one("SELECT MAX(hasta) FROM archivo_cortes")[0]
+
+    def monthly_movements(self, producto_id=None, desde=None, hasta=None):
+        """Movimientos y unidades por mes y tipo: totales archivados más movimientos vigentes.
+
+        ``desde`` y ``hasta`` son meses 'AAAA-MM' inclusivos. No lee el
+        archivo. Devuelve filas (mes, tipo, movimientos, cantidad).
+        """
+        archived, archived_params = ["producto_id IS NOT NULL"], []
+        live, live_params = ["producto_id IS NOT NULL"], []
+        if producto_id is not None:
+            archived.append("producto_id = ?")
+            archived_params.append(producto_id)
+            live.append("producto_id = ?")
+            live_params.append(producto_id)
+        if desde:
+            archived.append("mes >= ?")
+            archived_params.append(desde)
+            live.append("fecha >= ?")
+            live_params.append(desde + "-01")
+        if hasta:
+            archived.append("mes <= ?")
+            archived_params.append(hasta)
+            live.append("fecha < date(?, '+1 month')")
+            live_params.append(hasta + "-01")
+        
+        return self.query(f"""
+            SELECT mes, tipo, SUM(movimientos), SUM(cantidad) FROM (
+                SELECT mes, tipo, movimientos, cantidad FROM movimientos_mensuales
+                WHERE {" AND ".join(archived)}
+                UNION ALL
+                SELECT substr(fecha, 1, 7), tipo, 1, cantidad FROM movimientos
+                WHERE {" AND ".join(live)}
+            )
+            GROUP BY mes, tipo ORDER BY mes, tipo
+        """, archived_params + live_params)
+
+    # ---- resúmenes: leen las tablas que mantienen los triggers ----
+    def inventory_summary(self):
+        """Totales del inventario; su costo depende del número de categorías, no del de filas"""
+        productos, unidades, valor = self.query_one(
+            "SELECT IFNULL(SUM(productos), 0), IFNULL(SUM(unidades), 0), IFNULL(SUM(valor), 0) "
+            "FROM resumen_categorias"
+        )
+        resumen = {'productos': productos, 'unidades': unidades, 'valor': valor,
+                   'entrada': (0, 0), 'salida': (0, 0)}
+        for tipo, movimientos, cantidad in self.query("SELECT tipo, movimientos, cantidad FROM resumen_tipos"):
+            resumen[tipo] = (movimientos, cantidad)
+        return resumen
+
+    def category_summary(self):
+        """(categoría, productos, unidades, valor) por categoría, de mayor a menor valor"""
+        return self.query(
+            """SELECT IFNULL(c.nombre, 'Sin categoría'), r.productos, r.unidades, r.valor
+               FROM resumen_categorias r LEFT JOIN categorias c ON c.id = r.categoria_id
+               WHERE r.productos > 0
+               ORDER BY r.valor DESC"""
+        )
+
+    def product_summary(self, producto_id):
+        """(entradas, salidas, n_entradas, n_salidas, último movimiento) de un producto"""
+        row = self.query_one(
+            "SELECT entradas, salidas, n_entradas, n_salidas, ultimo_movimiento "
+            "FROM resumen_productos WHERE producto_id = ?", (producto_id,)
+        )
+        return row or (0, 0, 0, 0, None)
+
+    def rebuild_summaries(self):
+        """Recalcula los resúmenes y las alertas desde las tablas (corrige el redondeo acumulado del valor)"""
+        with self.transaction():
+            for sql in SUMMARY_REBUILD + ARCHIVED_SUMMARY_REBUILD + ALERT_REBUILD:
+                self.execute(sql)
+
+    # ---- alertas de reposición: las mantienen los triggers de la migración 7 ----
+    def alert_count(self):
+        return self.query_one("SELECT COUNT(*) FROM alertas_stock")[0]
+
+    def stock_alerts(self):
+        """(id, código, nombre, categoría, stock, mínimo, faltan, desde), primero lo que más falta"""
+        return self.query(
+            """SELECT a.producto_id, p.codigo, p.nombre, c.nombre, a.stock, a.minimo, a.minimo - a.stock, a.desde
+               FROM alertas_stock a
+               JOIN productos p ON p.id = a.producto_id
+               LEFT JOIN categorias c ON c.id = p.categoria_id
+               ORDER BY a.minimo - a.stock DESC, p.nombre"""
+        )
+
+    def product_threshold(self, producto_id):
+        """(mínimo propio, mínimo de su categoría) de un producto, o None si no existe"""
+        return self.query_one(
+            """SELECT p.stock_minimo, c.stock_minimo
+               FROM productos p LEFT JOIN categorias c ON c.id = p.categoria_id
+               WHERE p.id = ?""", (producto_id,)
+        )
+
+    def category_thresholds(self):
+        """(id, nombre, mínimo) de las categorías, ordenadas por nombre"""
+        return self.query("SELECT id, nombre, stock_minimo FROM categorias ORDER BY nombre")
+
+    @staticmethod
+    def _threshold(minimo):
+        if minimo is not None and (isinstance(minimo, bool) or not isinstance(minimo, int) or minimo < 0):
+            raise ValueError("El stock mínimo debe ser un entero mayor o igual a cero")
+        return minimo
+
+    def set_product_threshold(self, producto_id, minimo):
+        """Fija el stock mínimo de un producto (None: usa el de su categoría)"""
+        minimo = self._threshold(minimo)
+        with self.transaction():
+            cursor = self.execute("UPDATE productos SET stock_minimo = ? WHERE id = ?", (minimo, producto_id))
+            if cursor.rowcount == 0:
+                raise ValueError("El producto ya no existe")
+        return (producto_id, minimo)
+
+    def set_category_threshold(self, categoria_id, minimo):
+        """Fija el stock mínimo de los productos de una categoría que no tienen uno propio"""
+        minimo = self._threshold(minimo)
+        with self.transaction():
+            cursor = self.execute("UPDATE categorias SET stock_minimo = ? WHERE id = ?", (minimo, categoria_id))
+            if cursor.rowcount == 0:
+                raise ValueError("La categoría ya no existe")
+        return (categoria_id, minimo)
+
+    # ---- escritura: cada operación devuelve las filas afectadas ----
+    def apply_movements(self, lines, line_numbers=None, rejected=()):
+        """Aplica un lote de movimientos (codigo, tipo, cantidad) en una sola transacción.
+
+        Las líneas se validan en orden con el stock que va quedando, así que
+        una salida no puede apoyarse en una entrada posterior de la misma
+        planilla. Si alguna línea no es válida no se aplica ninguna y se
+        lanza MovementBatchError con todas las rechazadas. El stock de cada
+        producto se escribe una sola vez y los movimientos se insertan con
+        ``executemany``. Devuelve {producto_id: stock nuevo}.
+        
+        ``rejected`` son errores (línea, mensaje) ya detectados al leer la
+        planilla: el lote se rechaza igual, pero se informan todos juntos.
+        """
+        if not lines and not rejected:
+            raise ValueError("El lote no tiene movimientos")
+        numbers = line_numbers or range(1, len(lines) + 1)
+        
+        with self.transaction():
+            if not self.conn.in_transaction:
+                # El stock leído para validar no puede cambiar antes de escribirlo
+                self.conn.execute("BEGIN IMMEDIATE")
+            
+            codes = list({str(codigo) for codigo, _, _ in lines})
+            productos = {}  # codigo -> [id, stock]
+            for i in range(0, len(codes), 500):
+                chunk = codes[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for codigo, producto_id, stock in self.query(
+                    f"SELECT codigo, id, stock FROM productos WHERE codigo IN ({placeholders})", chunk
+                ):
+                    productos[codigo] = [producto_id, stock]
+            
+            errors = list(rejected)
+            movements = []
+            for number, (codigo, tipo, cantidad) in zip(numbers, lines):
+                producto = productos.get(str(codigo))
+                if tipo not in MOVEMENT_KINDS:
+                    errors.append((number, f"Tipo no válido: {tipo or '(vacío)'}"))
+                elif isinstance(cantidad, bool) or not isinstance(cantidad, int) or cantidad <= 0:
+                    errors.append((number, "La cantidad debe ser un entero mayor que cero"))
+                elif producto is None:
+                    errors.append((number, f"No existe un producto con código {codigo}"))
+                elif tipo == 'salida' and cantidad > producto[1]:
+                    errors.append((number, f"Stock insuficiente de {codigo}: hay {producto[1]}, salen {cantidad}"))
+                else:
+                    producto[1] += cantidad if tipo == 'entrada' else -cantidad
+                    movements.append((producto[0], tipo, cantidad))
+            if errors:
+                raise MovementBatchError(sorted(errors))
+            
+            changed = {producto_id for producto_id, _, _ in movements}
+            stock = {producto_id: actual for producto_id, actual in productos.values() if producto_id in changed}
+            self.executemany("UPDATE productos SET stock = ? WHERE id = ?",
+                             [(actual, producto_id) for producto_id, actual in stock.items()])
+            self.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)", movements)
+        return stock
+
+    def fetch_product(self, producto_id):
+        return self.query_one(PRODUCT_SELECT + " WHERE p.id = ?", (producto_id,))
+
+    def _category_id(self, categoria):
+        categoria_id = self.categories.id(categoria)
+        if categoria_id is None:
+            raise ValueError("Categoría no válida")
+        return categoria_id
+
+    def insert_product(self, codigo, nombre, precio, stock, categoria):
+        """Inserta un producto con su movimiento de entrada y devuelve la fila creada"""
+        with self.transaction():
+            categoria_id = self._category_id(categoria)
+            
+            # Verificar si el código ya existe
+            if self.query_one("SELECT id FROM productos WHERE codigo = ?", (codigo,)):
+                raise ValueError("El código de producto ya existe")
+            
+            cursor = self.execute(
+                "INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, ?)",
+                (codigo, nombre, precio, stock, categoria_id)
+            )
+            producto_id = cursor.lastrowid
+            
+            # Registrar movimiento
+            self.execute(
+                "INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)",
+                (producto_id, 'entrada', stock)
+            )
+        return self.fetch_product(producto_id)
+
+    def update_product(self, producto_id, codigo, nombre, precio, stock, categoria):
+        """Actualiza un producto, registra el cambio de stock y devuelve la fila nueva"""
+        with self.transaction():
+            categoria_id = self._category_id(categoria)
+            
+            actual = self.query_one("SELECT stock FROM productos WHERE id = ?", (producto_id,))
+            if not actual:
+                raise ValueError("El producto ya no existe")
+            diferencia = stock - actual[0]
+            
+            self.execute(
+                """UPDATE productos
+                   SET codigo = ?, nombre = ?, precio = ?, stock = ?, categoria_id = ?
+                   WHERE id = ?""",
+                (codigo, nombre, precio, stock, categoria_id, producto_id)
+            )
+            
+            # Registrar movimiento si hay cambio en el stock
+            if diferencia != 0:
+                tipo = 'entrada' if diferencia > 0 else 'salida'
+                self.execute(
+                    "INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)",
+                    (producto_id, tipo, abs(diferencia))
+                )
+        return self.fetch_product(producto_id)
+
+    def delete_product(self, producto_id):
+        """Elimina un producto con sus movimientos y devuelve la fila borrada"""
+        if (not self.attach_archive() and self.conn.in_transaction
+                and os.path.exists(self.archive_file)):
+            # Dentro de una transacción ya no se puede adjuntar un archivo creado
+            # después de abrir la conexión: borrar dejaría movimientos huérfanos en él
+            raise ValueError("No se puede eliminar el producto: el archivo del historial "
+                             "no está disponible en esta conexión")
+        with self.transaction():
+            producto = self.fetch_product(producto_id)
+            if not producto:
+                raise ValueError("El producto ya no existe")
+            
+            # Primero eliminar movimientos relacionados, también los archivados
+            self.execute("DELETE FROM movimientos WHERE producto_id = ?", (producto_id,))
+            self.execute("DELETE FROM movimientos_mensuales WHERE producto_id = ?", (producto_id,))
+            if self.archive_attached:
+                self.execute("DELETE FROM archivo.movimientos WHERE producto_id = ?", (producto_id,))
+            
+            # Luego eliminar el producto
+            self.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
+        return producto
+
+    def insert_category(self, nombre):
+        """Inserta una categoría y devuelve (id, nombre)"""
+        with self.transaction():
+            if self.categories.id(nombre) is not None:
+                raise ValueError("Esta categoría ya existe")
+            cursor = self.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
+        self.categories.add(cursor.lastrowid, nombre)
+        return (cursor.lastrowid, nombre)
+
+    def update_category(self, categoria_id, nombre):
+        """Renombra una categoría y devuelve (id, nombre)"""
+        with self.transaction():
+            if self.categories.id(nombre) not in (None, categoria_id):
+                raise ValueError("Ya existe una categoría con ese nombre")
+            self.execute("UPDATE categorias SET nombre = ? WHERE id = ?", (nombre, categoria_id))
+        self.categories.rename(categoria_id, nombre)
+        return (categoria_id, nombre)
+
+    def delete_category(self, categoria_id):
+        """Elimina una categoría y devuelve los id de los productos que quedaron sin ella"""
+        with self.transaction():
+            # Primero dejar sin categoría a los productos que la usan
+            productos = [row[0] for row in self.query(
+                "UPDATE productos SET categoria_id = NULL WHERE categoria_id = ? RETURNING id",
+                (categoria_id,)
+            )]
+            
+            # Luego eliminar la categoría
+            self.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
+        self.categories.remove(categoria_id)
+        return productos
+
+    @contextmanager
+    def transaction(self):
+        """Confirma los cambios al salir del bloque o los revierte si hay error"""
+        if self.grouped:
+            # Dentro de group_commit cada operación es un savepoint: si falla
+            # se deshace solo ella y el commit lo hace el grupo
+            self.conn.execute("SAVEPOINT operacion")
+            try:
+                yield self.conn
+                self.conn.execute("RELEASE operacion")
+            except BaseException:
+                self.conn.execute("ROLLBACK TO operacion")
+                self.conn.execute("RELEASE operacion")
+                self.categories.invalidate()
+                raise
+            return
+        try:
+            yield self.conn
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            self.categories.invalidate()  # pudo tener altas que no se confirmaron
+            raise
+
+    @contextmanager
+    def group_commit(self):
+        """Confirma con un solo commit todas las operaciones del bloque.
+
+        Las transacciones de las operaciones de escritura pasan a ser
+        savepoints, así que una operación que falla no arrastra a las demás.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.grouped = True
+        try:
+            yield self.conn
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            self.categories.invalidate()
+            raise
+        finally:
+            self.grouped = False
+
+    def interrupt(self):
+        """Interrumpe la consulta en curso (se puede llamar desde otro hilo)"""
+        self.conn.interrupt()
+
+    def rollback(self):
+        """Descarta una transacción que haya quedado abierta"""
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+    def connection_overhead(self, repeticiones=20):
+        """Mide cuánto cuesta abrir una conexión por operación frente a reutilizarla.
+
+        Devuelve los milisegundos medios de una consulta típica con ambas
+        estrategias; la diferencia es el ahorro por operación.
+        """
+        sql = "SELECT COUNT(*) FROM categorias"
+
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            conn = create_connection(self.db_file)
+            conn.execute(sql).fetchone()
+            conn.close()
+        por_conexion = (time.perf_counter() - inicio) / repeticiones * 1000
+
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            self.query_one(sql)
+        persistente = (time.perf_counter() - inicio) / repeticiones * 1000
+
+        return {
+            'por_conexion_ms': por_conexion,
+            'persistente_ms': persistente,
+            'ahorro_ms': por_conexion - persistente,
+        }
+
+    def close(self):
+        if self.conn is not None:
+            # Solo la conexión principal actualiza las estadísticas al salir
+            if self.setup:
+                try:
+                    self.conn.execute("PRAGMA optimize")
+                except Error as e:
+                    print(e)
+            self.conn.close()
+            self.conn = None
+
+# ----------------------------
+# Exportación
+# ----------------------------
+EXPORT_BATCH = 5000
+
+def export_products_csv(db, file_path, search=None, compress=None, progress=None, cancelled=None, batch=EXPORT_BATCH,
+                        sort=None):
+    """Escribe los productos en CSV directamente desde la base de datos.
+
+    Las filas se leen con ``fetchmany`` por lotes, así que la memoria no
+    depende del tamaño del inventario. Si el nombre termina en ``.gz`` (o
+    ``compress`` es True) el archivo se comprime con gzip. Se escribe en un
+    archivo temporal que solo se renombra al terminar; si ``cancelled()``
+    devuelve True se descarta y la función devuelve None. En otro caso
+    devuelve el número de filas escritas, en el orden ``sort`` (ver
+    PRODUCT_SORTS).
+    """
+    import csv, gzip  # solo se cargan al exportar o importar
+    
+    if compress is None:
+        compress = file_path.endswith('.gz')
+    opener = gzip.open if compress else open
+    part = file_path + '.part'
+    
+    total = db.count_products(search)
+    written = 0
+    try:
+        with opener(part, 'wt', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(PRODUCT_HEADERS)
+            for rows in db.iter_products(search, batch, sort=sort):
+                if cancelled and cancelled():
+                    break
+                writer.writerows(row[1:] for row in rows)
+                written += len(rows)
+                if progress:
+                    progress(written, total)
+        
+        if cancelled and cancelled():
+            os.remove(part)
+            return None
+        os.replace(part, file_path)
+        return written
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+def export_stock_alerts_csv(db, file_path):
+    """Escribe en CSV los productos por reponer y devuelve cuántos son"""
+    import csv
+    
+    rows = db.stock_alerts()
+    part = file_path + '.part'
+    try:
+        with open(part, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(ALERT_HEADERS)
+            writer.writerows(row[1:] for row in rows)
+        os.replace(part, file_path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return len(rows)
+
+# ----------------------------
+# Importación masiva
+# ----------------------------
+IMPORT_BATCH = 50000
+IMPORT_REQUIRED = ['codigo', 'nombre', 'precio', 'stock']
+
+UPSERT_PRODUCT = """
+    INSERT INTO productos (codigo, nombre, precio, stock, categoria_id)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(codigo) DO UPDATE SET
+        nombre = excluded.nombre,
+        precio = excluded.precio,
+        stock = excluded.stock,
+        categoria_id = excluded.categoria_id
+"""
+
+INSERT_MOVEMENT_BY_CODE = """
+    INSERT INTO movimientos (producto_id, tipo, cantidad)
+    SELECT id, ?, ? FROM productos WHERE codigo = ?
+"""
+
+class ImportReport:
+    """Resultado de una importación: contadores y errores por fila"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.categories_created = 0
+        self.errors = []  # (línea, mensaje)
+        self.seconds = 0.0
+        self.cancelled = False
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + len(self.errors)
+
+    def summary(self):
+        return (f"{self.inserted} productos nuevos, {self.updated} actualizados, "
+                f"{self.categories_created} categorías creadas, {len(self.errors)} filas con error "
+                f"({self.seconds:.1f} s)")
+
+    def write_errors(self, file_path):
+        import csv
+        
+        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Línea", "Error"])
+            writer.writerows(self.errors)
+
+def normalize_header(text):
+    """'Categoría ' -> 'categoria'"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    return text.encode('ascii', 'ignore').decode('ascii').strip().lower()
+
+def cell_text(value):
+    """Texto de una celda; los números enteros de Excel no arrastran '.0'"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def read_csv_rows(file_path):
+    """Lee un CSV (o .csv.gz) en streaming y devuelve (línea, valores)"""
+    import csv, gzip
+    
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rt', newline='', encoding='utf-8-sig', errors='replace') as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(file, dialect)
+        for values in reader:
+            yield reader.line_num, values
+
+def read_excel_rows(file_path):
+    """Lee la primera hoja de un .xlsx en modo solo lectura y devuelve (línea, valores)"""
+    try:
+        import openpyxl  # dependencia opcional, solo para importar Excel
+    except ImportError:
+        raise ValueError("Para importar archivos Excel instale el paquete openpyxl")
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for line, values in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            yield line, list(values)
+    finally:
+        workbook.close()
+
+def parse_import_row(values, columns):
+    """Valida una fila y devuelve (codigo, nombre, precio, stock, categoria)"""
+    def get(name):
+        index = columns.get(name)
+        return cell_text(values[index]) if index is not None and index < len(values) else ''
+    
+    codigo, nombre = get('codigo'), get('nombre')
+    precio, stock, categoria = get('precio'), get('stock'), get('categoria')
+    
+    if not codigo or not nombre:
+        raise ValueError("Código y nombre son obligatorios")
+    try:
+        if ',' in precio and '.' not in precio:
+            precio = precio.replace(',', '.')
+        precio = float(precio)
+        stock = float(stock)
+    except ValueError:
+        raise ValueError("Precio y stock deben ser números válidos")
+    if not stock.is_integer():
+        raise ValueError("El stock debe ser un número entero")
+    if precio < 0 or stock < 0:
+        raise ValueError("Precio y stock no pueden ser negativos")
+    return codigo, nombre, precio, int(stock), categoria
+
+def import_products(db, file_path, create_categories=True, progress=None, cancelled=None, batch=IMPORT_BATCH):
+    """Importa productos desde CSV o Excel con inserciones masivas.
+
+    El archivo se lee en streaming y se procesa en lotes de ``batch`` filas;
+    cada lote es una transacción con ``executemany`` que hace upsert por
+    código y registra en el mismo lote los movimientos de entrada o salida
+    que explican el stock nuevo. Las categorías se resuelven con un mapa en
+    memoria (y se crean si ``create_categories``). Las filas inválidas no
+    detienen la importación: quedan en ``ImportReport.errors``.
+    """
+    inicio = time.perf_counter()
+    report = ImportReport()
+    
+    if file_path.lower().endswith(('.xlsx', '.xlsm')):
+        rows = read_excel_rows(file_path)
+    else:
+        rows = read_csv_rows(file_path)
+    
+    # Encabezados
+    columns = None
+    for line, values in rows:
+        if any(cell_text(v) for v in values):
+            columns = {normalize_header(v): i for i, v in enumerate(values)}
+            break
+    if columns is None:
+        raise ValueError("El archivo está vacío")
+    missing = [name for name in IMPORT_REQUIRED if name not in columns]
+    if missing:
+        raise ValueError("Faltan columnas obligatorias: " + ", ".join(missing))
+    
+    categorias = db.categories
+    
+    def flush(pending):
+        # pending: codigo -> (línea, codigo, nombre, precio, stock, categoria)
+        if not pending:
+            return
+        with db.transaction():
+            # Altas de categorías nuevas
+            ids = categorias.ids()
+            for _, _, _, _, _, categoria in pending.values():
+                if categoria and categoria not in ids:
+                    cursor = db.execute("INSERT INTO categorias (nombre) VALUES (?)", (categoria,))
+                    categorias.add(cursor.lastrowid, categoria)
+                    report.categories_created += 1
+            
+            # Stock actual de los códigos que ya existen
+            codes = list(pending)
+            existing = {}
+            for i in range(0, len(codes), 500):
+                chunk = codes[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                existing.update(db.query(
+                    f"SELECT codigo, stock FROM productos WHERE codigo IN ({placeholders})", chunk
+                ))
+            
+            products = []
+            movements = []
+            for _, codigo, nombre, precio, stock, categoria in pending.values():
+                products.append((codigo, nombre, precio, stock, ids.get(categoria)))
+                if codigo in existing:
+                    report.updated += 1
+                    diferencia = stock - existing[codigo]
+                    if diferencia != 0:
+                        tipo = 'entrada' if diferencia > 0 else 'salida'
+                        movements.append((tipo, abs(diferencia), codigo))
+                else:
+                    report.inserted += 1
+                    if stock > 0:
+                        movements.append(('entrada', stock, codigo))
+            
+            # El contador de productos sube una vez por lote, no por fila
+            with counted_once(db):
+                db.executemany(UPSERT_PRODUCT, products)
+            db.executemany(INSERT_MOVEMENT_BY_CODE, movements)
+    
+    pending = {}
+    suspended = False
+    try:
+        for line, values in rows:
+            if not any(cell_text(v) for v in values):
+                continue
+            try:
+                codigo, nombre, precio, stock, categoria = parse_import_row(values, columns)
+                if not create_categories and categoria and categorias.id(categoria) is None:
+                    raise ValueError(f"Categoría no válida: {categoria}")
+            except ValueError as e:
+                report.errors.append((line, str(e)))
+                continue
+            
+            # Si un código se repite dentro del lote, gana la última fila y la
+            # anterior queda informada como error
+            previous = pending.pop(codigo, None)
+            if previous is not None:
+                report.errors.append((previous[0], f"Código duplicado en el archivo: {codigo} "
+                                                    f"(se usa la línea {line})"))
+            pending[codigo] = (line, codigo, nombre, precio, stock, categoria)
+            
+            if len(pending) >= batch:
+                if cancelled and cancelled():
+                    report.cancelled = True
+                    break
+                # Más de un lote: el índice de búsqueda se regenera al final
+                if db.fts_enabled and not suspended:
+                    suspend_search_index(db.conn)
+                    suspended = True
+                flush(pending)
+                pending = {}
+                if progress:
+                    progress(report.processed)
+        
+        if not report.cancelled and not (cancelled and cancelled()):
+            flush(pending)
+        else:
+            report.cancelled = True
+    finally:
+        if suspended:
+            create_search_index(db.conn)
+    
+    report.errors.sort()  # los duplicados se detectan después de la línea que informan
+    report.seconds = time.perf_counter() - inicio
+    if progress:
+        progress(report.processed)
+    return report
+
+# ----------------------------
+# Movimientos por lote (planillas de recepción y despacho)
+# ----------------------------
+MOVEMENT_KINDS = ('entrada', 'salida')
+
+class MovementBatchError(ValueError):
+    """Lote de movimientos rechazado completo; ``errors`` tiene (línea, mensaje)"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        detalle = "; ".join(f"línea {line}: {message}" for line, message in errors[:5])
+        if len(errors) > 5:
+            detalle += f" (y {len(errors) - 5} más)"
+        super().__init__(f"No se aplicó ningún movimiento. {detalle}")
+
+def parse_movement_rows(rows, tipo=None):
+    """Convierte filas (línea, valores) de una planilla en líneas (codigo, tipo, cantidad).
+
+    La primera fila con datos puede ser un encabezado con las columnas
+    codigo, tipo y cantidad. Sin encabezado cada fila es codigo, cantidad
+    (con el ``tipo`` indicado) o codigo, tipo, cantidad. Devuelve (líneas,
+    números de línea, errores).
+    """
+    lines, numbers, errors = [], [], []
+    header = None
+    for line, values in rows:
+        values = [cell_text(v) for v in values]
+        if not any(values):
+            continue
+        if header is None:
+            header = {normalize_header(v): i for i, v in enumerate(values)}
+            if 'codigo' in header and 'cantidad' in header:
+                continue
+            header = {}
+        
+        if header:
+            columns = header
+        elif len([v for v in values if v]) == 2:
+            columns = {'codigo': 0, 'cantidad': 1}
+        else:
+            columns = {'codigo': 0, 'tipo': 1, 'cantidad': 2}
+        if not header:
+            values = [v for v in values if v]  # 'P1;5;' o columnas vacías intermedias
+        
+        def get(name):
+            index = columns.get(name)
+            return values[index] if index is not None and index < len(values) else ''
+        
+        codigo = get('codigo')
+        kind = (get('tipo') or tipo or '').lower()
+        if not codigo:
+            errors.append((line, "Falta el código"))
+            continue
+        try:
+            cantidad = float(get('cantidad'))
+        except ValueError:
+            errors.append((line, "La cantidad debe ser un número"))
+            continue
+        if not cantidad.is_integer():
+            errors.append((line, "La cantidad debe ser un número entero"))
+            continue
+        lines.append((codigo, kind, int(cantidad)))
+        numbers.append(line)
+    return lines, numbers, errors
+
+def read_movement_sheet(file_path, tipo=None):
+    """Lee una planilla CSV o Excel de movimientos; ver parse_movement_rows"""
+    if file_path.lower().endswith(('.xlsx', '.xlsm')):
+        return parse_movement_rows(read_excel_rows(file_path), tipo)
+    return parse_movement_rows(read_csv_rows(file_path), tipo)
+
+def parse_movement_text(text, tipo=None):
+    """Líneas pegadas desde una planilla: separadas por tabulador, ';', ',' o espacios"""
+    rows = []
+    for line, row in enumerate(text.splitlines(), start=1):
+        for separator in ('\t', ';', ','):
+            if separator in row:
+                rows.append((line, row.split(separator)))
+                break
+        else:
+            rows.append((line, row.split()))
+    return parse_movement_rows(rows, tipo)
+
+# ----------------------------
+# Archivado del historial de movimientos
+# ----------------------------
+ARCHIVE_BATCH = 50000
+
+# CROSS JOIN fija el orden: se recorre el lote y se busca cada movimiento por
+# id; la tabla temporal no tiene estadísticas y el planificador prefería
+# recorrer movimientos completo
+ARCHIVE_COPY = """
+    INSERT OR IGNORE INTO archivo.movimientos (id, producto_id, tipo, cantidad, fecha)
+    SELECT m.id, m.producto_id, m.tipo, m.cantidad, m.fecha
+    FROM temp.lote_archivo l CROSS JOIN main.movimientos m ON m.id = l.id
+"""
+
+ARCHIVE_ROLLUP = """
+    INSERT INTO movimientos_mensuales (producto_id, mes, tipo, movimientos, cantidad, ultimo)
+    SELECT m.producto_id, substr(m.fecha, 1, 7), m.tipo, COUNT(*), SUM(m.cantidad), MAX(m.fecha)
+    FROM temp.lote_archivo l CROSS JOIN main.movimientos m ON m.id = l.id
+    WHERE m.producto_id IS NOT NULL
+    GROUP BY m.producto_id, substr(m.fecha, 1, 7), m.tipo
+    ON CONFLICT(producto_id, mes, tipo) DO UPDATE SET
+        movimientos = movimientos + excluded.movimientos,
+        cantidad = cantidad + excluded.cantidad,
+        ultimo = MAX(ultimo, excluded.ultimo)
+"""
+
+def archive_movements(db, before, batch=ARCHIVE_BATCH, compact=False, progress=None, cancelled=None):
+    """Mueve al archivo del historial los movimientos anteriores a ``before`` ('AAAA-MM-DD').
+
+    Cada lote se copia primero al archivo y se confirma; después, en una
+    transacción de la base principal, sus totales se suman a
+    movimientos_mensuales y se borra. En WAL un commit que abarca dos
+    archivos no es atómico: con este orden una interrupción nunca pierde
+    movimientos, a lo sumo quedan en ambas bases (el historial los muestra
+    una vez) hasta el siguiente archivado, que los copia con INSERT OR
+    IGNORE. Los resúmenes de la migración 4 no cambian porque siguen
+    contando todo el historial. Con ``compact`` se ejecuta VACUUM al final
+    para que el archivo principal devuelva el espacio liberado.
+    """
+    try:
+        datetime.strptime(before, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError("La fecha de corte debe tener el formato AAAA-MM-DD")
+    inicio = time.perf_counter()
+    if not db.attach_archive(create=True):
+        raise Error(f"No se pudo abrir el archivo del historial {db.archive_file}")
+    
+    # El corte se registra antes de mover nada: desde ese momento el
+    # historial consulta el archivo para las fechas anteriores
+    with db.transaction():
+        db.execute("INSERT OR IGNORE INTO archivo_cortes (hasta) VALUES (?)", (before,))
+    total = db.query_one("SELECT COUNT(*) FROM movimientos WHERE fecha < ?", (before,))[0]
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS lote_archivo (id INTEGER PRIMARY KEY)")
+    
+    moved = 0
+    cancelado = False
+    while True:
+        if cancelled and cancelled():
+            cancelado = True
+            break
+        with db.transaction():
+            db.execute("DELETE FROM temp.lote_archivo")
+            count = db.execute(
+                "INSERT INTO temp.lote_archivo SELECT id FROM main.movimientos WHERE fecha < ? "
+                "ORDER BY fecha LIMIT ?", (before, batch)
+            ).rowcount
+            if count:
+                db.execute(ARCHIVE_COPY)
+        if not count:
+            break
+        with db.transaction():
+            db.execute(ARCHIVE_ROLLUP)
+            db.execute("DELETE FROM main.movimientos WHERE id IN (SELECT id FROM temp.lote_archivo)")
+            db.execute("UPDATE archivo_cortes SET movimientos = movimientos + ? WHERE hasta = ?",
+                       (count, before))
+        moved += count
+        if progress:
+            progress(moved, total)
+    
+    if compact and not cancelado:
+        db.execute("VACUUM main")
+    return {
+        'movimientos': moved,
+        'hasta': before,
+        'archivo': db.archive_file,
+        'cancelado': cancelado,
+        'segundos': time.perf_counter() - inicio,
+    }
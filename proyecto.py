@@ -1,82 +1,739 @@
+import time
+START_TIME = time.perf_counter()  # antes de cargar tkinter, para medir el arranque completo
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
 from sqlite3 import Error
-import csv
-from fpdf import FPDF
 from datetime import datetime
+from array import array
+from functools import cmp_to_key
+import bisect
+import multiprocessing
+import os
+import queue
+import threading
+
+# reportes (fpdf, pypdf) se importa al exportar a PDF: es más de la mitad
+# del tiempo de importación de la aplicación
+from inventario_core import (
+    InventarioDB, QueryMonitor, PRODUCT_HEADERS, MOVEMENT_PAGE, MOVEMENT_TYPES, SLOW_QUERY_LOG,
+    PRODUCT_SORT, PRODUCT_SORTS, MOVEMENT_SORT, MOVEMENT_SORTS, ALERT_HEADERS,
+    MovementBatchError, export_products_csv, export_stock_alerts_csv, import_products, parse_movement_text,
+    read_movement_sheet,
+    search_tokens, sort_key, sort_order,
+)
+from respaldos import BACKUP_DIR, backup_database, restore_backup
+from cache_reportes import CACHED_NOTE, ReportCache, cached_report, report_cache_dir
 
 # ----------------------------
-# Configuración de la Base de Datos
+# Consultas en segundo plano
 # ----------------------------
-def create_connection():
-    conn = None
-    try:
-        conn = sqlite3.connect('inventario.db')
-        return conn
-    except Error as e:
-        print(e)
-    return conn
-
-def create_tables(conn):
-    sql_scripts = [
-        """CREATE TABLE IF NOT EXISTS categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL UNIQUE
-        );""",
-        """CREATE TABLE IF NOT EXISTS productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo TEXT NOT NULL UNIQUE,
-            nombre TEXT NOT NULL,
-            precio REAL NOT NULL,
-            stock INTEGER NOT NULL,
-            categoria_id INTEGER,
-            fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (categoria_id) REFERENCES categorias(id)
-        );""",
-        """CREATE TABLE IF NOT EXISTS movimientos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            producto_id INTEGER,
-            tipo TEXT NOT NULL,
-            cantidad INTEGER NOT NULL,
-            fecha TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (producto_id) REFERENCES productos(id)
-        );"""
-    ]
-    
-    try:
-        c = conn.cursor()
-        for script in sql_scripts:
-            c.execute(script)
-        conn.commit()
-    except Error as e:
-        print(e)
+POLL_MS = 30  # cada cuánto revisa la ventana la cola de resultados
+
+class Task:
+    """Trabajo enviado al QueryExecutor"""
+
+    def __init__(self, executor, key, func, on_done, on_error, on_progress, name):
+        self.executor = executor
+        self.key = key
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.name = name
+        self.submitted = time.perf_counter()
+        self.cancelled = False
+        self.db = None
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """Marca la tarea como obsoleta e interrumpe su consulta si ya está en marcha"""
+        with self.lock:
+            self.cancelled = True
+            if self.db is not None:
+                self.db.interrupt()
+
+    def progress(self, done, total=None):
+        """Informa del avance; se entrega a on_progress en el hilo de Tk"""
+        self.executor.results.put(('progress', self, (done, total)))
+
+class QueryExecutor:
+    """Ejecuta el trabajo de base de datos en hilos y devuelve los resultados a Tk.
+
+    Cada hilo tiene su propia conexión (WAL permite leer mientras la
+    ventana escribe). Los resultados vuelven por una cola que se revisa
+    con ``root.after``, así que los callbacks siempre corren en el hilo
+    de Tk. Una tarea nueva con la misma ``key`` cancela la anterior.
+    """
+
+    def __init__(self, root, connect, workers=2, stats=None, on_busy=None):
+        self.root = root
+        self.connect = connect  # crea la conexión de cada hilo
+        self.stats = stats
+        self.on_busy = on_busy
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}
+        self.pending = 0
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self._after = self.root.after(POLL_MS, self._poll)
+
+    def submit(self, key, func, on_done=None, on_error=None, on_progress=None, name=None):
+        """Encola ``func(db, task)``; ``on_done(resultado)`` se llama en el hilo de Tk"""
+        if key is not None and key in self.latest:
+            self.latest[key].cancel()
+        task = Task(self, key, func, on_done, on_error, on_progress, name)
+        if key is not None:
+            self.latest[key] = task
+        self.pending += 1
+        self.tasks.put(task)
+        self._notify()
+        return task
+
+    def cancel(self, key):
+        if key in self.latest:
+            self.latest.pop(key).cancel()
+
+    def _worker(self):
+        db = self.connect()
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                with task.lock:
+                    if task.cancelled:
+                        self.results.put(('cancelled', task, None))
+                        continue
+                    task.db = db
+                
+                inicio = time.perf_counter()
+                try:
+                    result = task.func(db, task)
+                    kind = 'done'
+                except Exception as e:
+                    result = e
+                    kind = 'error'
+                finally:
+                    with task.lock:
+                        task.db = None
+                    db.rollback()
+                self.results.put((kind, task, (result, time.perf_counter() - inicio)))
+        finally:
+            db.close()
+
+    def _poll(self):
+        try:
+            while True:
+                kind, task, payload = self.results.get_nowait()
+                if kind == 'progress':
+                    if not task.cancelled and task.on_progress:
+                        task.on_progress(*payload)
+                    continue
+                
+                self.pending -= 1
+                if self.latest.get(task.key) is task:
+                    del self.latest[task.key]
+                if task.cancelled or kind == 'cancelled':
+                    continue
+                
+                result, elapsed = payload
+                if task.name and self.stats is not None:
+                    # Latencia vista por el usuario (cola incluida) y tiempo en el hilo
+                    self.stats.record(task.name, time.perf_counter() - task.submitted)
+                    self.stats.record(f"{task.name} (consulta)", elapsed)
+                if kind == 'done':
+                    if task.on_done:
+                        task.on_done(result)
+                elif task.on_error:
+                    task.on_error(result)
+                else:
+                    messagebox.showerror("Error", str(result))
+        except queue.Empty:
+            pass
+        finally:
+            self._notify()
+            self._after = self.root.after(POLL_MS, self._poll)
+
+    def _notify(self):
+        if self.on_busy:
+            self.on_busy(self.pending)
+
+    def shutdown(self):
+        self.root.after_cancel(self._after)
+        for task in list(self.latest.values()):
+            task.cancel()
+        for _ in self.threads:
+            self.tasks.put(None)
+
+class ProgressDialog:
+    """Ventana con barra de progreso y botón Cancelar para tareas largas"""
+
+    def __init__(self, parent, title, on_cancel):
+        self.on_cancel = on_cancel
+        self.top = tk.Toplevel(parent)
+        self.top.title(title)
+        self.top.transient(parent)
+        self.top.resizable(False, False)
+        self.top.protocol("WM_DELETE_WINDOW", self.cancel)
+        
+        frame = ttk.Frame(self.top, padding=15)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.label = ttk.Label(frame, text="Preparando...", style='TLabel')
+        self.label.pack(fill=tk.X, pady=(0, 10))
+        self.bar = ttk.Progressbar(frame, mode='determinate', length=320, maximum=100)
+        self.bar.pack(fill=tk.X)
+        ttk.Button(frame, text="Cancelar", command=self.cancel, style='Danger.TButton').pack(pady=(10, 0))
+
+    def update(self, done, total=None):
+        if total:
+            self.bar['value'] = done * 100 / total
+            self.label.config(text=f"{done:,} de {total:,}")
+        else:
+            self.label.config(text=f"{done:,} procesados")
+
+    def cancel(self):
+        self.on_cancel()
+        self.close()
+
+    def close(self):
+        if self.top.winfo_exists():
+            self.top.destroy()
 
 # ----------------------------
-# Clase para el PDF
+# Lista virtual de productos
 # ----------------------------
-class PDF(FPDF):
-    def __init__(self):
-        super().__init__(orientation='L')  # 'L' para landscape (horizontal)
-        self.set_auto_page_break(auto=True, margin=15)
-    
-    def header(self):
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 10, 'Reporte de Inventario', 0, 1, 'C')
-        self.ln(5)
-    
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+PAGE_BUFFER = 50     # filas extra en caché por encima y por debajo de la vista
+ANCHOR_STEP = 500    # cada cuántas filas se recuerda una clave para saltos del scrollbar
+
+# En orden descendente las claves se comparan al revés al ubicar filas nuevas
+DescendingKey = cmp_to_key(lambda a, b: (a < b) - (a > b))
+
+class ProductRow:
+    """Producto con sus valores tipados, tal como vienen de la base de datos"""
+
+    __slots__ = ('id', 'codigo', 'nombre', 'precio', 'stock', 'categoria', 'fecha')
+
+    def __init__(self, id, codigo, nombre, precio, stock, categoria, fecha):
+        self.id = id
+        self.codigo = codigo
+        self.nombre = nombre
+        self.precio = precio
+        self.stock = stock
+        self.categoria = categoria
+        self.fecha = fecha
+
+    def astuple(self):
+        return (self.id, self.codigo, self.nombre, self.precio, self.stock, self.categoria, self.fecha)
+
+class ProductColumns:
+    """Filas de productos guardadas por columnas, con la interfaz de lista que usa VirtualList.
+
+    Los id, precios y stocks van en ``array`` (8 bytes por valor, sin un
+    objeto de Python por número) y los textos en listas; no se guarda una
+    tupla por fila. Indexar devuelve la tupla de PRODUCT_SELECT, así que las
+    claves de orden y las fuentes de datos no cambian. ``row`` y ``by_code``
+    buscan por id o por código y devuelven un ProductRow con los tipos
+    originales, sin pasar por los textos del Treeview.
+    """
+
+    __slots__ = ('ids', 'codigos', 'nombres', 'precios', 'stocks', 'categorias', 'fechas', '_by_id', '_by_code')
+
+    def __init__(self, rows=()):
+        self.ids = array('q')
+        self.codigos = []
+        self.nombres = []
+        self.precios = array('d')
+        self.stocks = array('q')
+        self.categorias = []
+        self.fechas = []
+        self._by_id = self._by_code = None
+        self.extend(rows)
+
+    def _columns(self):
+        return (self.ids, self.codigos, self.nombres, self.precios, self.stocks, self.categorias, self.fechas)
+
+    @staticmethod
+    def _split(rows):
+        """Filas -> una secuencia por columna, con el tipo de cada columna"""
+        values = list(zip(*rows)) or [()] * 7
+        return (array('q', values[0]), list(values[1]), list(values[2]), array('d', values[3]),
+                array('q', values[4]), list(values[5]), list(values[6]))
+
+    def _changed(self):
+        self._by_id = self._by_code = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(*(column[index] for column in self._columns())))
+        return tuple(column[index] for column in self._columns())
+
+    def __iter__(self):
+        return zip(*self._columns())
+
+    def __setitem__(self, index, rows):
+        if not isinstance(index, slice):
+            index, rows = slice(index, index + 1 if index != -1 else None), [rows]
+        for column, values in zip(self._columns(), self._split(rows)):
+            column[index] = values
+        self._changed()
+
+    def __delitem__(self, index):
+        for column in self._columns():
+            del column[index]
+        self._changed()
+
+    def insert(self, index, row):
+        for column, value in zip(self._columns(), row):
+            column.insert(index, value)
+        self._changed()
+
+    def extend(self, rows):
+        for column, values in zip(self._columns(), self._split(rows)):
+            column.extend(values)
+        self._changed()
+
+    def index_of(self, producto_id):
+        """Posición de un producto en caché, o None"""
+        if self._by_id is None:
+            self._by_id = {producto_id: i for i, producto_id in enumerate(self.ids)}
+        return self._by_id.get(producto_id)
+
+    def row(self, producto_id):
+        index = self.index_of(producto_id)
+        return ProductRow(*self[index]) if index is not None else None
+
+    def by_code(self, codigo):
+        if self._by_code is None:
+            self._by_code = {codigo: i for i, codigo in enumerate(self.codigos)}
+        index = self._by_code.get(codigo)
+        return ProductRow(*self[index]) if index is not None else None
+
+class ProductSource:
+    """Origen de datos paginado para la lista de productos"""
+
+    ordered = True  # las filas siguen el orden de key()
+
+    def __init__(self, db, search=None, sort=None):
+        self.db = db
+        self.search = search
+        self.sort = sort
+        self.key = sort_key(sort, PRODUCT_SORTS, PRODUCT_SORT)
+        self.descending = sort_order(sort, PRODUCT_SORTS, PRODUCT_SORT)[2]
+
+    def count(self):
+        return self.db.count_products(self.search)
+
+    def page(self, after=None, limit=100, offset=0, reverse=False):
+        return self.db.fetch_products_page(after, limit, offset, reverse, self.search, self.sort)
+
+    def anchor_keys(self, step):
+        return self.db.product_anchor_keys(step, self.search, self.sort)
+
+    def fetch(self, ids):
+        return self.db.fetch_products_by_ids(ids)
+
+    def accepts(self, row):
+        """Indica si una fila nueva pertenece a este resultado"""
+        return not self.search or self.db.count_products(self.search, row[0]) > 0
+
+    def discard(self, producto_id):
+        pass
+
+    def order_key(self, row):
+        """Clave que compara en el sentido de la lista"""
+        return DescendingKey(self.key(row)) if self.descending else self.key(row)
+
+class SearchSource:
+    """Resultados de búsqueda ordenados por relevancia.
+
+    Solo guarda los id ordenados (en un ``array`` compacto); los datos de
+    cada página se piden a la base de datos cuando se van a mostrar. La
+    clave de paginación es la posición dentro del resultado.
+    """
+
+    ordered = False  # el orden viene del ranking, no de key()
+
+    def __init__(self, db, ids):
+        self.db = db
+        self.ids = ids
+        self.positions = {}
+
+    def count(self):
+        return len(self.ids)
+
+    def page(self, after=None, limit=100, offset=0, reverse=False):
+        if reverse:
+            end = max(0, after - offset)
+            start = max(0, end - limit)
+        else:
+            start = (after + 1 if after is not None else 0) + offset
+            end = start + limit
+        
+        ids = self.ids[start:end]
+        for pos, producto_id in enumerate(ids, start):
+            self.positions[producto_id] = pos
+        return self.db.fetch_products_by_ids(ids)
+
+    def anchor_keys(self, step):
+        return list(range(step - 1, len(self.ids), step))
+
+    def fetch(self, ids):
+        return self.db.fetch_products_by_ids(ids)
+
+    def accepts(self, row):
+        # El resultado de una búsqueda es una foto fija: no admite filas nuevas
+        return False
+
+    def discard(self, producto_id):
+        if producto_id in self.ids:
+            self.ids.remove(producto_id)
+
+    def key(self, row):
+        pos = self.positions.get(row[0])
+        if pos is None or pos >= len(self.ids) or self.ids[pos] != row[0]:
+            pos = self.ids.index(row[0])
+            self.positions[row[0]] = pos
+        return pos
+
+    order_key = key
+
+class VirtualList:
+    """Treeview virtual que solo guarda las filas visibles más un pequeño margen.
+
+    Las filas se piden a ``source`` por páginas con paginación por clave
+    sobre el orden actual, de modo que la memoria y el tiempo de pintado no
+    dependen del total de filas. El scrollbar se controla a mano: su
+    posición representa el desplazamiento dentro del resultado completo.
+    """
+
+    def __init__(self, tree, scrollbar, source=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.source = source
+        self.total = 0
+        self.offset = 0          # posición de la primera fila visible
+        self.visible = 20        # filas que caben en la vista
+        self.window = ProductColumns()  # filas en caché
+        self.window_start = 0    # posición absoluta de self.window[0]
+        self.anchors = {0: None}  # posición -> clave de la fila anterior
+        self.anchors_built = False
+        self.selected = ()
+        self.shown = {}          # id -> fila que muestra el Treeview, en orden
+        self._pending = None
+        
+        self.scrollbar.configure(command=self.on_scrollbar)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        for key in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.tree.bind(key, self.on_key)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+
+    def set_source(self, source, total=None):
+        """Cambia el origen de datos y vuelve al principio de la lista.
+
+        ``total`` permite pasar el número de filas ya contado en segundo plano.
+        """
+        self.source = source
+        self.offset = 0
+        self.selected = ()
+        self.refresh(total)
+
+    def refresh(self, total=None):
+        """Descarta la caché y vuelve a pintar la vista actual"""
+        if total is None:
+            total = self.source.count() if self.source else 0
+        self.total = total
+        self.window = ProductColumns()
+        self.window_start = 0
+        self.anchors = {0: None}
+        self.anchors_built = False
+        self.offset = max(0, min(self.offset, self.total - self.visible))
+        self.render()
+
+    def selection(self):
+        return self.selected
+
+    def row(self, producto_id):
+        """Producto en caché (ProductRow con sus tipos), o None si no está cargado"""
+        return self.window.row(producto_id)
+
+    # ---- caché de filas ----
+    def _remember_anchors(self):
+        for i, row in enumerate(self.window):
+            pos = self.window_start + i + 1
+            if pos % ANCHOR_STEP == 0:
+                self.anchors[pos] = self.source.key(row)
+
+    def _build_anchors(self):
+        """Calcula de una vez las claves cada ANCHOR_STEP filas para saltos largos"""
+        for i, key in enumerate(self.source.anchor_keys(ANCHOR_STEP)):
+            self.anchors[(i + 1) * ANCHOR_STEP] = key
+        self.anchors_built = True
+
+    def _jump(self, target):
+        nearest = max(pos for pos in self.anchors if pos <= target)
+        if target - nearest > ANCHOR_STEP and not self.anchors_built:
+            self._build_anchors()
+            nearest = max(pos for pos in self.anchors if pos <= target)
+        limit = self.visible + 2 * PAGE_BUFFER
+        self.window = ProductColumns(self.source.page(self.anchors[nearest], limit, target - nearest))
+        self.window_start = target
+
+    def ensure_window(self):
+        """Garantiza que las filas visibles estén en caché pidiendo solo lo que falta"""
+        if not self.source or self.total == 0:
+            self.window = ProductColumns()
+            return
+        
+        start = self.offset
+        end = min(self.offset + self.visible, self.total)
+        w_start = self.window_start
+        w_end = self.window_start + len(self.window)
+        
+        if self.window and w_start <= start and end <= w_end:
+            return
+        
+        if self.window and w_start <= start <= w_end:
+            # Desplazamiento hacia abajo: continuar desde la última fila en caché
+            rows = self.source.page(self.source.key(self.window[-1]), end - w_end + PAGE_BUFFER)
+            self.window.extend(rows)
+            drop = max(0, start - PAGE_BUFFER - w_start)
+            del self.window[:drop]
+            self.window_start += drop
+        elif self.window and w_start < end <= w_end:
+            # Desplazamiento hacia arriba: continuar antes de la primera fila en caché
+            rows = self.source.page(self.source.key(self.window[0]), w_start - start + PAGE_BUFFER, reverse=True)
+            self.window[:0] = rows
+            self.window_start -= len(rows)
+            del self.window[end + PAGE_BUFFER - self.window_start:]
+        else:
+            # Salto (scrollbar arrastrado, Inicio/Fin): partir de la clave conocida más cercana
+            self._jump(max(0, start - PAGE_BUFFER))
+        
+        self._remember_anchors()
+
+    # ---- actualizaciones incrementales ----
+    def _index_of(self, row_id):
+        return self.window.index_of(row_id)
+
+    def _forget_anchors(self):
+        # Las posiciones cambian al insertar o borrar; se recalculan al saltar
+        self.anchors = {0: None}
+        self.anchors_built = False
+
+    def _place(self, row):
+        """Coloca una fila en la caché según su clave de orden"""
+        at_end = self.window_start + len(self.window) >= self.total
+        self.total += 1
+        
+        if not self.window:
+            if self.total == 1:
+                self.window = ProductColumns([row])
+                self.window_start = 0
+            return
+        
+        keys = [self.source.order_key(r) for r in self.window]
+        pos = bisect.bisect_left(keys, self.source.order_key(row))
+        
+        if pos == 0 and self.window_start > 0:
+            # Queda antes de la caché: las filas en caché bajan una posición
+            self.window_start += 1
+            self.offset += 1
+        elif pos == len(self.window) and not at_end:
+            pass  # queda después de la caché
+        else:
+            self.window.insert(pos, row)
+            if self.window_start + pos < self.offset:
+                self.offset += 1
+
+    def insert_row(self, row):
+        """Añade una fila nueva en su sitio sin recargar la lista"""
+        if not self.source.accepts(row):
+            return
+        self._forget_anchors()
+        self._place(row)
+        self.render()
+
+    def _unplace(self, row):
+        """Quita una fila de la caché o ajusta las posiciones si estaba antes de ella"""
+        index = self._index_of(row[0])
+        if index is not None:
+            del self.window[index]
+            if self.window_start + index < self.offset:
+                self.offset -= 1
+        elif self.window and self.source.order_key(row) < self.source.order_key(self.window[0]):
+            self.window_start -= 1
+            self.offset -= 1
+        self.total -= 1
+
+    def update_row(self, row, old=None):
+        """Actualiza una fila modificada; ``old`` es la fila anterior si no está en caché"""
+        index = self._index_of(row[0])
+        if index is not None:
+            old = self.window[index]
+        
+        if not self.source.ordered or old is None or self.source.key(old) == self.source.key(row):
+            if index is not None:
+                self.window[index] = row
+                self.render()
+            return
+        
+        # Cambió la clave de orden: se quita de su posición anterior y se coloca en la nueva
+        self._forget_anchors()
+        self._unplace(old)
+        self._place(row)
+        self.render()
+
+    def remove_rows(self, rows):
+        """Quita filas borradas sin recargar la lista"""
+        self._forget_anchors()
+        for row in rows:
+            self._unplace(row)
+            self.source.discard(row[0])
+        
+        removed = {str(row[0]) for row in rows}
+        self.selected = tuple(iid for iid in self.selected if iid not in removed)
+        self.offset = max(0, min(self.offset, self.total - self.visible))
+        self.render()
+
+    def refresh_rows(self, ids):
+        """Vuelve a leer solo las filas en caché afectadas por un cambio externo"""
+        ids = set(ids)
+        affected = [producto_id for producto_id in self.window.ids if producto_id in ids]
+        if not affected:
+            return
+        fresh = {row[0]: row for row in self.source.fetch(affected)}
+        self.window = ProductColumns(fresh.get(row[0], row) for row in self.window)
+        self.render()
+
+    # ---- pintado ----
+    def render(self):
+        self._pending = None
+        self.ensure_window()
+        
+        first = self.offset - self.window_start
+        rows = self.window[first:first + self.visible]
+        
+        # Solo se pasan a Tcl las filas nuevas o cambiadas: al desplazarse unas
+        # pocas filas las demás quedan en el Treeview tal como estaban. Las
+        # que se conservan ya están en el orden relativo correcto (si no, por
+        # ejemplo al cambiar el orden de la lista, se vuelve a pintar todo)
+        wanted = {row[0]: row for row in rows}
+        kept = [producto_id for producto_id, row in self.shown.items() if wanted.get(producto_id) == row]
+        if kept != [row[0] for row in rows if self.shown.get(row[0]) == row]:
+            kept = []
+        kept_ids = set(kept)
+        gone = [producto_id for producto_id in self.shown if producto_id not in kept_ids]
+        if gone:
+            self.tree.delete(*gone)
+        for index, row in enumerate(rows):
+            if row[0] not in kept_ids:
+                self.tree.insert("", index, values=row[1:], iid=row[0])
+        self.shown = wanted
+        
+        keep = [iid for iid in self.selected if self.tree.exists(iid)]
+        if keep:
+            self.tree.selection_set(keep)
+        self.update_scrollbar()
+
+    def schedule_render(self):
+        """Agrupa varios eventos de scroll seguidos en un solo pintado"""
+        if self._pending is None:
+            self._pending = self.tree.after_idle(self.render)
+
+    def update_scrollbar(self):
+        if self.total <= 0:
+            self.scrollbar.set(0, 1)
+            return
+        first = self.offset / self.total
+        last = min(1.0, (self.offset + self.visible) / self.total)
+        self.scrollbar.set(first, last)
+
+    def scroll_to(self, position):
+        position = max(0, min(int(position), self.total - self.visible))
+        if position != self.offset:
+            self.offset = position
+            self.schedule_render()
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    # ---- eventos ----
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible
+            self.scroll(amount)
+
+    def on_resize(self, event):
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 25)
+        visible = max(1, (event.height - rowheight) // rowheight)
+        if visible != self.visible:
+            self.visible = visible
+            self.offset = max(0, min(self.offset, self.total - self.visible))
+            self.schedule_render()
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_key(self, event):
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        index = children.index(focus) if focus in children else 0
+        
+        if event.keysym == 'Up' and index > 0:
+            return None  # navegación normal dentro de la vista
+        if event.keysym == 'Down' and index < len(children) - 1:
+            return None
+        
+        steps = {
+            'Up': -1,
+            'Down': 1,
+            'Prior': -self.visible,
+            'Next': self.visible,
+            'Home': -self.total,
+            'End': self.total,
+        }
+        self.scroll(steps[event.keysym])
+        self.render()
+        
+        children = self.tree.get_children()
+        if children:
+            edge = children[0] if steps[event.keysym] < 0 else children[-1]
+            self.tree.focus(edge)
+            self.tree.selection_set(edge)
+        return "break"
+
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected = selection
 
 # ----------------------------
 # Aplicación Principal
 # ----------------------------
+SEARCH_DEBOUNCE_MS = 200  # pausa al escribir antes de consultar la base de datos
+ALERT_TAB = "⚠ Reposición"  # título de la pestaña; se le agrega el número de alertas
+
 class InventarioApp:
-    def __init__(self, root):
+    def __init__(self, root, server=None):
         self.root = root
-        self.root.title("SOFTWARE INVENTORY")
+        self.server = server  # URL de servidor.py, o None para abrir la base local
+        self.root.title(f"SOFTWARE INVENTORY - {server}" if server else "SOFTWARE INVENTORY")
         self.root.geometry("1200x700")
         self.root.minsize(1000, 600)
         
@@ -96,8 +753,19 @@ class InventarioApp:
         # Configurar estilos
         self.configure_styles()
         
-        self.setup_ui()
+        # La base de datos debe estar lista antes de cargar las pestañas
+        self.current_search = None
+        self.product_sort = None   # None: por nombre, o por relevancia al buscar
+        self.search_index = None   # último resultado con texto, para refinarlo al escribir
+        self.search_after = None
+        self.startup = {'módulos': time.perf_counter() - START_TIME}
         self.init_db()
+        inicio = time.perf_counter()
+        self.setup_ui()
+        self.startup['interfaz'] = time.perf_counter() - inicio
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # after_idle corre después de que la ventana se dibuja por primera vez
+        self.root.after_idle(self.report_startup)
     
     def configure_styles(self):
         """Configura los estilos para los widgets"""
@@ -173,10 +841,38 @@ class InventarioApp:
                      foreground=[('selected', self.fg_color)])
     
     def init_db(self):
-        conn = create_connection()
-        if conn:
-            create_tables(conn)
-            conn.close()
+        inicio = time.perf_counter()
+        self.monitor = QueryMonitor(slow_log=SLOW_QUERY_LOG)
+        if self.server:
+            # Cliente de servidor.py: cada hilo de trabajo con su conexión HTTP
+            from cliente import RemoteDB
+            self.db = RemoteDB(self.server, monitor=self.monitor)
+            connect = lambda: RemoteDB(self.server)
+        else:
+            self.db = InventarioDB(monitor=self.monitor)
+            connect = lambda: InventarioDB(self.db.db_file, setup=False, monitor=self.monitor)
+        self.executor = QueryExecutor(self.root, connect, stats=self.db, on_busy=self.set_busy)
+        self.startup['base de datos'] = time.perf_counter() - inicio
+    
+    def on_close(self):
+        """Cierra la conexión a la base de datos y la ventana"""
+        self.executor.shutdown()
+        self.db.close()
+        self.root.destroy()
+    
+    def set_busy(self, pending):
+        """Muestra en la barra de estado si hay consultas en curso"""
+        if not hasattr(self, 'status_bar'):
+            return
+        if pending:
+            self.status_bar.config(text=f"Consultando la base de datos... ({pending} en curso)")
+            if not self.busy_indicator.winfo_ismapped():
+                self.busy_indicator.pack(side=tk.RIGHT, padx=5)
+                self.busy_indicator.start(10)
+        elif self.busy_indicator.winfo_ismapped():
+            self.busy_indicator.stop()
+            self.busy_indicator.pack_forget()
+            self.status_bar.config(text=self.status_text)
     
     def setup_ui(self):
         # Frame principal
@@ -195,43 +891,107 @@ class InventarioApp:
         self.notebook.add(self.product_frame, text="📦 Productos")
         self.setup_product_tab()
         
-        # Pestaña de Categorías
+        # Las pestañas de Categorías y Movimientos se construyen y cargan la
+        # primera vez que se seleccionan
         self.category_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.category_frame, text="🗂 Categorías")
-        self.setup_category_tab()
         
-        # Pestaña de Movimientos
         self.movement_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.movement_frame, text="🔄 Movimientos")
-        self.setup_movement_tab()
+        
+        self.summary_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.summary_frame, text="📊 Resumen")
+        
+        self.alert_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.alert_frame, text=ALERT_TAB)
+        
+        self.pending_tabs = {
+            str(self.category_frame): self.build_category_tab,
+            str(self.movement_frame): self.build_movement_tab,
+            str(self.summary_frame): self.build_summary_tab,
+            str(self.alert_frame): self.build_alert_tab,
+        }
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Barra de estado
-        self.status_bar = ttk.Label(self.main_frame, 
-                                   text="SOFTWARE INVENTORY - © 2025", 
+        status_frame = ttk.Frame(self.main_frame, style='Main.TFrame')
+        status_frame.pack(fill=tk.X, side=tk.BOTTOM)
+        
+        self.status_text = "SOFTWARE INVENTORY - © 2025"
+        self.status_bar = ttk.Label(status_frame, 
+                                   text=self.status_text, 
                                    relief=tk.SUNKEN,
                                    anchor=tk.W,
                                    style='TLabel')
-        self.status_bar.pack(fill=tk.X, side=tk.BOTTOM, ipady=5)
+        self.status_bar.pack(fill=tk.X, side=tk.LEFT, expand=True, ipady=5)
         
-        # Cargar datos iniciales
-        self.load_categories()
+        # Indicador de actividad mientras hay consultas en segundo plano
+        self.busy_indicator = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+        
+        # Cargar datos iniciales: el recuento de productos va en segundo plano
         self.load_categories_combobox()
         self.load_products()
-        self.load_movements()
+    
+    def on_tab_changed(self, event):
+        selected = self.notebook.select()
+        builder = self.pending_tabs.pop(selected, None)
+        if builder:
+            builder()
+        elif selected == str(self.summary_frame):
+            # Leer los resúmenes cuesta lo mismo con cualquier tamaño de historial
+            self.load_summary()
+        elif selected == str(self.alert_frame):
+            self.load_alerts()
+    
+    def build_category_tab(self):
+        with self.db.timed("build_category_tab"):
+            self.setup_category_tab()
+            self.load_categories()
+    
+    def build_movement_tab(self):
+        with self.db.timed("build_movement_tab"):
+            self.setup_movement_tab()
+            self.load_movements()
+    
+    def build_summary_tab(self):
+        with self.db.timed("build_summary_tab"):
+            self.setup_summary_tab()
+            self.load_summary()
+    
+    def build_alert_tab(self):
+        with self.db.timed("build_alert_tab"):
+            self.setup_alert_tab()
+            self.load_alerts()
+    
+    def report_startup(self):
+        """Muestra en la barra de estado cuánto tardó en aparecer la ventana"""
+        total = time.perf_counter() - START_TIME
+        self.db.record("startup", total)
+        detalle = ", ".join(f"{fase} {segundos:.2f} s" for fase, segundos in self.startup.items())
+        self.status_text = f"SOFTWARE INVENTORY - © 2025    Inicio: {total:.2f} s ({detalle})"
+        if not self.busy_indicator.winfo_ismapped():
+            self.status_bar.config(text=self.status_text)
     
     def setup_menu(self):
         self.menubar = tk.Menu(self.root)
         
         # Menú Archivo
         file_menu = tk.Menu(self.menubar, tearoff=0)
+        file_menu.add_command(label="Importar productos...", command=self.import_products)
+        file_menu.add_command(label="Entradas y salidas por lote...", command=self.show_movement_batch)
+        file_menu.add_separator()
         file_menu.add_command(label="Exportar a CSV", command=self.export_to_csv)
         file_menu.add_command(label="Exportar a PDF", command=self.export_to_pdf)
         file_menu.add_separator()
-        file_menu.add_command(label="Salir", command=self.root.quit)
+        file_menu.add_command(label="Respaldar base de datos...", command=self.create_backup)
+        file_menu.add_command(label="Restaurar respaldo...", command=self.restore_from_backup)
+        file_menu.add_separator()
+        file_menu.add_command(label="Salir", command=self.on_close)
         self.menubar.add_cascade(label="Archivo", menu=file_menu)
         
         # Menú Ayuda
         help_menu = tk.Menu(self.menubar, tearoff=0)
+        help_menu.add_command(label="Diagnóstico de rendimiento", command=self.show_diagnostics)
         help_menu.add_command(label="Acerca de", command=self.show_about)
         self.menubar.add_cascade(label="Ayuda", menu=help_menu)
         
@@ -244,6 +1004,62 @@ class InventarioApp:
                     "Desarrollado como proyecto productivo sena"
         messagebox.showinfo("Acerca de", about_text)
     
+    def show_diagnostics(self):
+        """Panel con latencias por operación, sentencias SQL y consultas lentas"""
+        top = tk.Toplevel(self.root)
+        top.title("Diagnóstico de rendimiento")
+        top.geometry("980x600")
+        
+        buttons = ttk.Frame(top, padding=5)
+        buttons.pack(fill=tk.X, side=tk.BOTTOM)
+        
+        text = tk.Text(top, wrap=tk.NONE, font=('Courier', 9))
+        yscroll = ttk.Scrollbar(top, orient=tk.VERTICAL, command=text.yview)
+        xscroll = ttk.Scrollbar(top, orient=tk.HORIZONTAL, command=text.xview)
+        text.configure(yscrollcommand=yscroll.set, xscrollcommand=xscroll.set)
+        yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        text.pack(fill=tk.BOTH, expand=True)
+        
+        def refresh():
+            lines = [self.monitor.report(), ""]
+            try:
+                overhead = self.db.connection_overhead()
+                lines.append(f"Conexión por operación: {overhead['por_conexion_ms']:.2f} ms")
+                lines.append(f"Conexión persistente: {overhead['persistente_ms']:.2f} ms")
+                lines.append(f"Ahorro por operación: {overhead['ahorro_ms']:.2f} ms")
+            except Error as e:
+                lines.append(f"No se pudo medir la conexión: {e}")
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, "\n".join(lines))
+            text.config(state=tk.DISABLED)
+        
+        def save():
+            file_path = filedialog.asksaveasfilename(
+                parent=top,
+                defaultextension=".json",
+                filetypes=[("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")],
+                title="Guardar métricas"
+            )
+            if not file_path:
+                return
+            try:
+                self.monitor.dump(file_path, extra={'startup': self.startup})
+                messagebox.showinfo("Éxito", f"Métricas guardadas en:\n{file_path}", parent=top)
+            except OSError as e:
+                messagebox.showerror("Error", f"No se pudieron guardar las métricas:\n{e}", parent=top)
+        
+        def reset():
+            self.monitor.reset()
+            refresh()
+        
+        ttk.Button(buttons, text="Actualizar", command=refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Guardar...", command=save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Reiniciar", command=reset).pack(side=tk.LEFT, padx=5)
+        ttk.Label(buttons, text=f"Consultas lentas también en {SLOW_QUERY_LOG}").pack(side=tk.RIGHT, padx=5)
+        refresh()
+    
     def setup_product_tab(self):
         # Frame principal con paneles divididos
         main_panel = ttk.PanedWindow(self.product_frame, orient=tk.HORIZONTAL)
@@ -296,8 +1112,7 @@ class InventarioApp:
             show="headings"
         )
         
-        headers = ["Código", "Nombre", "Precio", "Stock", "Categoría", "Fecha Creación"]
-        for i, header in enumerate(headers):
+        for i, header in enumerate(PRODUCT_HEADERS):
             self.product_tree.heading(f"#{i+1}", text=header)
             self.product_tree.column(f"#{i+1}", width=100, anchor=tk.CENTER)
         
@@ -305,12 +1120,18 @@ class InventarioApp:
         self.product_tree.column("#2", width=200)  # Nombre
         self.product_tree.column("#6", width=120)  # Fecha
         
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.product_tree.yview)
-        self.product_tree.configure(yscroll=scrollbar.set)
+        # Los encabezados con índice ordenan la lista en la base de datos
+        for column in PRODUCT_SORTS:
+            self.product_tree.heading(column, command=lambda c=column: self.sort_products(c))
+        self.show_sort(self.product_tree, PRODUCT_HEADERS, PRODUCT_SORT)
+        
+        # El scrollbar lo gestiona la lista virtual, no el Treeview
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
         
         self.product_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        self.product_list = VirtualList(self.product_tree, scrollbar)
         self.product_tree.bind("<Double-1>", self.on_product_double_click)
         
         # Barra de búsqueda
@@ -318,7 +1139,10 @@ class InventarioApp:
         search_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
         
         ttk.Label(search_frame, text="Buscar:").pack(side=tk.LEFT, padx=5)
-        self.search_entry = ttk.Entry(search_frame)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_changed)
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        self.search_entry.bind("<Return>", lambda e: self.search_products())
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         ttk.Button(search_frame, text="Buscar", command=self.search_products).pack(side=tk.LEFT, padx=5)
     
@@ -384,11 +1208,27 @@ class InventarioApp:
         
         ttk.Label(filter_frame, text="Tipo:").pack(side=tk.LEFT, padx=5)
         
-        self.movement_filter = ttk.Combobox(filter_frame, values=["Todos", "Entradas", "Salidas"])
+        self.movement_filter = ttk.Combobox(filter_frame, values=list(MOVEMENT_TYPES), state="readonly", width=10)
         self.movement_filter.pack(side=tk.LEFT, padx=5)
         self.movement_filter.set("Todos")
         
+        ttk.Label(filter_frame, text="Desde (AAAA-MM-DD):").pack(side=tk.LEFT, padx=5)
+        self.movement_from = ttk.Entry(filter_frame, width=12)
+        self.movement_from.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="Hasta:").pack(side=tk.LEFT, padx=5)
+        self.movement_to = ttk.Entry(filter_frame, width=12)
+        self.movement_to.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="Código:").pack(side=tk.LEFT, padx=5)
+        self.movement_product = ttk.Entry(filter_frame, width=15)
+        self.movement_product.pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(filter_frame, text="Aplicar", command=self.load_movements).pack(side=tk.LEFT, padx=5)
+        ttk.Button(filter_frame, text="Registrar lote...", command=self.show_movement_batch).pack(side=tk.LEFT, padx=5)
+        
+        self.movement_count = ttk.Label(filter_frame, text="")
+        self.movement_count.pack(side=tk.RIGHT, padx=5)
         
         # Treeview de movimientos
         list_frame = ttk.LabelFrame(main_frame, text="Historial de Movimientos", padding=10)
@@ -400,86 +1240,514 @@ class InventarioApp:
             show="headings"
         )
         
-        headers = ["Producto", "Tipo", "Cantidad", "Fecha"]
-        for i, header in enumerate(headers):
+        self.movement_headers = ["Producto", "Tipo", "Cantidad", "Fecha"]
+        for i, header in enumerate(self.movement_headers):
             self.movement_tree.heading(f"#{i+1}", text=header)
             self.movement_tree.column(f"#{i+1}", width=100, anchor=tk.CENTER)
         
         self.movement_tree.column("#1", width=200)  # Producto
         self.movement_tree.column("#4", width=150)  # Fecha
         
+        self.movement_sort = MOVEMENT_SORT
+        for column in MOVEMENT_SORTS:
+            self.movement_tree.heading(column, command=lambda c=column: self.sort_movements(c))
+        self.show_sort(self.movement_tree, self.movement_headers, self.movement_sort)
+        
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.movement_tree.yview)
-        self.movement_tree.configure(yscroll=scrollbar.set)
+        
+        def on_scroll(first, last):
+            # Al acercarse al final se pide la siguiente página
+            scrollbar.set(first, last)
+            if float(last) > 0.9:
+                self.load_more_movements()
+        
+        self.movement_tree.configure(yscroll=on_scroll)
         
         self.movement_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Estado de la paginación: filtros aplicados y clave de la última fila
+        self.movement_filters = None
+        self.movement_code = None
+        self.movement_key = None
+        self.movement_before = None
+        self.movement_loaded = 0
+        self.movement_more = False
+        self.movement_loading = False
+    
+    def setup_summary_tab(self):
+        # Frame principal
+        main_frame = ttk.Frame(self.summary_frame)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Totales generales
+        totals_frame = ttk.LabelFrame(main_frame, text="Inventario", padding=10)
+        totals_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.summary_labels = {}
+        fields = [("productos", "Productos"), ("unidades", "Unidades en stock"), ("valor", "Valor del inventario"),
+                  ("entrada", "Entradas"), ("salida", "Salidas")]
+        for i, (key, text) in enumerate(fields):
+            ttk.Label(totals_frame, text=f"{text}:").grid(row=i // 3, column=(i % 3) * 2, padx=5, pady=5, sticky=tk.W)
+            label = ttk.Label(totals_frame, text="", font=('Arial', 11, 'bold'))
+            label.grid(row=i // 3, column=(i % 3) * 2 + 1, padx=(0, 25), pady=5, sticky=tk.W)
+            self.summary_labels[key] = label
+        
+        # Entradas y salidas de un producto
+        product_frame = ttk.LabelFrame(main_frame, text="Movimientos por producto", padding=10)
+        product_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(product_frame, text="Código:").pack(side=tk.LEFT, padx=5)
+        self.summary_product = ttk.Entry(product_frame, width=15)
+        self.summary_product.pack(side=tk.LEFT, padx=5)
+        self.summary_product.bind("<Return>", lambda e: self.show_product_summary())
+        ttk.Button(product_frame, text="Consultar", command=self.show_product_summary).pack(side=tk.LEFT, padx=5)
+        self.summary_product_label = ttk.Label(product_frame, text="")
+        self.summary_product_label.pack(side=tk.LEFT, padx=10)
+        
+        # Valorización por categoría
+        list_frame = ttk.LabelFrame(main_frame, text="Valorización por Categoría", padding=10)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.summary_tree = ttk.Treeview(
+            list_frame,
+            columns=("categoria", "productos", "unidades", "valor", "porcentaje"),
+            show="headings"
+        )
+        
+        headers = ["Categoría", "Productos", "Unidades", "Valor", "% del Valor"]
+        for i, header in enumerate(headers):
+            self.summary_tree.heading(f"#{i+1}", text=header)
+            self.summary_tree.column(f"#{i+1}", width=100, anchor=tk.CENTER)
+        
+        self.summary_tree.column("#1", width=200, anchor=tk.W)  # Categoría
+        self.summary_tree.column("#4", width=150, anchor=tk.E)  # Valor
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.summary_tree.yview)
+        self.summary_tree.configure(yscroll=scrollbar.set)
+        
+        self.summary_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        ttk.Button(main_frame, text="Actualizar", command=self.load_summary).pack(side=tk.RIGHT, padx=5, pady=5)
+    
+    def load_summary(self):
+        """Carga los totales del panel de resumen"""
+        try:
+            with self.db.timed("load_summary"):
+                resumen = self.db.inventory_summary()
+                categorias = self.db.category_summary()
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo cargar el resumen: {e}")
+            return
+        
+        self.summary_labels["productos"].config(text=f"{resumen['productos']:,}")
+        self.summary_labels["unidades"].config(text=f"{resumen['unidades']:,}")
+        self.summary_labels["valor"].config(text=f"{resumen['valor']:,.2f}")
+        for tipo in ("entrada", "salida"):
+            movimientos, cantidad = resumen[tipo]
+            self.summary_labels[tipo].config(text=f"{cantidad:,} unidades en {movimientos:,} movimientos")
+        
+        total = resumen['valor'] or 1
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        for nombre, productos, unidades, valor in categorias:
+            self.summary_tree.insert("", tk.END, values=(
+                nombre, f"{productos:,}", f"{unidades:,}", f"{valor:,.2f}", f"{valor / total:.1%}"
+            ))
+    
+    def show_product_summary(self):
+        """Muestra las entradas y salidas acumuladas de un producto"""
+        codigo = self.summary_product.get().strip()
+        if not codigo:
+            self.summary_product_label.config(text="")
+            return
+        try:
+            producto_id = self.db.product_id_by_code(codigo)
+            if producto_id is None:
+                self.summary_product_label.config(text="No existe un producto con ese código")
+                return
+            entradas, salidas, n_entradas, n_salidas, ultimo = self.db.product_summary(producto_id)
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo consultar el producto: {e}")
+            return
+        self.summary_product_label.config(
+            text=f"Entradas: {entradas:,} ({n_entradas:,} mov.)    Salidas: {salidas:,} ({n_salidas:,} mov.)"
+                 f"    Último movimiento: {ultimo or '-'}"
+        )
+    
+    def setup_alert_tab(self):
+        main_frame = ttk.Frame(self.alert_frame)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Umbrales: el del producto manda; sin él se usa el de su categoría
+        form_frame = ttk.LabelFrame(main_frame, text="Stock mínimo", padding=10)
+        form_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(form_frame, text="Producto (código):").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        self.alert_product = ttk.Entry(form_frame, width=15)
+        self.alert_product.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+        self.alert_product.bind("<Return>", lambda e: self.show_product_threshold())
+        ttk.Label(form_frame, text="Mínimo:").grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
+        self.alert_product_min = ttk.Entry(form_frame, width=8)
+        self.alert_product_min.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+        ttk.Button(form_frame, text="Guardar", command=self.save_product_threshold).grid(row=0, column=4, padx=5, pady=5)
+        self.alert_product_label = ttk.Label(form_frame, text="")
+        self.alert_product_label.grid(row=0, column=5, padx=5, pady=5, sticky=tk.W)
+        
+        ttk.Label(form_frame, text="Categoría:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+        self.alert_category = ttk.Combobox(form_frame, width=25, state="readonly")
+        self.alert_category.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+        self.alert_category.bind("<<ComboboxSelected>>", lambda e: self.show_category_threshold())
+        ttk.Label(form_frame, text="Mínimo:").grid(row=1, column=2, padx=5, pady=5, sticky=tk.W)
+        self.alert_category_min = ttk.Entry(form_frame, width=8)
+        self.alert_category_min.grid(row=1, column=3, padx=5, pady=5, sticky=tk.W)
+        ttk.Button(form_frame, text="Guardar", command=self.save_category_threshold).grid(row=1, column=4, padx=5, pady=5)
+        
+        ttk.Label(form_frame, text="Deje el mínimo vacío para quitarlo. Un producto sin mínimo propio usa el de su categoría.",
+                  style='TLabel').grid(row=2, column=0, columnspan=6, padx=5, pady=(5, 0), sticky=tk.W)
+        self.alert_thresholds = {}  # nombre de categoría -> (id, mínimo)
+        
+        # Productos por debajo del mínimo, primero los que más faltan
+        list_frame = ttk.LabelFrame(main_frame, text="Productos por reponer", padding=10)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        self.alert_tree = ttk.Treeview(
+            list_frame,
+            columns=("codigo", "nombre", "categoria", "stock", "minimo", "faltan", "desde"),
+            show="headings"
+        )
+        for i, header in enumerate(ALERT_HEADERS):
+            self.alert_tree.heading(f"#{i+1}", text=header)
+            self.alert_tree.column(f"#{i+1}", width=90, anchor=tk.CENTER)
+        
+        self.alert_tree.column("#2", width=200, anchor=tk.W)  # Nombre
+        self.alert_tree.column("#3", width=150, anchor=tk.W)  # Categoría
+        self.alert_tree.column("#7", width=150)  # Desde
+        self.alert_tree.bind("<Double-1>", self.on_alert_double_click)
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.alert_tree.yview)
+        self.alert_tree.configure(yscroll=scrollbar.set)
+        
+        self.alert_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        buttons = ttk.Frame(main_frame)
+        buttons.pack(fill=tk.X, padx=5, pady=5)
+        self.alert_count_label = ttk.Label(buttons, text="")
+        self.alert_count_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Actualizar", command=self.load_alerts).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons, text="Exportar CSV...", command=self.export_alerts).pack(side=tk.RIGHT, padx=5)
+    
+    def load_alerts(self):
+        """Lee en segundo plano las alertas y los mínimos de las categorías"""
+        self.executor.submit(
+            "alerts",
+            lambda db, task: (db.stock_alerts(), db.category_thresholds()),
+            on_done=self.show_alerts,
+            on_error=lambda e: messagebox.showerror("Error", f"No se pudieron cargar las alertas: {e}"),
+            name="load_alerts",
+        )
+    
+    def show_alerts(self, result):
+        alertas, umbrales = result
+        self.alert_tree.delete(*self.alert_tree.get_children())
+        self.alert_rows = {row[0]: row for row in alertas}
+        for row in alertas:
+            self.alert_tree.insert("", tk.END, values=row[1:], iid=row[0])
+        self.alert_count_label.config(text=f"{len(alertas):,} productos por reponer")
+        self.show_alert_count(len(alertas))
+        
+        self.alert_thresholds = {nombre: (categoria_id, minimo) for categoria_id, nombre, minimo in umbrales}
+        self.alert_category['values'] = list(self.alert_thresholds)
+        if self.alert_category.get() not in self.alert_thresholds:
+            self.alert_category.set("")
+    
+    def update_alert_count(self):
+        """Actualiza el número de alertas del título de la pestaña después de una escritura"""
+        if hasattr(self, 'alert_tree'):
+            self.load_alerts()
+            return
+        self.executor.submit("alert_count", lambda db, task: db.alert_count(),
+                             on_done=self.show_alert_count, name="alert_count")
+    
+    def show_alert_count(self, total):
+        self.notebook.tab(self.alert_frame, text=ALERT_TAB + (f" ({total:,})" if total else ""))
+    
+    @staticmethod
+    def read_threshold(entry):
+        """Mínimo escrito en un campo: None si está vacío"""
+        text = entry.get().strip()
+        if not text:
+            return None
+        minimo = int(text)  # ValueError si no es un entero
+        if minimo < 0:
+            raise ValueError(text)
+        return minimo
+    
+    def show_product_threshold(self):
+        codigo = self.alert_product.get().strip()
+        if not codigo:
+            return
+        try:
+            producto_id = self.db.product_id_by_code(codigo)
+            umbral = self.db.product_threshold(producto_id) if producto_id is not None else None
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo consultar el producto: {e}")
+            return
+        if umbral is None:
+            self.alert_product_label.config(text="No existe un producto con ese código")
+            return
+        propio, categoria = umbral
+        self.alert_product_min.delete(0, tk.END)
+        if propio is not None:
+            self.alert_product_min.insert(0, str(propio))
+        self.alert_product_label.config(
+            text=f"Mínimo de su categoría: {categoria if categoria is not None else 'ninguno'}")
+    
+    def save_product_threshold(self):
+        codigo = self.alert_product.get().strip()
+        if not codigo:
+            messagebox.showwarning("Advertencia", "Escriba el código del producto")
+            return
+        try:
+            minimo = self.read_threshold(self.alert_product_min)
+        except ValueError:
+            messagebox.showwarning("Advertencia", "El mínimo debe ser un entero mayor o igual a cero")
+            return
+        try:
+            producto_id = self.db.product_id_by_code(codigo)
+            if producto_id is None:
+                messagebox.showwarning("Advertencia", f"No existe un producto con código {codigo}")
+                return
+            with self.db.timed("set_product_threshold"):
+                self.db.set_product_threshold(producto_id, minimo)
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+            return
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo guardar el mínimo: {e}")
+            return
+        self.show_product_threshold()
+        self.load_alerts()
+    
+    def show_category_threshold(self):
+        _, minimo = self.alert_thresholds.get(self.alert_category.get(), (None, None))
+        self.alert_category_min.delete(0, tk.END)
+        if minimo is not None:
+            self.alert_category_min.insert(0, str(minimo))
+    
+    def save_category_threshold(self):
+        categoria = self.alert_category.get()
+        if categoria not in self.alert_thresholds:
+            messagebox.showwarning("Advertencia", "Seleccione una categoría")
+            return
+        try:
+            minimo = self.read_threshold(self.alert_category_min)
+        except ValueError:
+            messagebox.showwarning("Advertencia", "El mínimo debe ser un entero mayor o igual a cero")
+            return
+        try:
+            # Los triggers revisan solo los productos de esa categoría
+            with self.db.timed("set_category_threshold"):
+                self.db.set_category_threshold(self.alert_thresholds[categoria][0], minimo)
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+            return
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo guardar el mínimo: {e}")
+            return
+        self.load_alerts()
+    
+    def on_alert_double_click(self, event):
+        """Lleva el producto de la alerta al formulario de mínimos"""
+        item = self.alert_tree.identify_row(event.y)
+        if not item:
+            return
+        self.alert_product.delete(0, tk.END)
+        self.alert_product.insert(0, self.alert_rows[int(item)][1])
+        self.show_product_threshold()
+    
+    def export_alerts(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("Archivos CSV", "*.csv"), ("Todos los archivos", "*.*")],
+            title="Guardar lista de reposición"
+        )
+        if not file_path:
+            return
+        
+        self.executor.submit(
+            "export_alerts",
+            lambda db, task: export_stock_alerts_csv(db, file_path),
+            on_done=lambda written: messagebox.showinfo(
+                "Éxito", f"{written} productos por reponer exportados a:\n{file_path}"),
+            on_error=lambda e: messagebox.showerror("Error", f"No se pudo exportar el archivo:\n{e}"),
+            name="export_alerts",
+        )
+    
+    def on_search_changed(self, *args):
+        """Busca mientras se escribe"""
+        if self.search_after is not None:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
+        
+        search_term = self.search_var.get().strip()
+        if search_term == (self.current_search or ""):
+            self.executor.cancel("products")
+            return
+        
+        # Si solo se agregaron letras o palabras el resultado nuevo está dentro
+        # del anterior: se filtra en memoria, sin esperar. La marca de cambios
+        # se compara en el hilo de trabajo (contra un servidor es una petición):
+        # si la base cambió desde la búsqueda anterior, se vuelve a consultar
+        index = self.search_index
+        if search_term and index is not None:
+            tokens = search_tokens(search_term, self.db.fts_enabled)
+            if index.covers(tokens):
+                sort = self.product_sort
+                
+                def narrow(db, task):
+                    stamp = db.change_stamp()
+                    if stamp != index.stamp:
+                        return db.search_index(search_term, stamp, sort)
+                    return index.narrow(search_term, tokens)
+                
+                self.submit_search(search_term, narrow, "narrow_search")
+                return
+        
+        # Si no, se espera a que se deje de escribir; la consulta anterior que
+        # siga en marcha se cancela al enviar la nueva
+        self.search_after = self.root.after(SEARCH_DEBOUNCE_MS, self.search_products)
     
     def search_products(self):
         """Busca productos según el texto ingresado"""
-        search_term = self.search_entry.get().strip()
+        if self.search_after is not None:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
+        
+        search_term = self.search_var.get().strip()
         if not search_term:
+            self.search_index = None
             self.load_products()
             return
         
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT p.id, p.codigo, p.nombre, p.precio, p.stock, 
-                           c.nombre, p.fecha_creacion
-                    FROM productos p
-                    LEFT JOIN categorias c ON p.categoria_id = c.id
-                    WHERE p.codigo LIKE ? OR p.nombre LIKE ? OR c.nombre LIKE ?
-                    ORDER BY p.nombre
-                """, (f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"))
-                
-                productos = cursor.fetchall()
-                self.product_tree.delete(*self.product_tree.get_children())
-                
-                for producto in productos:
-                    self.product_tree.insert("", tk.END, values=producto[1:], iid=producto[0])
-                    
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo realizar la búsqueda: {e}")
-            finally:
-                conn.close()
+        # Los resultados salen del índice FTS5 ordenados por relevancia (o por
+        # la columna elegida en los encabezados); la consulta corre en segundo plano y una búsqueda nueva anula la anterior.
+        # La marca de cambios se toma antes de consultar: si algo se escribe
+        # mientras tanto, el resultado no se usará para refinar
+        sort = self.product_sort
+        self.submit_search(search_term, lambda db, task: db.search_index(search_term, db.change_stamp(), sort),
+                           "search_products")
+    
+    def submit_search(self, search_term, func, name):
+        """Ejecuta en segundo plano ``func(db, task)``, que devuelve un SearchIndex, y lo muestra"""
+        def done(index):
+            self.search_index = index
+            self.show_search_results(search_term, array('q', index.ids))
+        
+        self.executor.submit(
+            "products",
+            func,
+            on_done=done,
+            on_error=lambda e: messagebox.showerror("Error", f"No se pudo realizar la búsqueda: {e}"),
+            name=name,
+        )
+    
+    def show_search_results(self, search, ids=None, total=None):
+        """Muestra en la lista el catálogo completo o el resultado de una búsqueda"""
+        self.current_search = search
+        self.show_sort(self.product_tree, PRODUCT_HEADERS,
+                       self.product_sort or (None if search else PRODUCT_SORT))
+        if search:
+            self.product_list.set_source(SearchSource(self.db, ids))
+        else:
+            self.product_list.set_source(ProductSource(self.db, sort=self.product_sort), total)
+    
+    @staticmethod
+    def show_sort(tree, headers, sort):
+        """Marca en los encabezados la columna y el sentido del orden"""
+        column = sort.lstrip('-') if sort else None
+        arrow = " ▼" if sort and sort.startswith('-') else " ▲"
+        for name, header in zip(tree["columns"], headers):
+            tree.heading(name, text=header + arrow if name == column else header)
+    
+    @staticmethod
+    def toggle_sort(current, column, descending_first=False):
+        """Orden al pulsar un encabezado: la misma columna invierte el sentido"""
+        if current and current.lstrip('-') == column:
+            return column if current.startswith('-') else '-' + column
+        return '-' + column if descending_first else column
+    
+    def sort_products(self, column):
+        """Ordena la lista por la columna pulsada, consultando la base de datos"""
+        current = self.product_sort or (None if self.current_search else PRODUCT_SORT)
+        self.product_sort = self.toggle_sort(current, column)
+        if self.current_search:
+            # El resultado guardado está en otro orden: se vuelve a buscar
+            self.search_index = None
+            self.search_products()
+            return
+        # Mismo filtro y mismo total: solo cambia el orden de las páginas
+        self.show_search_results(None, total=self.product_list.total)
+    
+    def sort_movements(self, column):
+        self.movement_sort = self.toggle_sort(self.movement_sort, column, descending_first=(column == 'fecha'))
+        self.show_sort(self.movement_tree, self.movement_headers, self.movement_sort)
+        self.load_movements()
     
     def export_to_csv(self):
-        items = self.product_tree.get_children()
-        if not items:
+        if not self.product_list.total:
             messagebox.showwarning("Advertencia", "No hay datos para exportar")
             return
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("Archivos CSV", "*.csv"), ("Todos los archivos", "*.*")],
+            filetypes=[("Archivos CSV", "*.csv"),
+                       ("CSV comprimido", "*.csv.gz"),
+                       ("Todos los archivos", "*.*")],
             title="Guardar como"
         )
         
         if not file_path:
             return
         
-        try:
-            with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                
-                headers = []
-                for col in self.product_tree["columns"]:
-                    headers.append(self.product_tree.heading(col)["text"])
-                writer.writerow(headers)
-                
-                for item in items:
-                    row = self.product_tree.item(item)["values"]
-                    writer.writerow(row)
-                    
-            messagebox.showinfo("Éxito", f"Datos exportados correctamente a:\n{file_path}")
-        except Exception as e:
+        # Se exporta todo el filtro actual leyendo de la base de datos en
+        # segundo plano, no las filas cargadas en el Treeview
+        search = self.current_search
+        sort = self.product_sort  # el mismo orden que la lista
+        compress = file_path.endswith('.gz')
+        dialog = ProgressDialog(self.root, "Exportando a CSV", lambda: self.executor.cancel("export_csv"))
+        warnings = []  # avisos de la caché, desde el hilo de la consulta
+        
+        def done(result):
+            dialog.close()
+            written, cached = result
+            if written is not None:
+                messagebox.showinfo("Éxito", f"{written} productos exportados correctamente a:\n{file_path}"
+                                             + (CACHED_NOTE if cached else "")
+                                             + "".join(f"\n\n{warning}" for warning in warnings))
+        
+        def failed(e):
+            dialog.close()
             messagebox.showerror("Error", f"No se pudo exportar el archivo:\n{str(e)}")
+        
+        self.executor.submit(
+            "export_csv",
+            lambda db, task: cached_report(
+                ReportCache(report_cache_dir(db)), db, 'csv', {'buscar': search, 'gzip': compress, 'orden': sort},
+                file_path,
+                lambda path: export_products_csv(db, path, search, compress=compress,
+                                                 progress=task.progress,
+                                                 cancelled=lambda: task.cancelled, sort=sort),
+                warn=warnings.append),
+            on_done=done,
+            on_error=failed,
+            on_progress=dialog.update,
+            name="export_to_csv",
+        )
 
     def export_to_pdf(self):
-        items = self.product_tree.get_children()
-        if not items:
+        if not self.product_list.total:
             messagebox.showwarning("Advertencia", "No hay datos para exportar")
             return
         
@@ -492,56 +1760,315 @@ class InventarioApp:
         if not file_path:
             return
         
-        try:
-            pdf = PDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            
-            # Encabezado con logo (simulado)
-            pdf.cell(200, 10, txt="Reporte de Inventario - SENA", ln=1, align='C')
-            pdf.ln(10)
-            
-            # Fecha de generación
-            pdf.set_font("Times New", size=10)
-            pdf.cell(0, 10, txt=f"Generado el: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=1, align='R')
-            pdf.ln(5)
-            
-            # Tabla de productos
-            pdf.set_font("Arial", size=10)
-            
-            headers = []
-            for col in self.product_tree["columns"]:
-                headers.append(self.product_tree.heading(col)["text"])
-            
-            # Ajustar anchos de columna
-            col_widths = [30, 60, 20, 20, 30, 30]
+        # El reporte se genera en segundo plano directamente desde la base de
+        # datos, repartiendo las páginas entre varios procesos
+        search = self.current_search
+        sort = self.product_sort  # el mismo orden que la lista
+        dialog = ProgressDialog(self.root, "Generando PDF", lambda: self.executor.cancel("export_pdf"))
+        warnings = []  # avisos de la caché, desde el hilo de la consulta
+        
+        def done(result):
+            dialog.close()
+            stats, cached = result
+            if cached:
+                messagebox.showinfo("Éxito", f"Reporte PDF copiado en:\n{file_path}\n\n"
+                                             f"{stats['pages']} páginas{CACHED_NOTE}")
+            elif stats is not None:
+                messagebox.showinfo(
+                    "Éxito",
+                    f"Reporte PDF generado correctamente en:\n{file_path}\n\n"
+                    f"{stats['pages']} páginas en {stats['seconds']:.1f} s "
+                    f"({stats['pages_per_second']:.0f} páginas/s)"
+                    + "".join(f"\n\n{warning}" for warning in warnings)
+                )
+        
+        def failed(e):
+            dialog.close()
+            messagebox.showerror("Error", f"No se pudo generar el PDF:\n{str(e)}")
+        
+        # Contra un servidor no hay archivo local que abrir desde otros procesos
+        workers = 1 if self.server else None
+        
+        def build(db, task):
+            from reportes import InventoryReport
+            report = InventoryReport(db, search, workers, sort=sort)
+            return cached_report(
+                ReportCache(report_cache_dir(db)), db, 'pdf', {'buscar': search, 'orden': sort}, file_path,
+                lambda path: report.build(path, progress=task.progress, cancelled=lambda: task.cancelled),
+                warn=warnings.append)
+        
+        self.executor.submit(
+            "export_pdf",
+            build,
+            on_done=done,
+            on_error=failed,
+            on_progress=dialog.update,
+            name="export_to_pdf",
+        )
+
+    def backup_folder(self):
+        return os.path.join(os.path.dirname(os.path.abspath(self.db.db_file)), BACKUP_DIR)
+
+    def create_backup(self):
+        """Respalda la base en uso en segundo plano, sin bloquear a quien escribe"""
+        if self.server:
+            messagebox.showinfo("Respaldo", "Con servidor el respaldo se hace en el equipo del servidor:\n\n"
+                                            "python cli.py respaldar")
+            return
+        
+        folder = filedialog.askdirectory(initialdir=self.backup_folder(), title="Carpeta de respaldos")
+        if not folder:
+            return
+        
+        db_file = self.db.db_file
+        dialog = ProgressDialog(self.root, "Respaldando la base de datos", lambda: self.executor.cancel("backup"))
+        
+        def done(stats):
+            dialog.close()
+            if stats is not None:
+                messagebox.showinfo(
+                    "Respaldo",
+                    "Respaldo guardado en:\n" + "\n".join(stats['archivos']) + "\n\n"
+                    f"{stats['bytes'] / 1e6:.1f} MB en {stats['segundos']:.1f} s"
+                )
+        
+        def failed(e):
+            dialog.close()
+            messagebox.showerror("Error", f"No se pudo respaldar la base de datos:\n{e}")
+        
+        # Usa conexiones propias sobre el archivo: la del hilo no interviene
+        self.executor.submit(
+            "backup",
+            lambda db, task: backup_database(db_file, folder,
+                                             progress=task.progress,
+                                             cancelled=lambda: task.cancelled),
+            on_done=done,
+            on_error=failed,
+            on_progress=dialog.update,
+            name="backup_database",
+        )
+
+    def restore_from_backup(self):
+        """Reemplaza la base por un respaldo verificado y recarga las pestañas"""
+        if self.server:
+            messagebox.showinfo("Restaurar", "Con servidor la restauración se hace en el equipo del servidor:\n\n"
+                                             "python cli.py restaurar RESPALDO")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            initialdir=self.backup_folder(),
+            filetypes=[("Respaldos", "*.db.gz *.db"), ("Todos los archivos", "*.*")],
+            title="Restaurar respaldo"
+        )
+        if not file_path:
+            return
+        if not messagebox.askyesno(
+            "Confirmar",
+            "¿Reemplazar el inventario actual por este respaldo?\n\n"
+            "Antes se guardará una copia de la base actual en la carpeta de respaldos."
+        ):
+            return
+        
+        db_file, folder = self.db.db_file, self.backup_folder()
+        dialog = ProgressDialog(self.root, "Restaurando respaldo", lambda: self.executor.cancel("restore"))
+        
+        def done(info):
+            dialog.close()
+            if info is None:
+                return
+            self.load_categories()
+            self.load_categories_combobox()
+            self.load_products()
+            if hasattr(self, 'movement_tree'):
+                self.load_movements()
+            if hasattr(self, 'summary_tree'):
+                self.load_summary()
+            message = f"Respaldo restaurado: {info.get('productos', 0)} productos"
+            if info['historial_apartado']:
+                message += ("\n\nEl respaldo no tiene historial archivado; "
+                            f"el anterior se guardó en {info['historial_apartado']}")
+            messagebox.showinfo("Restaurar", message)
+        
+        def failed(e):
+            dialog.close()
+            messagebox.showerror("Error", f"No se pudo restaurar el respaldo:\n{e}")
+        
+        self.executor.submit(
+            "restore",
+            lambda db, task: restore_backup(file_path, db_file, folder,
+                                            progress=task.progress,
+                                            cancelled=lambda: task.cancelled),
+            on_done=done,
+            on_error=failed,
+            on_progress=dialog.update,
+            name="restore_backup",
+        )
+
+    def show_movement_batch(self):
+        """Planilla de recepción o despacho: muchas líneas aplicadas en una sola transacción"""
+        top = tk.Toplevel(self.root)
+        top.title("Entradas y salidas por lote")
+        top.geometry("640x520")
+        top.transient(self.root)
+        
+        options = ttk.Frame(top, padding=5)
+        options.pack(fill=tk.X)
+        ttk.Label(options, text="Tipo de las líneas sin tipo:").pack(side=tk.LEFT, padx=5)
+        tipo_combobox = ttk.Combobox(options, values=["Entrada", "Salida"], state="readonly", width=10)
+        tipo_combobox.set("Entrada")
+        tipo_combobox.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(top, text="Una línea por movimiento: código y cantidad, o código, tipo y cantidad.\n"
+                            "Se puede pegar directamente desde una planilla.").pack(fill=tk.X, padx=10)
+        
+        text_frame = ttk.Frame(top, padding=5)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        text = tk.Text(text_frame, wrap=tk.NONE, font=('Courier', 10), height=15)
+        scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(fill=tk.BOTH, expand=True)
+        
+        errors_box = tk.Listbox(top, height=6, foreground=self.danger_color)
+        
+        buttons = ttk.Frame(top, padding=5)
+        buttons.pack(fill=tk.X, side=tk.BOTTOM)
+        
+        def tipo():
+            return tipo_combobox.get().lower()
+        
+        def show_errors(errors):
+            errors_box.delete(0, tk.END)
+            for line, message in errors:
+                errors_box.insert(tk.END, f"Línea {line}: {message}")
+            if not errors_box.winfo_ismapped():
+                errors_box.pack(fill=tk.X, padx=10, pady=(0, 5), before=buttons)
+        
+        def load_file():
+            file_path = filedialog.askopenfilename(
+                parent=top,
+                filetypes=[("Archivos CSV o Excel", "*.csv *.csv.gz *.xlsx"), ("Todos los archivos", "*.*")],
+                title="Cargar planilla"
+            )
+            if not file_path:
+                return
+            try:
+                lines, _, errors = read_movement_sheet(file_path, tipo())
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"No se pudo leer la planilla:\n{e}", parent=top)
+                return
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, "\n".join(f"{codigo}\t{kind}\t{cantidad}" for codigo, kind, cantidad in lines))
+            if errors:
+                show_errors(errors)
+        
+        def apply():
+            lines, numbers, errors = parse_movement_text(text.get("1.0", tk.END), tipo())
+            if not lines and not errors:
+                messagebox.showwarning("Advertencia", "No hay movimientos para registrar", parent=top)
+                return
+            apply_button.config(state=tk.DISABLED)
             
-            # Encabezados de la tabla
-            pdf.set_fill_color(44, 62, 80)  # Color primario
-            pdf.set_text_color(255, 255, 255)  # Texto blanco
-            for i, header in enumerate(headers):
-                pdf.cell(col_widths[i], 10, txt=header, border=1, fill=True)
-            pdf.ln()
+            def done(stock):
+                if top.winfo_exists():
+                    top.destroy()
+                # Solo cambia el stock: se releen las filas visibles afectadas
+                self.product_list.refresh_rows(stock)
+                if hasattr(self, 'movement_tree'):
+                    self.load_movements()
+                if hasattr(self, 'summary_tree'):
+                    self.load_summary()
+                self.update_alert_count()
+                messagebox.showinfo("Éxito", f"{len(lines)} movimientos registrados en {len(stock)} productos")
             
-            # Contenido de la tabla
-            pdf.set_fill_color(255, 255, 255)  # Fondo blanco
-            pdf.set_text_color(0, 0, 0)  # Texto negro
+            def failed(e):
+                if not top.winfo_exists():
+                    return
+                apply_button.config(state=tk.NORMAL)
+                if isinstance(e, MovementBatchError):
+                    show_errors(e.errors)
+                    messagebox.showwarning(
+                        "Lote rechazado",
+                        f"No se registró ningún movimiento: {len(e.errors)} líneas con error.", parent=top
+                    )
+                else:
+                    messagebox.showerror("Error", f"No se pudo registrar el lote:\n{e}", parent=top)
             
-            for item in items:
-                row = self.product_tree.item(item)["values"]
-                for i, value in enumerate(row):
-                    pdf.cell(col_widths[i], 10, txt=str(value), border=1)
-                pdf.ln()
+            self.executor.submit(
+                "movement_batch",
+                lambda db, task: db.apply_movements(lines, numbers, errors),
+                on_done=done,
+                on_error=failed,
+                name="apply_movements",
+            )
+        
+        ttk.Button(buttons, text="Cargar archivo...", command=load_file).pack(side=tk.LEFT, padx=5)
+        apply_button = ttk.Button(buttons, text="Registrar", command=apply, style='Success.TButton')
+        apply_button.pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons, text="Cerrar", command=top.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    def import_products(self):
+        """Importa productos desde un archivo CSV o Excel en segundo plano"""
+        if self.server:
+            messagebox.showinfo(
+                "Importación",
+                "Con servidor la importación masiva se hace en el equipo del servidor:\n\n"
+                "python cli.py importar productos.csv"
+            )
+            return
+        
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Archivos CSV o Excel", "*.csv *.csv.gz *.xlsx"),
+                       ("Todos los archivos", "*.*")],
+            title="Importar productos"
+        )
+        
+        if not file_path:
+            return
+        
+        def cancel():
+            # Los lotes ya confirmados se conservan: se muestran al cancelar
+            self.executor.cancel("import")
+            self.load_categories()
+            self.load_categories_combobox()
+            self.load_products()
+        
+        dialog = ProgressDialog(self.root, "Importando productos", cancel)
+        
+        def done(report):
+            dialog.close()
+            self.load_categories()
+            self.load_categories_combobox()
+            self.load_products()
             
-            # Pie de página
-            pdf.ln(10)
-            pdf.set_font("Arial", 'I', 8)
-            pdf.cell(0, 10, txt="Sistema de Inventario SENA - © 2023", ln=1, align='C')
+            message = report.summary()
+            if not report.errors:
+                messagebox.showinfo("Importación", message)
+                return
             
-            pdf.output(file_path)
-            messagebox.showinfo("Éxito", f"Reporte PDF generado correctamente en:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo generar el PDF:\n{str(e)}")
+            if messagebox.askyesno("Importación", message + "\n\n¿Desea guardar el detalle de los errores?"):
+                errors_path = filedialog.asksaveasfilename(
+                    defaultextension=".csv",
+                    filetypes=[("Archivos CSV", "*.csv")],
+                    title="Guardar errores"
+                )
+                if errors_path:
+                    report.write_errors(errors_path)
+        
+        def failed(e):
+            dialog.close()
+            messagebox.showerror("Error", f"No se pudo importar el archivo:\n{str(e)}")
+        
+        self.executor.submit(
+            "import",
+            lambda db, task: import_products(db, file_path,
+                                             progress=task.progress,
+                                             cancelled=lambda: task.cancelled),
+            on_done=done,
+            on_error=failed,
+            on_progress=dialog.update,
+            name="import_products",
+        )
 
     def add_product(self):
         """Agrega un nuevo producto a la base de datos"""
@@ -563,50 +2090,24 @@ class InventarioApp:
             messagebox.showwarning("Advertencia", "Precio y stock deben ser números válidos")
             return
 
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Obtener ID de la categoría
-                cursor.execute("SELECT id FROM categorias WHERE nombre = ?", (categoria,))
-                categoria_id = cursor.fetchone()
-                if not categoria_id:
-                    messagebox.showwarning("Advertencia", "Categoría no válida")
-                    return
-                categoria_id = categoria_id[0]
-
-                # Verificar si el código ya existe
-                cursor.execute("SELECT * FROM productos WHERE codigo = ?", (codigo,))
-                if cursor.fetchone():
-                    messagebox.showwarning("Advertencia", "El código de producto ya existe")
-                    return
-
-                # Insertar nuevo producto
-                cursor.execute(
-                    "INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, ?)",
-                    (codigo, nombre, precio, stock, categoria_id)
-                )
-                
-                # Registrar movimiento
-                cursor.execute(
-                    "INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)",
-                    (cursor.lastrowid, 'entrada', stock)
-                )
-                
-                conn.commit()
-                messagebox.showinfo("Éxito", "Producto agregado correctamente")
-                self.clear_product_form()
-                self.load_products()
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo agregar el producto: {e}")
-            finally:
-                conn.close()
+        try:
+            # La latencia medida incluye actualizar la lista, no los diálogos
+            with self.db.timed("add_product"):
+                producto = self.db.insert_product(codigo, nombre, precio, stock, categoria)
+                self.product_list.insert_row(producto)
+            self.update_alert_count()
+            
+            messagebox.showinfo("Éxito", "Producto agregado correctamente")
+            self.clear_product_form()
+            
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo agregar el producto: {e}")
 
     def edit_product(self):
         """Edita un producto existente"""
-        selected_item = self.product_tree.selection()
+        selected_item = self.product_list.selection()
         if not selected_item:
             messagebox.showwarning("Advertencia", "Debe seleccionar un producto")
             return
@@ -630,52 +2131,28 @@ class InventarioApp:
             messagebox.showwarning("Advertencia", "Precio y stock deben ser números válidos")
             return
 
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Obtener ID de la categoría
-                cursor.execute("SELECT id FROM categorias WHERE nombre = ?", (categoria,))
-                categoria_id = cursor.fetchone()
-                if not categoria_id:
-                    messagebox.showwarning("Advertencia", "Categoría no válida")
-                    return
-                categoria_id = categoria_id[0]
+        # Obtener ID del producto (usando el iid del Treeview)
+        producto_id = int(selected_item[0])
 
-                # Obtener ID del producto (usando el iid del Treeview)
-                producto_id = selected_item[0]
-                
-                # Obtener datos actuales del producto
-                cursor.execute("SELECT stock FROM productos WHERE id = ?", (producto_id,))
-                stock_actual = cursor.fetchone()[0]
-                diferencia = stock - stock_actual
-
-                # Actualizar producto
-                cursor.execute(
-                "INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)",
-                 (producto_id, tipo, abs(diferencia))
-                )
-                
-                # Registrar movimiento si hay cambio en el stock
-                if diferencia != 0:
-                    tipo = 'entrada' if diferencia > 0 else 'salida'
-                    cursor.execute(
-                        "INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, ?, ?)",
-                        (producto_id, tipo, abs(diferencia))
-                    )
-                conn.commit()
-                messagebox.showinfo("Éxito", "Producto actualizado correctamente")
-                self.load_products()
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo actualizar el producto: {e}")
-            finally:
-                conn.close()
+        try:
+            with self.db.timed("edit_product"):
+                # La fila anterior sale de la caché; solo si ya no está se consulta
+                cached = self.product_list.row(producto_id)
+                anterior = cached.astuple() if cached else self.db.fetch_product(producto_id)
+                producto = self.db.update_product(producto_id, codigo, nombre, precio, stock, categoria)
+                self.product_list.update_row(producto, anterior)
+            self.update_alert_count()
+            
+            messagebox.showinfo("Éxito", "Producto actualizado correctamente")
+            
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo actualizar el producto: {e}")
 
     def delete_product(self):
         """Elimina un producto de la base de datos"""
-        selected_item = self.product_tree.selection()
+        selected_item = self.product_list.selection()
         if not selected_item:
             messagebox.showwarning("Advertencia", "Debe seleccionar un producto")
             return
@@ -683,28 +2160,21 @@ class InventarioApp:
         if not messagebox.askyesno("Confirmar", "¿Está seguro que desea eliminar este producto?"):
             return
 
-        producto_id = selected_item[0]  # Obtenemos el ID del iid del Treeview
+        producto_id = int(selected_item[0])  # Obtenemos el ID del iid del Treeview
 
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Primero eliminar movimientos relacionados
-                cursor.execute("DELETE FROM movimientos WHERE producto_id = ?", (producto_id,))
-                
-                # Luego eliminar el producto
-                cursor.execute("DELETE FROM productos WHERE id = ?", (producto_id,))
-                
-                conn.commit()
-                messagebox.showinfo("Éxito", "Producto eliminado correctamente")
-                self.clear_product_form()
-                self.load_products()
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo eliminar el producto: {e}")
-            finally:
-                conn.close()
+        try:
+            with self.db.timed("delete_product"):
+                producto = self.db.delete_product(producto_id)
+                self.product_list.remove_rows([producto])
+            self.update_alert_count()
+            
+            messagebox.showinfo("Éxito", "Producto eliminado correctamente")
+            self.clear_product_form()
+            
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo eliminar el producto: {e}")
 
     def clear_product_form(self):
         """Limpia el formulario de productos"""
@@ -720,14 +2190,18 @@ class InventarioApp:
         if not selected_item:
             return
 
-        item_data = self.product_tree.item(selected_item)['values']
+        # Los valores salen de la caché con sus tipos: leídos del Treeview un
+        # código como "00123" volvería convertido en el número 123
+        producto = self.product_list.row(int(selected_item[0]))
+        if producto is None:
+            return
         self.clear_product_form()
         
-        self.codigo_entry.insert(0, item_data[0])  # código
-        self.nombre_entry.insert(0, item_data[1])  # nombre
-        self.precio_entry.insert(0, item_data[2])  # precio
-        self.stock_entry.insert(0, item_data[3])   # stock
-        self.categoria_combobox.set(item_data[4])  # categoría
+        self.codigo_entry.insert(0, producto.codigo)
+        self.nombre_entry.insert(0, producto.nombre)
+        self.precio_entry.insert(0, str(producto.precio))
+        self.stock_entry.insert(0, str(producto.stock))
+        self.categoria_combobox.set(producto.categoria or "")
 
     def add_category(self): 
         """Agrega una nueva categoría a la base de datos"""
@@ -736,29 +2210,18 @@ class InventarioApp:
             messagebox.showwarning("Advertencia", "Debe ingresar un nombre para la categoría")
             return
         
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                # Verificar si la categoría ya existe
-                cursor.execute("SELECT * FROM categorias WHERE nombre = ?", (nombre,))
-                if cursor.fetchone():
-                    messagebox.showwarning("Advertencia", "Esta categoría ya existe")
-                    return
-                
-                # Insertar nueva categoría
-                cursor.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
-                conn.commit()
-                
-                messagebox.showinfo("Éxito", "Categoría agregada correctamente")
-                self.clear_category_form()
-                self.load_categories()
-                self.load_categories_combobox()
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo agregar la categoría: {e}")
-            finally:
-                conn.close()
+        try:
+            with self.db.timed("add_category"):
+                categoria_id, nombre = self.db.insert_category(nombre)
+                self.place_category(categoria_id, nombre)
+            
+            messagebox.showinfo("Éxito", "Categoría agregada correctamente")
+            self.clear_category_form()
+            
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo agregar la categoría: {e}")
 
     def edit_category(self):
         """Edita una categoría existente"""
@@ -772,36 +2235,31 @@ class InventarioApp:
             messagebox.showwarning("Advertencia", "Debe ingresar un nombre para la categoría")
             return
 
-        categoria_id = selected_item[0]  # Obtenemos el ID del iid del Treeview
-        nombre_actual = self.category_tree.item(selected_item)['values'][0]
+        categoria_id = int(selected_item[0])  # Obtenemos el ID del iid del Treeview
+        nombre_actual = self.category_tree.set(selected_item[0], "nombre")
 
         if nuevo_nombre == nombre_actual:
             return
 
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Verificar si el nuevo nombre ya existe
-                cursor.execute("SELECT * FROM categorias WHERE nombre = ? AND id != ?", (nuevo_nombre, categoria_id))
-                if cursor.fetchone():
-                    messagebox.showwarning("Advertencia", "Ya existe una categoría con ese nombre")
-                    return
-                
-                # Actualizar categoría
-                cursor.execute("UPDATE categorias SET nombre = ? WHERE id = ?", (nuevo_nombre, categoria_id))
-                conn.commit()
-                
-                messagebox.showinfo("Éxito", "Categoría actualizada correctamente")
-                self.clear_category_form()
-                self.load_categories()
-                self.load_categories_combobox()
+        try:
+            with self.db.timed("edit_category"):
+                categoria_id, nuevo_nombre = self.db.update_category(categoria_id, nuevo_nombre)
+                self.place_category(categoria_id, nuevo_nombre, nombre_actual)
                 
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo actualizar la categoría: {e}")
-            finally:
-                conn.close()
+                # Solo se releen los productos en pantalla que mostraban el nombre anterior
+                window = self.product_list.window
+                self.product_list.refresh_rows(
+                    producto_id for producto_id, categoria in zip(window.ids, window.categorias)
+                    if categoria == nombre_actual
+                )
+            
+            messagebox.showinfo("Éxito", "Categoría actualizada correctamente")
+            self.clear_category_form()
+            
+        except ValueError as e:
+            messagebox.showwarning("Advertencia", str(e))
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo actualizar la categoría: {e}")
 
     def delete_category(self):
         """Elimina una categoría de la base de datos"""
@@ -813,30 +2271,41 @@ class InventarioApp:
         if not messagebox.askyesno("Confirmar", "¿Está seguro que desea eliminar esta categoría? Los productos asociados quedarán sin categoría."):
             return
 
-        categoria_id = selected_item[0]  # Obtenemos el ID del iid del Treeview
+        categoria_id = int(selected_item[0])  # Obtenemos el ID del iid del Treeview
+        nombre = self.category_tree.set(selected_item[0], "nombre")
 
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                # Primero actualizar productos que usan esta categoría
-                cursor.execute("UPDATE productos SET categoria_id = NULL WHERE categoria_id = ?", (categoria_id,))
-                
-                # Luego eliminar la categoría
-                cursor.execute("DELETE FROM categorias WHERE id = ?", (categoria_id,))
-                
-                conn.commit()
-                messagebox.showinfo("Éxito", "Categoría eliminada correctamente")
-                self.clear_category_form()
-                self.load_categories()
-                self.load_categories_combobox()
-                self.load_products()  # Actualizar lista de productos
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudo eliminar la categoría: {e}")
-            finally:
-                conn.close()
+        try:
+            with self.db.timed("delete_category"):
+                productos = self.db.delete_category(categoria_id)
+                self.category_tree.delete(categoria_id)
+                self.update_categories_combobox(old=nombre)
+                self.product_list.refresh_rows(productos)  # Actualizar productos en pantalla
+            self.update_alert_count()  # sus productos pierden el mínimo de la categoría
+            
+            messagebox.showinfo("Éxito", "Categoría eliminada correctamente")
+            self.clear_category_form()
+            
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudo eliminar la categoría: {e}")
+
+    def place_category(self, categoria_id, nombre, old=None):
+        """Inserta o mueve una categoría a su posición alfabética sin recargar la lista"""
+        if self.category_tree.exists(categoria_id):
+            self.category_tree.delete(categoria_id)
+        
+        nombres = [self.category_tree.set(iid, "nombre") for iid in self.category_tree.get_children()]
+        index = bisect.bisect_left(nombres, nombre)
+        self.category_tree.insert("", index, values=(nombre,), iid=categoria_id)
+        self.update_categories_combobox(old=old, new=nombre)
+
+    def update_categories_combobox(self, old=None, new=None):
+        """Aplica un alta, cambio o baja de categoría a la lista del combobox"""
+        nombres = list(self.root.tk.splitlist(self.categoria_combobox['values']))
+        if old is not None and old in nombres:
+            nombres.remove(old)
+        if new is not None:
+            bisect.insort(nombres, new)
+        self.categoria_combobox['values'] = nombres
 
     def clear_category_form(self):
         """Limpia el formulario de categorías"""
@@ -853,101 +2322,131 @@ class InventarioApp:
         self.category_entry.insert(0, item_data[0])  # nombre
 
     def load_movements(self):
-        """Carga los movimientos desde la base de datos al TreeView"""
-        self.movement_tree.delete(*self.movement_tree.get_children())
-        
-        filtro = self.movement_filter.get()
+        """Aplica los filtros y carga la primera página de movimientos"""
+        desde = self.movement_from.get().strip() or None
+        hasta = self.movement_to.get().strip() or None
+        codigo = self.movement_product.get().strip()
+        try:
+            for fecha in (desde, hasta):
+                if fecha:
+                    datetime.strptime(fecha, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Error", "Las fechas deben tener el formato AAAA-MM-DD")
+            return
         
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                
-                query = """
-                    SELECT m.id, p.nombre, m.tipo, m.cantidad, m.fecha
-                    FROM movimientos m
-                    JOIN productos p ON m.producto_id = p.id
-                """
-                
-                if filtro != "Todos":
-                    query += " WHERE m.tipo = ?"
-                    cursor.execute(query, (filtro.lower(),))
-                else:
-                    cursor.execute(query)
-                    
-                movimientos = cursor.fetchall()
-                
-                for mov in movimientos:
-                    # Insertamos solo los datos visibles (sin el ID)
-                    self.movement_tree.insert("", tk.END, values=mov[1:], iid=mov[0])
-                    
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudieron cargar los movimientos: {e}")
-            finally:
-                conn.close()
+        # El código se resuelve en el hilo de la consulta, junto con la página
+        self.movement_code = codigo or None
+        self.movement_filters = {
+            'tipo': MOVEMENT_TYPES.get(self.movement_filter.get()),
+            'desde': desde,
+            'hasta': hasta,
+            'sort': self.movement_sort,
+        }
+        self.movement_key = sort_key(self.movement_sort, MOVEMENT_SORTS, MOVEMENT_SORT)
+        self.movement_before = None
+        self.movement_loaded = 0
+        self.movement_more = True
+        self.movement_tree.delete(*self.movement_tree.get_children())
+        self.movement_count.config(text="")
+        self.movement_loading = False
+        self.load_more_movements()
+
+    def load_more_movements(self):
+        """Pide en segundo plano la página siguiente a la última fila mostrada"""
+        if not self.movement_more or self.movement_loading:
+            return
+        self.movement_loading = True
+        filtros, before, codigo = self.movement_filters, self.movement_before, self.movement_code
+        
+        def fetch(db, task):
+            producto_id = None
+            if codigo:
+                # Una lectura por índice único: no vale la pena recordarla entre páginas
+                producto_id = db.product_id_by_code(codigo)
+                if producto_id is None:
+                    raise ValueError(f"No existe un producto con código {codigo}")
+            return db.fetch_movements_page(before, MOVEMENT_PAGE, producto_id=producto_id, **filtros)
+        
+        self.executor.submit(
+            "movements",
+            fetch,
+            on_done=self.append_movements,
+            on_error=self.on_movements_error,
+            name="load_movements",
+        )
+
+    def append_movements(self, rows):
+        """Agrega una página al final del historial"""
+        self.movement_loading = False
+        for row in rows:
+            self.movement_tree.insert("", tk.END, values=row[1:], iid=row[0])
+        if rows:
+            self.movement_before = self.movement_key(rows[-1])
+        self.movement_loaded += len(rows)
+        self.movement_more = len(rows) == MOVEMENT_PAGE
+        
+        self.movement_count.config(
+            text=f"{self.movement_loaded} movimientos" + (" (desplace para ver más)" if self.movement_more else "")
+        )
+
+    def on_movements_error(self, e):
+        self.movement_loading = False
+        self.movement_more = False
+        messagebox.showerror("Error", f"No se pudieron cargar los movimientos: {e}")
 
     def load_categories(self):
         """Carga las categorías desde la base de datos al TreeView"""
+        if not hasattr(self, 'category_tree'):
+            return  # la pestaña se llena al construirse
         self.category_tree.delete(*self.category_tree.get_children())
         
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, nombre FROM categorias ORDER BY nombre")
-                categorias = cursor.fetchall()
+        try:
+            with self.db.timed("load_categories"):
+                categorias = self.db.categories.items()
+            
+            for categoria in categorias:
+                # Insertamos solo el nombre pero usamos el ID como iid
+                self.category_tree.insert("", tk.END, values=(categoria[1],), iid=categoria[0])
                 
-                for categoria in categorias:
-                    # Insertamos solo el nombre pero usamos el ID como iid
-                    self.category_tree.insert("", tk.END, values=(categoria[1],), iid=categoria[0])
-                    
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudieron cargar las categorías: {e}")
-            finally:
-                conn.close()
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudieron cargar las categorías: {e}")
 
     def load_products(self):
         """Carga los productos desde la base de datos al TreeView"""
-        self.product_tree.delete(*self.product_tree.get_children())
-        
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT p.id, p.codigo, p.nombre, p.precio, p.stock, 
-                           c.nombre, p.fecha_creacion
-                    FROM productos p
-                    LEFT JOIN categorias c ON p.categoria_id = c.id
-                    ORDER BY p.nombre
-                """)
-                productos = cursor.fetchall()
-                
-                for producto in productos:
-                    # Insertamos todos los campos excepto el ID (usamos el ID como iid)
-                    self.product_tree.insert("", tk.END, values=producto[1:], iid=producto[0])
-                    
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudieron cargar los productos: {e}")
-            finally:
-                conn.close()
+        # El recuento se hace en segundo plano; la lista virtual solo pide
+        # después las filas visibles
+        self.executor.submit(
+            "products",
+            lambda db, task: ProductSource(db).count(),
+            on_done=lambda total: self.show_search_results(None, total=total),
+            on_error=lambda e: messagebox.showerror("Error", f"No se pudieron cargar los productos: {e}"),
+            name="load_products",
+        )
+        self.update_alert_count()
 
     def load_categories_combobox(self):
         """Carga las categorías en el combobox de productos"""
-        conn = create_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT nombre FROM categorias ORDER BY nombre")
-                categorias = [row[0] for row in cursor.fetchall()]
-                self.categoria_combobox['values'] = categorias
-                
-            except Error as e:
-                messagebox.showerror("Error", f"No se pudieron cargar las categorías: {e}")
-            finally:
-                conn.close()
+        try:
+            with self.db.timed("load_categories_combobox"):
+                categorias = self.db.categories.names()
+            self.categoria_combobox['values'] = categorias
+            
+        except Error as e:
+            messagebox.showerror("Error", f"No se pudieron cargar las categorías: {e}")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # necesario para el pool de procesos en el .exe
+    import argparse
+    parser = argparse.ArgumentParser(description="Inventario")
+    parser.add_argument("--servidor", metavar="URL",
+                        help="trabaja contra servidor.py (p. ej. http://192.168.1.10:8765) en vez de la base local")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = InventarioApp(root)
-    root.mainloop()
\ No newline at end of file
+    try:
+        app = InventarioApp(root, server=args.servidor)
+    except Error as e:
+        messagebox.showerror("Error", f"No se pudo abrir el inventario:\n{e}")
+        root.destroy()
+    else:
+        root.mainloop()
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""Reportes PDF del inventario sobre fpdf, generados en paralelo."""
+from fpdf import FPDF
+from datetime import datetime
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # sin pypdf los reportes se generan en un solo proceso
+    PdfWriter = None
+
+from inventario_core import InventarioDB, PRODUCT_HEADERS
+
+# ----------------------------
+# Clase para el PDF
+# ----------------------------
+class PDF(FPDF):
+    def __init__(self):
+        super().__init__(orientation='L')  # 'L' para landscape (horizontal)
+        self.set_auto_page_break(auto=True, margin=15)
+    
+    def header(self):
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 10, 'Reporte de Inventario', 0, 1, 'C')
+        self.ln(5)
+    
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+# ----------------------------
+# Motor de reportes PDF
+# ----------------------------
+REPORT_ROW_HEIGHT = 7
+REPORT_CHUNK_PAGES = 50      # páginas que genera cada proceso por encargo
+REPORT_PAGE_WIDTH = 277      # A4 horizontal menos márgenes (mm)
+REPORT_PAGE_BOTTOM = 195     # límite inferior antes del pie de página (mm)
+REPORT_TABLE_TOP = 25        # y tras el encabezado de cada página
+REPORT_FIRST_TABLE_TOP = 60  # y tras título y fecha en la primera página
+REPORT_CHAR_WIDTH = 1.9      # ancho medio de un carácter Arial 10 (mm)
+REPORT_MAX_CHARS = [20, 60, 12, 10, 30, 19]  # tope de caracteres por columna
+
+def pdf_text(value):
+    """Convierte un valor en texto apto para las fuentes básicas de FPDF"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        value = f"{value:.2f}"
+    return str(value).encode('latin-1', 'replace').decode('latin-1')
+
+class ReportPDF(PDF):
+    """PDF de una parte del reporte con la geometría ya calculada"""
+
+    def __init__(self, layout, page_offset=0):
+        super().__init__()
+        self.layout = layout
+        self.page_offset = page_offset
+        # La paginación la decide el layout, no FPDF
+        self.set_auto_page_break(auto=False)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        page = self.page_offset + self.page_no()
+        self.cell(0, 10, f'Página {page} de {self.layout["total_pages"]}', 0, 0, 'C')
+
+    def table_header(self):
+        self.set_font('Arial', 'B', 10)
+        self.set_fill_color(44, 62, 80)  # Color primario
+        self.set_text_color(255, 255, 255)  # Texto blanco
+        for width, header in zip(self.layout['widths'], PRODUCT_HEADERS):
+            self.cell(width, REPORT_ROW_HEIGHT, pdf_text(header), border=1, fill=True)
+        self.ln()
+        self.set_font('Arial', size=9)
+        self.set_text_color(0, 0, 0)  # Texto negro
+
+    def title_block(self):
+        self.set_font('Arial', size=12)
+        self.cell(0, 10, txt="Reporte de Inventario - SENA", ln=1, align='C')
+        self.ln(10)
+        self.set_font('Times', size=10)
+        self.cell(0, 10, txt=f"Generado el: {self.layout['generated']}", ln=1, align='R')
+        self.ln(5)
+
+    def closing_block(self):
+        self.ln(10)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, txt="Sistema de Inventario SENA - © 2023", ln=1, align='C')
+
+    def render(self, first_page, last_page, rows):
+        """Dibuja las páginas [first_page, last_page] consumiendo ``rows`` en orden"""
+        layout = self.layout
+        widths = layout['widths']
+        max_chars = layout['max_chars']
+        rows = iter(rows)
+        
+        for page in range(first_page, last_page + 1):
+            self.add_page()
+            if page == 1:
+                self.title_block()
+            capacity = layout['rows_first'] if page == 1 else layout['rows_per_page']
+            if page <= layout['table_pages']:
+                self.table_header()
+                for _ in range(capacity):
+                    row = next(rows, None)
+                    if row is None:
+                        break
+                    for width, limit, value in zip(widths, max_chars, row[1:]):
+                        text = pdf_text(value)
+                        if len(text) > limit:
+                            text = text[:limit - 3] + '...'
+                        self.cell(width, REPORT_ROW_HEIGHT, text, border=1)
+                    self.ln()
+            if page == layout['total_pages']:
+                self.closing_block()
+
+def render_report_pages(job):
+    """Genera en un proceso aparte un tramo de páginas del reporte.
+
+    Cada proceso abre su propia conexión y lee sus filas con paginación
+    por clave a partir de ``start_key``, así que no hay que enviarle datos.
+    """
+    db_file, search, sort, layout, first_page, last_page, start_key, out_path = job
+    db = InventarioDB(db_file, setup=False)
+    try:
+        rows = (row for batch in db.iter_products(search, 2000, start_key, sort) for row in batch)
+        pdf = ReportPDF(layout, page_offset=first_page - 1)
+        pdf.render(first_page, last_page, rows)
+        pdf.output(out_path)
+    finally:
+        db.close()
+    return out_path
+
+class InventoryReport:
+    """Reporte PDF de inventario pensado para decenas de miles de productos.
+
+    El layout (anchos de columna, filas por página, total de páginas) se
+    calcula una sola vez. Las páginas se reparten en tramos que se generan
+    en paralelo en un pool de procesos y se unen al final con pypdf; si
+    pypdf no está instalado se generan en el mismo proceso.
+    """
+
+    def __init__(self, db, search=None, workers=None, chunk_pages=REPORT_CHUNK_PAGES, sort=None):
+        self.db = db
+        self.search = search
+        self.sort = sort  # ver PRODUCT_SORTS; el mismo orden que la lista en pantalla
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_pages = chunk_pages
+
+    def compute_layout(self):
+        total_rows = self.db.count_products(self.search)
+        lengths = self.db.product_column_lengths(self.search)
+        
+        # Anchos proporcionales al contenido real, con un tope por columna
+        chars = [max(len(header), min(length, cap))
+                 for header, length, cap in zip(PRODUCT_HEADERS, lengths, REPORT_MAX_CHARS)]
+        scale = REPORT_PAGE_WIDTH / sum(chars)
+        widths = [round(c * scale, 1) for c in chars]
+        max_chars = [max(4, int(w / REPORT_CHAR_WIDTH)) for w in widths]
+        
+        rows_first = (REPORT_PAGE_BOTTOM - REPORT_FIRST_TABLE_TOP) // REPORT_ROW_HEIGHT - 1
+        rows_per_page = (REPORT_PAGE_BOTTOM - REPORT_TABLE_TOP) // REPORT_ROW_HEIGHT - 1
+        if total_rows <= rows_first:
+            table_pages = 1
+            last_rows = total_rows
+            last_top = REPORT_FIRST_TABLE_TOP
+        else:
+            table_pages = 1 + math.ceil((total_rows - rows_first) / rows_per_page)
+            last_rows = total_rows - rows_first - (table_pages - 2) * rows_per_page
+            last_top = REPORT_TABLE_TOP
+        
+        # El texto de cierre necesita 20 mm libres tras la última fila
+        last_y = last_top + (last_rows + 1) * REPORT_ROW_HEIGHT
+        total_pages = table_pages + (1 if last_y + 20 > REPORT_PAGE_BOTTOM else 0)
+        
+        return {
+            'widths': widths,
+            'max_chars': max_chars,
+            'rows_first': rows_first,
+            'rows_per_page': rows_per_page,
+            'table_pages': table_pages,
+            'total_pages': total_pages,
+            'total_rows': total_rows,
+            'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def plan(self, layout):
+        """Divide el reporte en tramos de páginas: (primera, última, fila inicial)"""
+        chunk = max(1, min(self.chunk_pages, math.ceil(layout['total_pages'] / self.workers)))
+        jobs = []
+        for first in range(1, layout['total_pages'] + 1, chunk):
+            last = min(first + chunk - 1, layout['total_pages'])
+            if first == 1:
+                start_row = 0
+            else:
+                start_row = layout['rows_first'] + (first - 2) * layout['rows_per_page']
+            jobs.append((first, last, min(start_row, layout['total_rows'])))
+        return jobs
+
+    def build(self, file_path, progress=None, cancelled=None):
+        """Genera el reporte y devuelve estadísticas, o None si se canceló"""
+        inicio = time.perf_counter()
+        layout = self.compute_layout()
+        jobs = self.plan(layout)
+        
+        # Clave de la fila anterior a cada tramo para que empiece por keyset
+        positions = [start for _, _, start in jobs if start > 0]
+        keys = iter(self.db.product_keys_at(positions, self.search, self.sort))
+        starts = [next(keys) if start > 0 else None for _, _, start in jobs]
+        
+        if PdfWriter is None or len(jobs) == 1 or self.workers == 1:
+            result = self._build_single(file_path, layout, progress, cancelled)
+        else:
+            result = self._build_parallel(file_path, layout, jobs, starts, progress, cancelled)
+        if result is None:
+            return None
+        
+        elapsed = time.perf_counter() - inicio
+        return {
+            'pages': layout['total_pages'],
+            'rows': layout['total_rows'],
+            'seconds': elapsed,
+            'pages_per_second': layout['total_pages'] / elapsed if elapsed else 0.0,
+        }
+
+    def _build_single(self, file_path, layout, progress, cancelled):
+        pdf = ReportPDF(layout)
+        rows = (row for batch in self.db.iter_products(self.search, 2000, sort=self.sort) for row in batch)
+        for first in range(1, layout['total_pages'] + 1, self.chunk_pages):
+            if cancelled and cancelled():
+                return None
+            last = min(first + self.chunk_pages - 1, layout['total_pages'])
+            pdf.render(first, last, rows)
+            if progress:
+                progress(last, layout['total_pages'])
+        pdf.output(file_path)
+        return file_path
+
+    def _build_parallel(self, file_path, layout, jobs, starts, progress, cancelled):
+        workdir = tempfile.mkdtemp(prefix='reporte_')
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        try:
+            futures = {}
+            for i, ((first, last, _), start_key) in enumerate(zip(jobs, starts)):
+                part = os.path.join(workdir, f'parte_{i:05d}.pdf')
+                job = (self.db.db_file, self.search, self.sort, layout, first, last, start_key, part)
+                futures[pool.submit(render_report_pages, job)] = (i, last - first + 1)
+            
+            parts = [None] * len(jobs)
+            done_pages = 0
+            for future in as_completed(futures):
+                if cancelled and cancelled():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+                i, pages = futures[future]
+                parts[i] = future.result()
+                done_pages += pages
+                if progress:
+                    progress(done_pages, layout['total_pages'])
+            
+            writer = PdfWriter()
+            for part in parts:
+                writer.append(part)
+            with open(file_path, 'wb') as file:
+                writer.write(file)
+            return file_path
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(workdir, ignore_errors=True)
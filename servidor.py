@@ -0,0 +1,500 @@
+"""Servidor HTTP/JSON del inventario para varias estaciones de trabajo.
+
+Es el único proceso que abre la base de datos: las estaciones usan la
+aplicación como cliente (``python proyecto.py --servidor http://host:8765``)
+y ya no compiten por el bloqueo de escritura de SQLite.
+
+Todas las escrituras pasan por una única tarea que las agrupa: lo que se
+acumuló en la cola mientras se confirmaba el grupo anterior se guarda con
+un solo commit (cada operación en su propio savepoint). Las lecturas se
+reparten entre un grupo de hilos con su propia conexión, que gracias a
+WAL no esperan al escritor.
+
+    python servidor.py --puerto 8765
+    python servidor.py --db inventario.db --host 0.0.0.0 --lectores 8
+"""
+import argparse
+import asyncio
+from array import array
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlite3 import Error
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from inventario_core import InventarioDB, DB_FILE
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8765
+READERS = 4             # hilos (y conexiones) de lectura
+WRITE_GROUP_MAX = 256   # operaciones confirmadas como máximo en un commit
+MAX_BODY = 1 << 20      # tamaño máximo del cuerpo de una petición
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ----------------------------
+# Escritor único y lectores
+# ----------------------------
+class WriteQueue:
+    """Cola de escrituras atendida por un solo hilo con su conexión.
+
+    ``submit`` encola un método de escritura de InventarioDB con sus
+    argumentos y espera su resultado. La tarea ``run`` toma todo lo que
+    haya en la cola y lo confirma con ``group_commit``: con muchos clientes
+    guardando a la vez se hace un commit por grupo y no uno por operación.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.db = None
+        self.queue = asyncio.Queue()
+        self.thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor")
+        self.version = 0      # grupos confirmados; los clientes lo usan como marca de cambios
+        self.groups = 0
+        self.operations = 0
+
+    async def open(self):
+        # La conexión se crea y se usa siempre en el hilo del escritor
+        loop = asyncio.get_running_loop()
+        self.db = await loop.run_in_executor(self.thread, InventarioDB, self.db_file)
+        return self.db
+
+    async def close(self):
+        if self.db is not None:
+            await asyncio.get_running_loop().run_in_executor(self.thread, self.db.close)
+            self.db = None
+        self.thread.shutdown()
+
+    async def submit(self, method, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((method, args, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < WRITE_GROUP_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(self.thread, self._apply, batch)
+            except Exception as e:
+                # Falló el commit: ninguna operación del grupo quedó guardada
+                results = [(False, e)] * len(batch)
+
+            self.version += 1
+            self.groups += 1
+            self.operations += len(batch)
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _apply(self, batch):
+        results = []
+        # El archivo del historial pudo crearse (cli.py archivar) después de
+        # abrir la conexión; dentro del grupo ya no se podría adjuntar
+        self.db.attach_archive()
+        with self.db.group_commit() as conn:
+            for method, args, _ in batch:
+                # Cada operación en su savepoint: si lanza cualquier excepción
+                # se deshace solo ella y el resto del grupo se confirma igual
+                conn.execute("SAVEPOINT escritura")
+                try:
+                    result = method(self.db, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO escritura")
+                    results.append((False, e))
+                else:
+                    results.append((True, result))
+                conn.execute("RELEASE escritura")
+        return results
+
+class ReaderPool:
+    """Hilos de lectura, cada uno con su conexión abierta la primera vez que se usa"""
+
+    def __init__(self, db_file, workers=READERS):
+        self.db_file = db_file
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lector")
+
+    def _call(self, func, args):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = InventarioDB(self.db_file, setup=False)
+        return func(db, *args)
+
+    async def run(self, func, *args):
+        """Ejecuta ``func(db, *args)`` en un hilo de lectura"""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._call, func, args)
+
+    def close(self):
+        self.pool.shutdown()
+
+# ----------------------------
+# Parámetros de las peticiones
+# ----------------------------
+def param(query, name, default=None, required=False):
+    values = query.get(name)
+    value = values[0] if values else ''
+    if required and not value.strip():  # solo espacios tampoco es una búsqueda
+        raise HTTPError(400, f"Falta el parámetro {name}")
+    return value if value != '' else default
+
+def int_param(query, name, default=None):
+    value = param(query, name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"El parámetro {name} debe ser un número entero")
+
+def json_param(query, name):
+    """Claves de paginación y listas: van en la URL como una lista JSON"""
+    value = param(query, name)
+    if value in (None, ''):
+        return None
+    try:
+        value = json.loads(value)
+    except ValueError:
+        raise HTTPError(400, f"El parámetro {name} no es JSON válido")
+    if not isinstance(value, list):
+        raise HTTPError(400, f"El parámetro {name} debe ser una lista JSON")
+    return value
+
+def field(body, name, kind=str):
+    if name not in body:
+        raise HTTPError(400, f"Falta el campo {name}")
+    value = body[name]
+    # int(1.5) daría 1 sin avisar: una cantidad con decimales se rechaza
+    if kind is int and (isinstance(value, bool) or isinstance(value, float) and not value.is_integer()):
+        raise HTTPError(400, f"El campo {name} debe ser un número entero")
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"El campo {name} no es válido")
+
+def to_json(value):
+    if isinstance(value, array):
+        return value.tolist()
+    raise TypeError(f"No se puede convertir {type(value).__name__} a JSON")
+
+# ----------------------------
+# Servidor
+# ----------------------------
+class InventarioServer:
+    """Expone productos, categorías, movimientos, búsqueda y resúmenes por HTTP/JSON"""
+
+    def __init__(self, db_file=DB_FILE, host=SERVER_HOST, port=SERVER_PORT, readers=READERS):
+        self.db_file = db_file
+        self.host = host
+        self.port = port
+        self.readers = ReaderPool(db_file, readers)
+        self.writer = WriteQueue(db_file)
+        self.server = None
+        self.tasks = []
+        self.requests = 0
+        self.started = time.time()
+
+        # (método, ruta) -> función; los grupos con nombre pasan como argumentos
+        self.routes = [
+            ('GET', r'/estado', self.get_status),
+            ('GET', r'/contadores', self.get_counters),
+            ('GET', r'/productos', self.get_products),
+            ('POST', r'/productos', self.post_product),
+            ('GET', r'/productos/total', self.get_product_count),
+            ('GET', r'/productos/anclas', self.get_anchor_keys),
+            ('GET', r'/productos/claves', self.get_keys_at),
+            ('GET', r'/productos/anchos', self.get_column_lengths),
+            ('GET', r'/productos/buscar', self.get_search),
+            ('GET', r'/productos/indice', self.get_search_index),
+            ('GET', r'/productos/por-ids', self.get_products_by_ids),
+            ('GET', r'/productos/codigo/(?P<codigo>[^/]+)', self.get_product_by_code),
+            ('GET', r'/productos/(?P<producto_id>\d+)', self.get_product),
+            ('PUT', r'/productos/(?P<producto_id>\d+)', self.put_product),
+            ('DELETE', r'/productos/(?P<producto_id>\d+)', self.delete_product),
+            ('GET', r'/productos/(?P<producto_id>\d+)/resumen', self.get_product_summary),
+            ('GET', r'/productos/(?P<producto_id>\d+)/minimo', self.get_product_threshold),
+            ('PUT', r'/productos/(?P<producto_id>\d+)/minimo', self.put_product_threshold),
+            ('GET', r'/categorias', self.get_categories),
+            ('POST', r'/categorias', self.post_category),
+            ('PUT', r'/categorias/(?P<categoria_id>\d+)', self.put_category),
+            ('DELETE', r'/categorias/(?P<categoria_id>\d+)', self.delete_category),
+            ('GET', r'/categorias/minimos', self.get_category_thresholds),
+            ('PUT', r'/categorias/(?P<categoria_id>\d+)/minimo', self.put_category_threshold),
+            ('GET', r'/movimientos', self.get_movements),
+            ('POST', r'/movimientos/lote', self.post_movement_batch),
+            ('GET', r'/resumen', self.get_summary),
+            ('GET', r'/alertas', self.get_alerts),
+            ('GET', r'/alertas/total', self.get_alert_count),
+        ]
+        self.routes = [(method, re.compile(pattern + '$'), func) for method, pattern, func in self.routes]
+
+    async def start(self):
+        db = await self.writer.open()  # crea el esquema y aplica las migraciones
+        self.fts_enabled = db.fts_enabled
+        self.tasks.append(asyncio.create_task(self.writer.run()))
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # por si se pidió el puerto 0
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Inventario disponible en http://{self.host}:{self.port} ({self.db_file})", flush=True)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for task in self.tasks:
+            task.cancel()
+        self.readers.close()
+        await self.writer.close()
+
+    # ---- HTTP ----
+    async def handle(self, reader, writer):
+        """Atiende una conexión; con HTTP/1.1 se reutiliza para varias peticiones"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': "La petición es demasiado grande"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+
+                data = json.dumps(payload, ensure_ascii=False, default=to_json).encode('utf-8')
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                        "Content-Type: application/json; charset=utf-8",
+                        f"Content-Length: {len(data)}"]
+                if not keep_alive:
+                    head.append("Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        self.requests += 1
+        url = urlsplit(target)
+        query = parse_qs(url.query, keep_blank_values=True)
+        allowed = False
+        for route_method, pattern, func in self.routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            try:
+                data = json.loads(body) if body else {}
+                if not isinstance(data, dict):
+                    raise HTTPError(400, "El cuerpo de la petición debe ser un objeto JSON")
+                args = {name: unquote(value) for name, value in match.groupdict().items()}
+                return 200, {'resultado': await func(query, data, **args)}
+            except HTTPError as e:
+                return e.status, {'error': str(e)}
+            except ValueError as e:  # validaciones de InventarioDB y JSON inválido
+                payload = {'error': str(e)}
+                if getattr(e, 'errors', None):
+                    payload['detalle'] = e.errors  # líneas rechazadas de un lote
+                return 400, payload
+            except Error as e:
+                return 500, {'error': f"Error de base de datos: {e}"}
+            except Exception as e:
+                # Un error inesperado responde 500 en lugar de cortar la conexión
+                print(f"Error en {method} {url.path}: {e!r}", file=sys.stderr)
+                return 500, {'error': f"Error interno del servidor: {e}"}
+        if allowed:
+            return 405, {'error': f"Método {method} no permitido en {url.path}"}
+        return 404, {'error': f"No existe {url.path}"}
+
+    # ---- lecturas ----
+    async def get_status(self, query, body):
+        return {
+            'version': self.writer.version,
+            'fts': self.fts_enabled,
+            'grupos': self.writer.groups,
+            'escrituras': self.writer.operations,
+            'peticiones': self.requests,
+            'activo_desde': self.started,
+        }
+
+    async def get_counters(self, query, body):
+        return await self.readers.run(InventarioDB.change_counters)
+
+    async def get_products(self, query, body):
+        return await self.readers.run(
+            InventarioDB.fetch_products_page, json_param(query, 'despues'), int_param(query, 'limite', 100),
+            int_param(query, 'desplazamiento', 0), param(query, 'inverso') == '1', param(query, 'buscar'),
+            param(query, 'orden'),
+        )
+
+    async def get_product_count(self, query, body):
+        return await self.readers.run(
+            InventarioDB.count_products, param(query, 'buscar'), int_param(query, 'producto'))
+
+    async def get_anchor_keys(self, query, body):
+        return await self.readers.run(
+            InventarioDB.product_anchor_keys, int_param(query, 'paso', 500), param(query, 'buscar'),
+            param(query, 'orden'))
+
+    async def get_keys_at(self, query, body):
+        return await self.readers.run(
+            InventarioDB.product_keys_at, json_param(query, 'posiciones') or [], param(query, 'buscar'),
+            param(query, 'orden'))
+
+    async def get_column_lengths(self, query, body):
+        return await self.readers.run(InventarioDB.product_column_lengths, param(query, 'buscar'))
+
+    async def get_search(self, query, body):
+        return await self.readers.run(
+            InventarioDB.search_product_ids, param(query, 'q', required=True), param(query, 'orden'))
+
+    async def get_search_index(self, query, body):
+        index = await self.readers.run(
+            InventarioDB.search_index, param(query, 'q', required=True), None, param(query, 'orden'))
+        textos = None
+        if index.blob is not None:
+            textos = [index.blob[index.starts[i]:index.starts[i + 1]] for i in range(len(index.ids))]
+        return {'ids': index.ids, 'tokens': index.tokens, 'textos': textos}
+
+    async def get_products_by_ids(self, query, body):
+        return await self.readers.run(InventarioDB.fetch_products_by_ids, json_param(query, 'ids') or [])
+
+    async def get_product_by_code(self, query, body, codigo):
+        return await self.readers.run(InventarioDB.product_id_by_code, codigo)
+
+    async def get_product(self, query, body, producto_id):
+        return await self.readers.run(InventarioDB.fetch_product, int(producto_id))
+
+    async def get_product_summary(self, query, body, producto_id):
+        return await self.readers.run(InventarioDB.product_summary, int(producto_id))
+
+    async def get_product_threshold(self, query, body, producto_id):
+        return await self.readers.run(InventarioDB.product_threshold, int(producto_id))
+
+    async def get_categories(self, query, body):
+        return await self.readers.run(lambda db: db.categories.items())
+
+    async def get_category_thresholds(self, query, body):
+        return await self.readers.run(InventarioDB.category_thresholds)
+
+    async def get_movements(self, query, body):
+        return await self.readers.run(
+            InventarioDB.fetch_movements_page, json_param(query, 'antes'), int_param(query, 'limite', 200),
+            param(query, 'tipo'), param(query, 'desde'), param(query, 'hasta'), int_param(query, 'producto'),
+            param(query, 'orden'),
+        )
+
+    async def get_summary(self, query, body):
+        resumen = await self.readers.run(InventarioDB.inventory_summary)
+        resumen['categorias'] = await self.readers.run(InventarioDB.category_summary)
+        return resumen
+
+    async def get_alerts(self, query, body):
+        return await self.readers.run(InventarioDB.stock_alerts)
+
+    async def get_alert_count(self, query, body):
+        return await self.readers.run(InventarioDB.alert_count)
+
+    # ---- escrituras: siempre por la cola del escritor ----
+    def product_fields(self, body):
+        return (field(body, 'codigo'), field(body, 'nombre'), field(body, 'precio', float),
+                field(body, 'stock', int), field(body, 'categoria'))
+
+    async def post_product(self, query, body):
+        return await self.writer.submit(InventarioDB.insert_product, *self.product_fields(body))
+
+    async def put_product(self, query, body, producto_id):
+        return await self.writer.submit(
+            InventarioDB.update_product, int(producto_id), *self.product_fields(body))
+
+    async def delete_product(self, query, body, producto_id):
+        return await self.writer.submit(InventarioDB.delete_product, int(producto_id))
+
+    async def put_product_threshold(self, query, body, producto_id):
+        # minimo puede ser null: el producto pasa a usar el de su categoría
+        return await self.writer.submit(InventarioDB.set_product_threshold, int(producto_id), body.get('minimo'))
+
+    async def post_category(self, query, body):
+        return await self.writer.submit(InventarioDB.insert_category, field(body, 'nombre'))
+
+    async def put_category(self, query, body, categoria_id):
+        return await self.writer.submit(InventarioDB.update_category, int(categoria_id), field(body, 'nombre'))
+
+    async def delete_category(self, query, body, categoria_id):
+        return await self.writer.submit(InventarioDB.delete_category, int(categoria_id))
+
+    async def put_category_threshold(self, query, body, categoria_id):
+        return await self.writer.submit(InventarioDB.set_category_threshold, int(categoria_id), body.get('minimo'))
+
+    async def post_movement_batch(self, query, body):
+        lineas = body.get('lineas')
+        if not isinstance(lineas, list) or not all(isinstance(l, list) and len(l) == 3 for l in lineas):
+            raise HTTPError(400, "lineas debe ser una lista de [codigo, tipo, cantidad]")
+        numeros = body.get('numeros')
+        if numeros is not None and (not isinstance(numeros, list) or len(numeros) != len(lineas)):
+            raise HTTPError(400, "numeros debe tener un número de línea por movimiento")
+        rechazadas = [tuple(error) for error in body.get('rechazadas') or []]
+        stock = await self.writer.submit(
+            InventarioDB.apply_movements, [tuple(l) for l in lineas], numeros, rechazadas)
+        return {str(producto_id): actual for producto_id, actual in stock.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="servidor.py", description="Servidor HTTP/JSON del inventario")
+    parser.add_argument("--db", default=DB_FILE, help=f"archivo de la base de datos (por defecto {DB_FILE})")
+    parser.add_argument("--host", default=SERVER_HOST,
+                        help=f"dirección en la que escucha (por defecto {SERVER_HOST}; 0.0.0.0 para la red)")
+    parser.add_argument("--puerto", type=int, default=SERVER_PORT, help=f"por defecto {SERVER_PORT}")
+    parser.add_argument("--lectores", type=int, default=READERS, help="hilos de lectura")
+    args = parser.parse_args(argv)
+
+    server = InventarioServer(args.db, args.host, args.puerto, args.lectores)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    except (OSError, Error) as e:
+        print(f"No se pudo iniciar el servidor: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
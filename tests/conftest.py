@@ -0,0 +1,30 @@
+"""Fixtures comunes: cada prueba trabaja con una base nueva en una carpeta temporal"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventario_core import InventarioDB  # noqa: E402
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'inventario.db')
+
+
+@pytest.fixture
+def db(db_file):
+    db = InventarioDB(db_file)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def stocked(db):
+    """Base con una categoría y dos productos"""
+    db.insert_category('Tornillos')
+    db.insert_product('P-001', 'Tornillo 3mm', 0.5, 10, 'Tornillos')
+    db.insert_product('P-002', 'Tornillo 5mm', 0.8, 4, 'Tornillos')
+    return db
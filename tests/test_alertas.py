@@ -0,0 +1,112 @@
+import pytest
+
+
+def alerts(db):
+    """{código: (stock, mínimo)} de alertas_stock"""
+    return {row[1]: (row[4], row[5]) for row in db.stock_alerts()}
+
+
+def below_own_minimum(db):
+    """Códigos en el índice parcial: productos bajo su mínimo propio"""
+    return sorted(row[0] for row in db.query(
+        "SELECT codigo FROM productos INDEXED BY idx_productos_bajo_minimo WHERE stock < stock_minimo"))
+
+
+def check(db):
+    """Las alertas mantenidas por los triggers coinciden con la vista calculada desde las tablas"""
+    kept = db.query("SELECT producto_id, stock, minimo FROM alertas_stock ORDER BY producto_id")
+    computed = db.query("SELECT producto_id, stock, minimo FROM productos_bajo_minimo ORDER BY producto_id")
+    assert kept == computed
+
+
+@pytest.fixture
+def shop(stocked):
+    """P-001 con 10 y P-002 con 4 unidades, en Tornillos; PB-1 con 3 en Pinturas"""
+    stocked.insert_category('Pinturas')
+    stocked.insert_product('PB-1', 'Pintura blanca', 12.5, 3, 'Pinturas')
+    return stocked
+
+
+def test_product_threshold_enters_and_leaves_the_index(shop):
+    producto_id = shop.product_id_by_code('P-002')
+    assert alerts(shop) == {}
+    shop.set_product_threshold(producto_id, 5)
+    assert alerts(shop) == {'P-002': (4, 5)}
+    assert below_own_minimum(shop) == ['P-002']
+    check(shop)
+
+    shop.apply_movements([('P-002', 'entrada', 1)])  # llega justo al mínimo
+    assert alerts(shop) == {}
+    assert below_own_minimum(shop) == []
+    check(shop)
+
+    shop.apply_movements([('P-002', 'salida', 3)])
+    assert alerts(shop) == {'P-002': (2, 5)}
+    shop.set_product_threshold(producto_id, None)
+    assert alerts(shop) == {}
+    assert below_own_minimum(shop) == []
+    check(shop)
+
+
+def test_category_threshold_applies_to_products_without_their_own(shop):
+    tornillos = shop.categories.id('Tornillos')
+    shop.set_category_threshold(tornillos, 6)
+    assert alerts(shop) == {'P-002': (4, 6)}
+    # El mínimo propio manda sobre el de la categoría, en los dos sentidos
+    shop.set_product_threshold(shop.product_id_by_code('P-002'), 2)
+    shop.set_product_threshold(shop.product_id_by_code('P-001'), 12)
+    assert alerts(shop) == {'P-001': (10, 12)}
+    check(shop)
+
+    shop.set_product_threshold(shop.product_id_by_code('P-002'), None)
+    shop.set_category_threshold(tornillos, 5)
+    assert alerts(shop) == {'P-001': (10, 12), 'P-002': (4, 5)}
+    shop.set_category_threshold(tornillos, None)
+    assert alerts(shop) == {'P-001': (10, 12)}
+    check(shop)
+
+
+def test_moving_and_deleting_products(shop):
+    shop.set_category_threshold(shop.categories.id('Pinturas'), 4)
+    assert alerts(shop) == {'PB-1': (3, 4)}
+
+    # Cambiar de categoría cambia el mínimo que se aplica
+    producto_id = shop.product_id_by_code('P-002')
+    shop.update_product(producto_id, 'P-002', 'Tornillo 5mm', 0.8, 4, 'Pinturas')
+    assert alerts(shop) == {'PB-1': (3, 4)}
+    shop.update_product(producto_id, 'P-002', 'Tornillo 5mm', 0.8, 3, 'Pinturas')
+    assert alerts(shop) == {'PB-1': (3, 4), 'P-002': (3, 4)}
+    check(shop)
+
+    shop.delete_product(shop.product_id_by_code('PB-1'))
+    assert alerts(shop) == {'P-002': (3, 4)}
+    # Sin categoría ya no hay mínimo
+    shop.delete_category(shop.categories.id('Pinturas'))
+    assert alerts(shop) == {}
+    check(shop)
+
+
+def test_alert_keeps_the_date_it_started(shop):
+    producto_id = shop.product_id_by_code('P-002')
+    shop.set_product_threshold(producto_id, 5)
+    shop.execute("UPDATE alertas_stock SET desde = '2023-01-01 00:00:00'")
+    shop.conn.commit()
+    shop.apply_movements([('P-002', 'salida', 1)])
+    [alert] = shop.stock_alerts()
+    assert alert[4:] == (3, 5, 2, '2023-01-01 00:00:00')
+
+
+def test_rebuild_matches_the_triggers(shop):
+    shop.set_category_threshold(shop.categories.id('Tornillos'), 5)
+    shop.set_product_threshold(shop.product_id_by_code('PB-1'), 10)
+    before = shop.query("SELECT producto_id, stock, minimo FROM alertas_stock ORDER BY producto_id")
+    shop.execute("DELETE FROM alertas_stock")
+    shop.conn.commit()
+    shop.rebuild_summaries()
+    assert shop.query("SELECT producto_id, stock, minimo FROM alertas_stock ORDER BY producto_id") == before
+
+
+@pytest.mark.parametrize('minimo', [-1, 2.5, True, '3'])
+def test_invalid_threshold(shop, minimo):
+    with pytest.raises(ValueError):
+        shop.set_product_threshold(shop.product_id_by_code('P-001'), minimo)
@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+from inventario_core import (
+    InventarioDB, MOVEMENT_SORT, MOVEMENT_SORTS, archive_movements, archive_path, sort_key,
+)
+
+
+def add_history(db, producto_id, months):
+    """Una entrada de 1 unidad el día 10 de cada mes de 2023"""
+    with db.transaction():
+        db.executemany(
+            "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, 'entrada', 1, ?)",
+            [(producto_id, f"2023-{month:02d}-10 12:00:00") for month in range(1, months + 1)],
+        )
+
+
+def all_pages(db, limit, **filters):
+    key = sort_key(None, MOVEMENT_SORTS, MOVEMENT_SORT)
+    rows, before = [], None
+    while True:
+        page = db.fetch_movements_page(before, limit, **filters)
+        rows += page
+        if len(page) < limit:
+            return rows
+        before = key(page[-1])
+
+
+def archived_count(db_file, producto_id=None):
+    conn = sqlite3.connect(archive_path(db_file))
+    try:
+        sql = "SELECT COUNT(*) FROM movimientos"
+        if producto_id is None:
+            return conn.execute(sql).fetchone()[0]
+        return conn.execute(sql + " WHERE producto_id = ?", (producto_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_archive_moves_old_movements(stocked, db_file):
+    producto_id = stocked.product_id_by_code('P-001')
+    add_history(stocked, producto_id, 12)
+    antes = all_pages(stocked, 1000)
+
+    result = archive_movements(stocked, '2023-07-01', batch=4)
+    assert result['movimientos'] == 6
+    assert not result['cancelado']
+    assert stocked.archive_cutoff() == '2023-07-01'
+    assert stocked.query_one("SELECT COUNT(*) FROM movimientos WHERE fecha < '2023-07-01'")[0] == 0
+    assert archived_count(db_file) == 6
+
+    # Los totales mensuales incluyen lo archivado
+    meses = {mes: cantidad for mes, tipo, _, cantidad in stocked.monthly_movements(producto_id)
+             if mes.startswith('2023')}
+    assert meses == {f"2023-{month:02d}": 1 for month in range(1, 13)}
+    # Archivar no cambia lo que se ve en el historial
+    assert all_pages(stocked, 1000) == antes
+
+
+@pytest.mark.parametrize('limit', [1, 3, 5, 200])
+def test_paging_crosses_into_the_archive(stocked, limit):
+    producto_id = stocked.product_id_by_code('P-002')
+    add_history(stocked, producto_id, 12)
+    expected = all_pages(stocked, 1000)
+    archive_movements(stocked, '2023-07-01')
+
+    rows = all_pages(stocked, limit)
+    assert rows == expected
+    assert len({row[0] for row in rows}) == len(rows)
+
+    filtered = all_pages(stocked, limit, producto_id=producto_id)
+    assert [row for row in expected if row[1] == 'Tornillo 5mm'] == filtered
+
+
+def test_archive_rejects_bad_date(stocked):
+    with pytest.raises(ValueError):
+        archive_movements(stocked, '01/07/2023')
+
+
+def test_delete_removes_archived_movements(stocked, db_file):
+    producto_id = stocked.product_id_by_code('P-001')
+    add_history(stocked, producto_id, 6)
+    archive_movements(stocked, '2023-07-01')
+    stocked.delete_product(producto_id)
+    assert archived_count(db_file, producto_id) == 0
+
+
+def test_delete_in_group_after_archive_created_elsewhere(stocked, db_file):
+    """El escritor del servidor se abrió antes de que existiera el archivo"""
+    producto_id = stocked.product_id_by_code('P-001')
+    add_history(stocked, producto_id, 6)
+    other = InventarioDB(db_file)
+    try:
+        archive_movements(other, '2023-07-01')
+    finally:
+        other.close()
+    assert not stocked.archive_attached
+
+    # Dentro de la transacción del grupo no se puede adjuntar: se rechaza
+    with stocked.group_commit():
+        with pytest.raises(ValueError, match="archivo del historial"):
+            stocked.delete_product(producto_id)
+    assert archived_count(db_file, producto_id) == 6
+
+    # Adjuntado antes del grupo (como hace el escritor del servidor) se borra todo
+    assert stocked.attach_archive()
+    with stocked.group_commit():
+        stocked.delete_product(producto_id)
+    assert archived_count(db_file, producto_id) == 0
+    assert stocked.fetch_product(producto_id) is None
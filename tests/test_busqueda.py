@@ -0,0 +1,166 @@
+import pytest
+
+import inventario_core
+from inventario_core import InventarioDB, search_tokens
+
+
+@pytest.fixture
+def catalog(db):
+    db.insert_category('Tornillos')
+    db.insert_category('Pinturas')
+    db.insert_category('Herramientas')
+    db.insert_product('T-3', 'Tornillo 3mm', 0.5, 10, 'Tornillos')
+    db.insert_product('T-5', 'Tornillo 5mm', 0.8, 4, 'Tornillos')
+    db.insert_product('PB-1', 'Pintura blanca "mate"', 12.0, 3, 'Pinturas')
+    db.insert_product('AX', 'Llave ajustable', 9.0, 1, 'Herramientas')
+    return db
+
+
+def codes(db, ids):
+    return sorted(db.fetch_product(producto_id)[1] for producto_id in ids)
+
+
+@pytest.fixture(params=[True, False], ids=['fts', 'like'])
+def both(request, catalog):
+    """La misma base con el índice FTS5 y con la búsqueda LIKE de respaldo"""
+    if not request.param:
+        catalog.fts_enabled = False
+    elif not catalog.fts_enabled:
+        pytest.skip("SQLite sin FTS5 trigram")
+    return catalog
+
+
+@pytest.mark.parametrize('search, expected', [
+    ('tornillo', ['T-3', 'T-5']),
+    ('TORNILLO 5mm', ['T-5']),
+    ('orni', ['T-3', 'T-5']),      # subcadena, no solo prefijo
+    ('pinturas', ['PB-1']),        # por categoría
+    ('nada', []),
+])
+def test_match(both, search, expected):
+    assert codes(both, both.search_product_ids(search)) == expected
+    assert both.count_products(search) == len(expected)
+
+
+def test_short_tokens_use_like(catalog):
+    # 'ax' y '5' no caben en un trigrama
+    assert codes(catalog, catalog.search_product_ids('ax')) == ['AX']
+    assert codes(catalog, catalog.search_product_ids('tornillo 5')) == ['T-5']
+    assert catalog.count_products('ax') == 1
+
+
+@pytest.mark.parametrize('search', ['"mate"', 'mate"', '"', 'AND', 'bla* OR', "o'"])
+def test_quotes_and_operators_are_plain_text(catalog, search):
+    ids = catalog.search_product_ids(search)
+    assert catalog.count_products(search) == len(ids)
+    index = catalog.search_index(search)
+    assert list(index.ids) == list(ids)
+
+
+def test_quoted_text_matches(catalog):
+    assert codes(catalog, catalog.search_product_ids('"mate"')) == ['PB-1']
+
+
+@pytest.mark.parametrize('search', ['', '  ', '\t '])
+def test_blank_search_returns_everything(both, search):
+    todos = both.count_products()
+    assert both.count_products(search) == todos == 4
+    assert len(both.search_product_ids(search)) == todos
+    assert len(both.search_product_ids(search, sort='precio')) == todos
+    assert len(both.search_index(search).ids) == todos
+    assert len(both.fetch_products_page(search=search)) == todos
+
+
+def test_index_narrows_in_memory(catalog):
+    index = catalog.search_index('torn')
+    narrowed = index.narrow('tornillo 5mm', ['tornillo', '5mm'])
+    assert codes(catalog, narrowed.ids) == ['T-5']
+
+
+def test_search_after_rename_uses_new_category(catalog, db_file):
+    catalog.update_category(catalog.categories.id('Pinturas'), 'Esmaltes')
+    other = InventarioDB(db_file, setup=False)
+    try:
+        assert codes(other, other.search_product_ids('esmaltes')) == ['PB-1']
+    finally:
+        other.close()
+
+
+def test_change_stamp_is_shared_between_connections(catalog, db_file):
+    other = InventarioDB(db_file, setup=False)
+    try:
+        stamp = catalog.change_stamp()
+        assert other.change_stamp() == stamp
+        other.update_product(other.product_id_by_code('AX'), 'AX', 'Llave inglesa', 9.0, 1, 'Herramientas')
+        # El cambio de otra conexión invalida el índice guardado en esta
+        assert catalog.change_stamp() != stamp
+        stamp = catalog.change_stamp()
+        catalog.apply_movements([('T-3', 'salida', 1)])
+        assert other.change_stamp() != stamp
+    finally:
+        other.close()
+
+
+def test_narrowing_matches_a_new_query(catalog):
+    index = catalog.search_index('tor', catalog.change_stamp())
+    for search in ('torn', 'tornillo', 'tornillo 3mm'):
+        tokens = search.split()
+        assert index.covers(tokens)
+        index = index.narrow(search, tokens)
+        assert list(index.ids) == list(catalog.search_product_ids(search))
+    assert not index.covers(['pintura'])
+
+
+@pytest.fixture(params=[True, False], ids=['fts', 'like'])
+def hardware(request, db):
+    """120 productos en tres categorías, con la búsqueda FTS5 o LIKE"""
+    for categoria in ('Tornillos', 'Tuercas', 'Arandelas'):
+        db.insert_category(categoria)
+    categorias = {nombre: id_ for id_, nombre in db.categories.items()}
+    words = [('Tornillo', 'Tornillos'), ('Tuerca', 'Tuercas'), ('Arandela', 'Arandelas')]
+    with db.transaction():
+        db.executemany(
+            "INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, ?)",
+            [(f"H-{n:03d}", f"{words[n % 3][0]} {n} {('acero', 'bronce')[n % 2]}", float(n % 13), n,
+              categorias[words[n % 3][1]]) for n in range(120)],
+        )
+    if not request.param:
+        db.fts_enabled = False
+    elif not db.fts_enabled:
+        pytest.skip("SQLite sin FTS5 trigram")
+    return db
+
+
+TYPING = ['t', 'to', 'tor', 'torn', 'tornillo', 'tornillo 1', 'tornillo 10', 'tornillo 10 ac',
+          'tornillo 10 acero']
+
+
+@pytest.mark.parametrize('sort', [None, '-precio'])
+def test_typing_narrows_like_a_new_query(hardware, sort):
+    db = hardware
+    index = db.search_index(TYPING[0], db.change_stamp(), sort)
+    narrowed = 0
+    for search in TYPING[1:]:
+        tokens = search_tokens(search, db.fts_enabled)
+        if not index.covers(tokens):
+            index = db.search_index(search, db.change_stamp(), sort)
+            continue
+        parent = {producto_id: n for n, producto_id in enumerate(index.ids)}
+        index = index.narrow(search, tokens)
+        narrowed += 1
+        expected = list(db.search_product_ids(search, sort=sort))
+        assert sorted(index.ids) == sorted(expected)
+        # Refinar conserva el orden del resultado anterior (relevancia u orden de la lista)
+        assert [parent[producto_id] for producto_id in index.ids] == sorted(parent[i] for i in index.ids)
+        if sort:
+            assert list(index.ids) == expected
+    assert narrowed >= len(TYPING) - 2
+
+
+def test_large_results_are_not_kept_in_memory(hardware, monkeypatch):
+    monkeypatch.setattr(inventario_core, 'SEARCH_TEXT_MAX', 10)
+    index = hardware.search_index('tornillo', hardware.change_stamp())
+    assert len(index.ids) == 40
+    assert index.blob is None
+    # Sin el texto no se puede refinar: la búsqueda siguiente va a la base
+    assert not index.covers(search_tokens('tornillo 1', hardware.fts_enabled))
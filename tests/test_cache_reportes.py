@@ -0,0 +1,77 @@
+import os
+
+from cache_reportes import ReportCache, cached_report
+from inventario_core import export_products_csv
+
+
+def export(db, cache, path, search=None):
+    calls = []
+
+    def build(file_path):
+        calls.append(file_path)
+        return export_products_csv(db, file_path, search)
+
+    result, cached = cached_report(cache, db, 'csv', {'buscar': search, 'gzip': False}, str(path), build)
+    return result, cached, len(calls)
+
+
+def test_second_export_is_copied(stocked, tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'))
+    assert export(stocked, cache, tmp_path / 'a.csv') == (2, False, 1)
+    assert export(stocked, cache, tmp_path / 'b.csv') == (2, True, 0)
+    assert (tmp_path / 'a.csv').read_bytes() == (tmp_path / 'b.csv').read_bytes()
+    # Otra búsqueda es otro reporte
+    assert export(stocked, cache, tmp_path / 'c.csv', search='5mm')[1] is False
+
+
+def test_changes_invalidate(stocked, tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'))
+    export(stocked, cache, tmp_path / 'a.csv')
+    stocked.apply_movements([('P-001', 'salida', 1)])
+    assert export(stocked, cache, tmp_path / 'b.csv')[1] is False
+    categoria_id = stocked.categories.id('Tornillos')
+    stocked.update_category(categoria_id, 'Tuercas')
+    assert export(stocked, cache, tmp_path / 'c.csv')[1] is False
+    assert b'Tuercas' in (tmp_path / 'c.csv').read_bytes()
+
+
+def test_refresh_and_no_cache(stocked, tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'))
+    export(stocked, cache, tmp_path / 'a.csv')
+    result = cached_report(cache, stocked, 'csv', {'buscar': None, 'gzip': False}, str(tmp_path / 'b.csv'),
+                           lambda path: export_products_csv(stocked, path), refresh=True)
+    assert result == (2, False)
+    assert cached_report(None, stocked, 'csv', {}, str(tmp_path / 'c.csv'),
+                         lambda path: export_products_csv(stocked, path)) == (2, False)
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ReportCache(str(tmp_path / 'cache'), max_bytes=250)
+    for n, name in enumerate(['a', 'b', 'c']):
+        source = tmp_path / f'{name}.csv'
+        source.write_bytes(b'x' * 100)
+        cache.put(name, '.csv', str(source), n)
+        os.utime(os.path.join(cache.folder, name + '.csv'), (n, n))
+    remaining = sorted(os.path.basename(paths[0]) for _, _, paths in cache.entries())
+    assert remaining == ['b.csv', 'c.csv']
+    assert cache.get('a', '.csv', str(tmp_path / 'out.csv')) is None
+    assert cache.get('b', '.csv', str(tmp_path / 'out.csv')) == 1
+
+
+def test_cache_write_failure_still_delivers_the_report(stocked, tmp_path, capsys):
+    blocked = tmp_path / 'cache'
+    blocked.write_text('no es una carpeta')  # la caché no se puede crear
+    cache = ReportCache(str(blocked))
+    warnings = []
+    result = cached_report(cache, stocked, 'csv', {'buscar': None, 'gzip': False}, str(tmp_path / 'a.csv'),
+                           lambda path: export_products_csv(stocked, path), warn=warnings.append)
+    assert result == (2, False)
+    assert (tmp_path / 'a.csv').exists()
+    assert len(warnings) == 1 and 'caché' in warnings[0]
+
+    # Sin ``warn`` el aviso va a stderr, nunca a la salida del reporte
+    cached_report(cache, stocked, 'csv', {'buscar': None, 'gzip': False}, str(tmp_path / 'b.csv'),
+                  lambda path: export_products_csv(stocked, path))
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert 'caché' in err
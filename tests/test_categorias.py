@@ -0,0 +1,48 @@
+from inventario_core import InventarioDB
+
+
+def test_own_changes_update_the_cache(db):
+    a = db.insert_category('Tornillos')[0]
+    b = db.insert_category('Clavos')[0]
+    db.update_category(a, 'Tuercas')
+    db.delete_category(b)
+    assert db.categories.items() == [(a, 'Tuercas')]
+    assert db.categories.id('Tornillos') is None
+
+
+def test_changes_from_another_connection(db, db_file):
+    a = db.insert_category('Tornillos')[0]
+    assert db.categories.names() == ['Tornillos']
+    other = InventarioDB(db_file)
+    try:
+        other.update_category(a, 'Tuercas')
+    finally:
+        other.close()
+    assert db.categories.names() == ['Tuercas']
+
+
+def test_remote_change_just_before_own_write_is_not_lost(db, db_file):
+    """La escritura propia no adopta como vigente un cambio ajeno sin recargar"""
+    a = db.insert_category('Tornillos')[0]
+    b = db.insert_category('Clavos')[0]
+    assert db.categories.names() == ['Clavos', 'Tornillos']
+    other = InventarioDB(db_file)
+    try:
+        other.update_category(a, 'Tuercas')
+    finally:
+        other.close()
+    # delete_category no consulta el caché antes de escribir
+    db.delete_category(b)
+    assert db.categories.names() == ['Tuercas']
+    assert db.categories.id('Tuercas') == a
+
+
+def test_import_creates_categories_in_cache(db, tmp_path):
+    from inventario_core import import_products
+
+    path = tmp_path / 'productos.csv'
+    path.write_text("codigo,nombre,precio,stock,categoria\nP-1,Uno,1,1,Nueva\nP-2,Dos,1,1,Otra\n",
+                    encoding='utf-8')
+    report = import_products(db, str(path))
+    assert report.categories_created == 2
+    assert db.categories.names() == ['Nueva', 'Otra']
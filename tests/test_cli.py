@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def run(stocked, db_file, capsys):
+    """Ejecuta ``cli.main`` sobre la base de ``stocked`` y devuelve (código, stdout, stderr)"""
+    def run(*argv):
+        code = cli.main(['--db', db_file, *argv])
+        out, err = capsys.readouterr()
+        return code, out, err
+    return run
+
+
+def test_starts_without_tk_or_fpdf():
+    code = ("import sys, cli; "
+            "print(sorted(m for m in ('tkinter', 'fpdf', 'proyecto', 'reportes') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(cli.__file__)), check=True)
+    assert result.stdout.strip() == '[]'
+
+
+def test_stock(run):
+    code, out, _ = run('stock', '--formato', 'csv')
+    assert code == 0
+    assert out.splitlines()[1:] == ['P-001,Tornillo 3mm,0.5,10,Tornillos', 'P-002,Tornillo 5mm,0.8,4,Tornillos']
+    code, out, _ = run('stock', '--maximo', '5')
+    assert [line.split('\t')[0] for line in out.splitlines()[1:]] == ['P-002']
+    code, out, err = run('stock', 'P-002', 'NO-EXISTE')
+    assert code == 1
+    assert 'NO-EXISTE' in err
+
+
+def test_import_export_round_trip(run, tmp_path):
+    source = tmp_path / 'nuevos.csv'
+    source.write_text("codigo,nombre,precio,stock,categoria\nP-003,Tuerca,0.2,7,Tuercas\n", encoding='utf-8')
+    code, out, _ = run('importar', str(source))
+    assert code == 0
+
+    target = tmp_path / 'exportados.csv'
+    code, out, _ = run('exportar', str(target), '--orden=-stock')
+    assert code == 0
+    assert out.startswith('3 productos exportados')
+    lines = target.read_text(encoding='utf-8').splitlines()
+    assert [line.split(',')[0] for line in lines[1:]] == ['P-001', 'P-003', 'P-002']
+    # Sin cambios en la base el segundo se copia de la caché
+    code, out, _ = run('exportar', str(tmp_path / 'otra.csv'), '--orden=-stock')
+    assert cli.CACHED_NOTE in out
+
+
+def test_movements_and_summary(run, tmp_path):
+    sheet = tmp_path / 'despacho.csv'
+    sheet.write_text("codigo,cantidad\nP-001,3\nP-002,9\n", encoding='utf-8')
+    code, _, err = run('movimientos', str(sheet), '--tipo', 'salida')
+    assert code == 1  # P-002 no tiene 9 unidades: no se aplica nada
+    assert 'línea 3' in err
+
+    sheet.write_text("codigo,cantidad\nP-001,3\nP-002,4\n", encoding='utf-8')
+    assert run('movimientos', str(sheet), '--tipo', 'salida')[0] == 0
+    code, out, _ = run('resumen')
+    assert code == 0
+    assert 'Unidades en stock: 7' in out
+    assert 'Salidas: 7 unidades en 2 movimientos' in out
+
+
+def test_thresholds_and_reorder(run):
+    assert run('minimo', '5', '--categoria', 'Tornillos')[1].strip() == '1 productos por reponer'
+    code, out, _ = run('reponer', '--formato', 'csv')
+    assert [line.split(',')[0] for line in out.splitlines()[1:]] == ['P-002']
+    code, _, err = run('minimo', '5', '--producto', 'NO-EXISTE')
+    assert code == 1
+    code, _, err = run('minimo', '-3', '--producto', 'P-001')
+    assert code == 2
+    assert err.startswith('Error:')
+
+
+def test_unusable_database(tmp_path, capsys):
+    assert cli.main(['--db', str(tmp_path / 'no' / 'existe.db'), 'resumen']) == 2
+    assert 'No se pudo abrir' in capsys.readouterr().err
+
+
+def test_months_ago():
+    assert cli.months_ago(0, date(2024, 3, 15)) == '2024-03-01'
+    assert cli.months_ago(12, date(2024, 3, 15)) == '2023-03-01'
+    assert cli.months_ago(3, date(2024, 2, 1)) == '2023-11-01'
@@ -0,0 +1,110 @@
+"""QueryExecutor sin ventana: ``root.after`` solo guarda el sondeo y la prueba lo llama"""
+import threading
+import time
+
+import pytest
+
+from inventario_core import InventarioDB
+from proyecto import QueryExecutor
+
+
+class Root:
+    def __init__(self):
+        self.poll = None
+
+    def after(self, ms, func):
+        self.poll = func
+        return 'after'
+
+    def after_cancel(self, ident):
+        self.poll = None
+
+
+@pytest.fixture
+def executor(stocked, db_file):
+    root = Root()
+    # Como en la aplicación, los tiempos se acumulan en la conexión de la ventana
+    executor = QueryExecutor(root, lambda: InventarioDB(db_file, setup=False), workers=2, stats=stocked)
+    yield executor
+    executor.shutdown()
+    for thread in executor.threads:
+        thread.join(5)
+
+
+def wait(executor, timeout=5):
+    """Hace de bucle de Tk hasta que no queden tareas pendientes"""
+    deadline = time.monotonic() + timeout
+    while executor.pending:
+        assert time.monotonic() < deadline, "la tarea no terminó"
+        executor.root.poll()
+        time.sleep(0.005)
+
+
+def test_result_is_delivered_on_the_tk_thread(executor):
+    calls, tk_thread = [], threading.get_ident()
+
+    def count(db, task):
+        calls.append(('hilo', threading.get_ident()))
+        return db.count_products()
+
+    executor.submit('contar', count, on_done=lambda n: calls.append(('listo', threading.get_ident(), n)),
+                    name='contar')
+    wait(executor)
+    assert calls[0][1] != tk_thread
+    assert calls[1] == ('listo', tk_thread, 2)
+    # Latencia total y tiempo de la consulta
+    assert {'contar', 'contar (consulta)'} <= set(executor.stats.stats)
+
+
+def test_errors_and_progress(executor):
+    steps, errors = [], []
+
+    def work(db, task):
+        for n in range(3):
+            task.progress(n + 1, 3)
+        raise ValueError("falló")
+
+    executor.submit(None, work, on_error=errors.append, on_progress=lambda done, total: steps.append(done))
+    wait(executor)
+    assert steps == [1, 2, 3]
+    assert [str(e) for e in errors] == ["falló"]
+
+
+def test_a_newer_task_with_the_same_key_replaces_the_older(executor):
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow(db, task):
+        started.set()
+        release.wait(5)
+        return 'vieja'
+
+    executor.submit('buscar', slow, on_done=results.append)
+    assert started.wait(5)
+    executor.submit('buscar', lambda db, task: 'nueva', on_done=results.append)
+    release.set()
+    wait(executor)
+    assert results == ['nueva']
+
+
+def test_cancel_interrupts_a_running_query(executor):
+    started = threading.Event()
+    errors, results = [], []
+
+    def endless(db, task):
+        started.set()
+        # Consulta que no termina sola: solo la corta interrupt()
+        return db.query_one("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+                            "SELECT COUNT(*) FROM n")
+
+    task = executor.submit('reporte', endless, on_done=results.append, on_error=errors.append)
+    assert started.wait(5)
+    time.sleep(0.05)
+    executor.cancel('reporte')
+    wait(executor)
+    assert task.cancelled
+    # Cancelada no se informa nada y el hilo sigue disponible para otras tareas
+    assert results == [] and errors == []
+    executor.submit(None, lambda db, task: db.count_products(), on_done=results.append)
+    wait(executor)
+    assert results == [2]
@@ -0,0 +1,76 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+from inventario_core import PRODUCT_HEADERS, export_products_csv
+
+
+@pytest.fixture
+def catalog(stocked):
+    """Los dos productos de ``stocked`` y 23 más"""
+    for n in range(23):
+        stocked.insert_product(f"T-{n:02d}", f"Tuerca {n:02d}", 0.1, n, 'Tornillos')
+    return stocked
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """Carpeta de exportación aparte de la base de datos"""
+    path = tmp_path / 'exportar'
+    path.mkdir()
+    return path
+
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data)))
+
+
+def test_export_writes_every_row_in_batches(catalog, folder):
+    path = folder / 'productos.csv'
+    calls = []
+    written = export_products_csv(catalog, str(path), batch=10,
+                                  progress=lambda done, total: calls.append((done, total)))
+    assert written == 25
+    assert calls == [(10, 25), (20, 25), (25, 25)]
+    rows = read_csv(path.read_text(encoding='utf-8'))
+    assert rows[0] == PRODUCT_HEADERS
+    assert len(rows) == 26
+    assert not (folder / 'productos.csv.part').exists()
+
+
+def test_export_compressed_with_search(catalog, folder):
+    path = folder / 'productos.csv.gz'
+    assert export_products_csv(catalog, str(path), search='3mm') == 1
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+        rows = read_csv(file.read())
+    assert [row[0] for row in rows[1:]] == ['P-001']
+
+
+@pytest.mark.parametrize('after_batches', [0, 1, 3])
+def test_cancel_leaves_no_file(catalog, folder, after_batches):
+    path = folder / 'productos.csv'
+    batches = []
+    result = export_products_csv(catalog, str(path), batch=10,
+                                 progress=lambda done, total: batches.append(done),
+                                 cancelled=lambda: len(batches) >= after_batches)
+    assert result is None
+    assert list(folder.iterdir()) == []
+
+
+def test_cancel_keeps_the_previous_export(catalog, folder):
+    path = folder / 'productos.csv'
+    path.write_text('exportación anterior', encoding='utf-8')
+    assert export_products_csv(catalog, str(path), batch=10, cancelled=lambda: True) is None
+    assert path.read_text(encoding='utf-8') == 'exportación anterior'
+    assert not (folder / 'productos.csv.part').exists()
+
+
+def test_error_removes_the_part_file(catalog, folder):
+    def progress(done, total):
+        raise OSError("disco lleno")
+
+    with pytest.raises(OSError):
+        export_products_csv(catalog, str(folder / 'productos.csv.gz'), batch=10, progress=progress)
+    assert list(folder.iterdir()) == []
@@ -0,0 +1,78 @@
+import pytest
+
+from inventario_core import MOVEMENT_SORT, MOVEMENT_SORTS, archive_movements, sort_key
+
+
+@pytest.fixture
+def history(stocked):
+    """Entradas y salidas de los dos productos durante 2023, varias por día"""
+    ids = [stocked.product_id_by_code(codigo) for codigo in ('P-001', 'P-002')]
+    rows = []
+    for month in range(1, 13):
+        for day in (1, 15, 28):
+            for n, producto_id in enumerate(ids):
+                tipo = 'entrada' if (month + n) % 2 else 'salida'
+                # Dos productos a la misma hora: el rowid decide el orden
+                rows.append((producto_id, tipo, 1, f"2023-{month:02d}-{day:02d} 09:00:00"))
+    with stocked.transaction():
+        stocked.executemany(
+            "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, ?, ?, ?)", rows)
+    return stocked
+
+
+def all_pages(db, limit, sort=None, **filters):
+    key = sort_key(sort, MOVEMENT_SORTS, MOVEMENT_SORT)
+    rows, before = [], None
+    while True:
+        page = db.fetch_movements_page(before, limit, sort=sort, **filters)
+        rows += page
+        if len(page) < limit:
+            return rows
+        before = key(page[-1])
+
+
+def expected(rows, desde=None, hasta=None, tipo=None):
+    """Filtro hecho en Python sobre el historial completo"""
+    return [row for row in rows
+            if (not desde or row[4][:10] >= desde) and (not hasta or row[4][:10] <= hasta)
+            and (tipo is None or row[2] == tipo)]
+
+
+FILTERS = [
+    {},
+    {'desde': '2023-03-15'},
+    {'hasta': '2023-06-28'},
+    {'desde': '2023-05-01', 'hasta': '2023-08-15'},
+    {'desde': '2023-06-28', 'hasta': '2023-07-01', 'tipo': 'salida'},
+    {'desde': '2024-01-01'},
+]
+
+
+@pytest.mark.parametrize('limit', [1, 4, 7, 1000])
+@pytest.mark.parametrize('filters', FILTERS)
+def test_date_filters_page_without_gaps(history, filters, limit):
+    full = all_pages(history, 1000)
+    rows = all_pages(history, limit, **filters)
+    assert rows == expected(full, **filters)
+    assert len({row[0] for row in rows}) == len(rows)
+
+
+@pytest.mark.parametrize('sort', ['-fecha', 'fecha', 'tipo', '-tipo'])
+@pytest.mark.parametrize('filters', FILTERS)
+def test_filters_across_the_archive_cutoff(history, filters, sort):
+    before = all_pages(history, 1000, sort=sort, **filters)
+    archive_movements(history, '2023-07-01')
+    assert history.archive_cutoff() == '2023-07-01'
+
+    # La misma lista, página por página, aunque la mitad esté en el archivo
+    for limit in (1, 5, 1000):
+        assert all_pages(history, limit, sort=sort, **filters) == before
+
+
+def test_product_filter_across_the_cutoff(history):
+    producto_id = history.product_id_by_code('P-002')
+    before = all_pages(history, 1000, producto_id=producto_id, desde='2023-04-01')
+    archive_movements(history, '2023-07-01')
+    rows = all_pages(history, 3, producto_id=producto_id, desde='2023-04-01')
+    assert rows == before
+    assert {row[1] for row in rows} == {'Tornillo 5mm'}
@@ -0,0 +1,104 @@
+import csv
+import gzip
+
+import pytest
+
+from inventario_core import import_products
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def stock_of(db, codigo):
+    return db.fetch_product(db.product_id_by_code(codigo))[4]
+
+
+def movements_of(db, codigo):
+    return db.query("SELECT tipo, cantidad FROM movimientos WHERE producto_id = ? ORDER BY id",
+                    (db.product_id_by_code(codigo),))
+
+
+def test_insert_and_update(stocked, tmp_path):
+    path = write_csv(tmp_path / 'productos.csv',
+                     "Código;Nombre;Precio;Stock;Categoría\n"
+                     "P-001;Tornillo 3mm;0,75;4;Tornillos\n"   # existe: baja el stock
+                     "P-003;Tuerca;0.2;30;Tuercas\n")          # nuevo, con categoría nueva
+    report = import_products(stocked, path)
+
+    assert (report.inserted, report.updated, report.categories_created) == (1, 1, 1)
+    assert report.errors == []
+    assert report.processed == 2
+    assert stocked.fetch_product(stocked.product_id_by_code('P-001'))[3] == 0.75
+    assert stock_of(stocked, 'P-001') == 4
+    # El cambio de stock queda explicado por un movimiento
+    assert movements_of(stocked, 'P-001') == [('entrada', 10), ('salida', 6)]
+    assert movements_of(stocked, 'P-003') == [('entrada', 30)]
+    assert stocked.categories.id('Tuercas') is not None
+    assert stocked.inventory_summary()['productos'] == 3
+
+
+def test_invalid_rows_are_reported(db, tmp_path):
+    path = write_csv(tmp_path / 'productos.csv',
+                     "codigo,nombre,precio,stock\n"
+                     "P-1,Bueno,1,1\n"
+                     ",Sin código,1,1\n"
+                     "P-2,Precio malo,abc,1\n"
+                     "P-3,Stock decimal,1,1.5\n"
+                     "P-4,Negativo,1,-2\n"
+                     "\n"
+                     "P-5,Bueno también,2,0\n")
+    report = import_products(db, path)
+    assert report.inserted == 2
+    assert [line for line, _ in report.errors] == [3, 4, 5, 6]
+    assert db.count_products() == 2
+
+    errors = tmp_path / 'errores.csv'
+    report.write_errors(str(errors))
+    with open(errors, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["Línea", "Error"]
+    assert len(rows) == 5
+
+
+def test_unknown_category_without_creating(db, tmp_path):
+    path = write_csv(tmp_path / 'productos.csv', "codigo,nombre,precio,stock,categoria\nP-1,Uno,1,1,Nueva\n")
+    report = import_products(db, path, create_categories=False)
+    assert report.inserted == 0
+    assert report.errors == [(2, "Categoría no válida: Nueva")]
+
+
+@pytest.mark.parametrize('batch', [1, 2, 100])
+def test_duplicate_code_reports_earlier_row(db, tmp_path, batch):
+    path = write_csv(tmp_path / 'productos.csv',
+                     "codigo,nombre,precio,stock\n"
+                     "P-1,Primera,1,5\n"
+                     "P-2,Otro,1,1\n"
+                     "P-1,Segunda,1,8\n")
+    report = import_products(db, path, batch=batch)
+    assert db.fetch_product(db.product_id_by_code('P-1'))[2] == 'Segunda'
+    assert stock_of(db, 'P-1') == 8
+    if batch == 100:
+        # En el mismo lote la primera fila no se guarda: queda informada
+        assert report.errors == [(2, "Código duplicado en el archivo: P-1 (se usa la línea 4)")]
+        assert (report.inserted, report.updated) == (2, 0)
+    assert report.processed == 3
+
+
+def test_missing_columns(db, tmp_path):
+    path = write_csv(tmp_path / 'productos.csv', "codigo,nombre\nP-1,Uno\n")
+    with pytest.raises(ValueError, match="precio, stock"):
+        import_products(db, path)
+
+
+def test_gzip_and_cancel(db, tmp_path):
+    path = tmp_path / 'productos.csv.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        file.write("codigo,nombre,precio,stock\n" + "".join(f"P-{i},Producto {i},1,{i}\n" for i in range(10)))
+    report = import_products(db, str(path), batch=3, cancelled=lambda: db.count_products() >= 3)
+    assert report.cancelled
+    assert db.count_products() == 3
+    # El índice de búsqueda se regenera aunque se cancele
+    if db.fts_enabled:
+        assert len(db.search_product_ids('Producto')) == 3
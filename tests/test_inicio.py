@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import proyecto
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after(statement, modules):
+    """Módulos de ``modules`` que quedan cargados tras ejecutar ``statement`` en un intérprete nuevo"""
+    code = f"import sys; {statement}; print(' '.join(m for m in {modules!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, check=True)
+    return result.stdout.split()
+
+
+def test_window_module_defers_report_and_export_imports():
+    # fpdf y pypdf se cargan en la tarea del PDF; csv al exportar o importar
+    assert loaded_after("import proyecto", ('reportes', 'fpdf', 'pypdf', 'csv')) == []
+
+
+def test_core_does_not_load_csv():
+    assert loaded_after("import inventario_core", ('csv', 'tkinter')) == []
+
+
+def test_tabs_are_built_on_first_visit():
+    calls = []
+    app = SimpleNamespace(
+        notebook=SimpleNamespace(select=lambda: app.selected),
+        summary_frame='.resumen',
+        alert_frame='.alertas',
+        pending_tabs={'.movimientos': lambda: calls.append('construir movimientos'),
+                      '.resumen': lambda: calls.append('construir resumen')},
+        load_summary=lambda: calls.append('cargar resumen'),
+        load_alerts=lambda: calls.append('cargar alertas'),
+    )
+    for tab in ('.productos', '.resumen', '.movimientos', '.resumen', '.movimientos'):
+        app.selected = tab
+        proyecto.InventarioApp.on_tab_changed(app, None)
+    # Cada pestaña se construye una sola vez; el resumen se vuelve a leer en cada visita
+    assert calls == ['construir resumen', 'construir movimientos', 'cargar resumen']
+    assert app.pending_tabs == {}
@@ -0,0 +1,164 @@
+"""VirtualList sin pantalla: el Treeview y el scrollbar se reemplazan por objetos mínimos"""
+import pytest
+
+from proyecto import ProductColumns, ProductRow, ProductSource, VirtualList
+
+
+class Tree:
+    """Lo que VirtualList usa del Treeview, guardado en una lista"""
+
+    def __init__(self):
+        self.rows = []  # (iid, valores) en el orden en que se ven
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def delete(self, *iids):
+        gone = {str(iid) for iid in iids}
+        self.rows = [row for row in self.rows if str(row[0]) not in gone]
+
+    def insert(self, parent, index, values, iid):
+        self.rows.insert(index, (iid, tuple(values)))
+
+    def exists(self, iid):
+        return any(str(row[0]) == str(iid) for row in self.rows)
+
+    def selection_set(self, items):
+        pass
+
+    def after_idle(self, func):
+        func()
+
+
+class Scrollbar:
+    def configure(self, **kwargs):
+        pass
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+@pytest.fixture
+def catalog(db):
+    """60 productos 'Producto 00' ... 'Producto 59', en orden de nombre"""
+    db.insert_category('Tornillos')
+    for n in range(60):
+        db.insert_product(f"P-{n:02d}", f"Producto {n:02d}", 1.0, n, 'Tornillos')
+    return db
+
+
+@pytest.fixture
+def listing(catalog):
+    """Lista de 10 filas visibles desplazada a la posición 25"""
+    view = VirtualList(Tree(), Scrollbar())
+    view.visible = 10
+    view.set_source(ProductSource(catalog))
+    view.scroll_to(25)
+    return view
+
+
+def shown(view):
+    return [values[1] for _, values in view.tree.rows]
+
+
+def expected(db, view):
+    """Lo que mostraría la lista recargada desde la base en la misma posición"""
+    names = [row[2] for row in db.fetch_products_page(limit=1000)]
+    return names[view.offset:view.offset + view.visible]
+
+
+def no_reload(view, monkeypatch):
+    """Falla si la lista vuelve a contar las filas, como haría una recarga completa"""
+    def count():
+        raise AssertionError("recarga completa")
+    monkeypatch.setattr(view.source, 'count', count)
+
+
+def test_window_after_scrolling(catalog, listing):
+    assert shown(listing) == [f"Producto {n:02d}" for n in range(25, 35)]
+    assert listing.total == 60
+
+
+def test_insert_keeps_the_view_in_place(catalog, listing, monkeypatch):
+    no_reload(listing, monkeypatch)
+    # Antes de la vista: las filas visibles no se mueven
+    listing.insert_row(catalog.insert_product('N-1', 'Producto 10b', 1.0, 1, 'Tornillos'))
+    assert shown(listing)[0] == 'Producto 25'
+    # Dentro de la vista: aparece en su lugar
+    listing.insert_row(catalog.insert_product('N-2', 'Producto 27b', 1.0, 1, 'Tornillos'))
+    assert shown(listing)[:4] == ['Producto 25', 'Producto 26', 'Producto 27', 'Producto 27b']
+    assert listing.total == 62
+    assert shown(listing) == expected(catalog, listing)
+
+
+def test_update_moves_a_row_when_its_key_changes(catalog, listing, monkeypatch):
+    no_reload(listing, monkeypatch)
+    producto = catalog.fetch_product(catalog.product_id_by_code('P-30'))
+    # Sale de la vista hacia el final de la lista
+    listing.update_row(catalog.update_product(producto[0], 'P-30', 'Producto 99', 1.0, 30, 'Tornillos'))
+    assert 'Producto 30' not in shown(listing)
+    assert shown(listing) == expected(catalog, listing)
+    # Entra desde antes de la vista: ``old`` es la fila anterior, que no está en caché
+    old = catalog.fetch_product(catalog.product_id_by_code('P-05'))
+    listing.update_row(catalog.update_product(old[0], 'P-05', 'Producto 31b', 1.0, 5, 'Tornillos'), old)
+    assert 'Producto 31b' in shown(listing)
+    assert shown(listing) == expected(catalog, listing)
+    # Un cambio que no toca el orden solo repinta la fila
+    listing.update_row(catalog.update_product(old[0], 'P-05', 'Producto 31b', 2.5, 5, 'Tornillos'))
+    assert dict(listing.tree.rows)[old[0]][2] == 2.5
+
+
+def test_remove_rows(catalog, listing, monkeypatch):
+    no_reload(listing, monkeypatch)
+    rows = [catalog.delete_product(catalog.product_id_by_code(codigo)) for codigo in ('P-03', 'P-26', 'P-50')]
+    listing.remove_rows(rows)
+    assert listing.total == 57
+    assert 'Producto 26' not in shown(listing)
+    assert shown(listing) == expected(catalog, listing)
+
+
+def test_refresh_rows_rereads_only_cached_rows(catalog, listing):
+    producto_id = catalog.product_id_by_code('P-27')
+    catalog.apply_movements([('P-27', 'entrada', 5)])
+    listing.refresh_rows([producto_id, catalog.product_id_by_code('P-01')])
+    row = dict(listing.tree.rows)[producto_id]
+    assert row[3] == 32
+
+
+def test_product_columns_behave_like_a_list_of_rows(catalog):
+    rows = catalog.fetch_products_page(limit=5)
+    columns = ProductColumns(rows)
+    assert len(columns) == 5
+    assert list(columns) == rows
+    assert columns[1] == rows[1] and columns[-1] == rows[-1]
+    assert columns[1:3] == rows[1:3]
+    # Los números van en arrays compactos, no en objetos de Python por fila
+    assert (columns.ids.typecode, columns.precios.typecode, columns.stocks.typecode) == ('q', 'd', 'q')
+
+    extra = catalog.fetch_products_page(limit=3, offset=10)
+    expected = list(rows)
+    columns.extend(extra)
+    expected.extend(extra)
+    columns[:0] = extra[:1]
+    expected[:0] = extra[:1]
+    columns.insert(2, rows[4])
+    expected.insert(2, rows[4])
+    del columns[3:5]
+    del expected[3:5]
+    columns[0] = rows[0]
+    expected[0] = rows[0]
+    assert list(columns) == expected
+
+
+def test_product_columns_lookups(catalog):
+    rows = catalog.fetch_products_page(limit=5)
+    columns = ProductColumns(rows)
+    assert columns.index_of(rows[3][0]) == 3
+    row = columns.by_code(rows[2][1])
+    assert row.astuple() == rows[2]
+    assert isinstance(row, ProductRow) and isinstance(row.precio, float) and isinstance(row.stock, int)
+    assert columns.row(-1) is None and columns.by_code('NO-EXISTE') is None
+    # Las búsquedas se rehacen después de cambiar las filas
+    del columns[0]
+    assert columns.index_of(rows[3][0]) == 2
+    assert columns.index_of(rows[0][0]) is None
@@ -0,0 +1,198 @@
+import sqlite3
+
+import pytest
+
+from inventario_core import (
+    MIGRATIONS, InventarioDB, create_tables, import_products, migrate, schema_version,
+)
+
+# Esquema de la primera versión de la aplicación, antes de las migraciones
+BASELINE_SCHEMA = [
+    """CREATE TABLE categorias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL UNIQUE
+    )""",
+    """CREATE TABLE productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codigo TEXT NOT NULL UNIQUE,
+        nombre TEXT NOT NULL,
+        precio REAL NOT NULL,
+        stock INTEGER NOT NULL,
+        categoria_id INTEGER,
+        fecha_creacion TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (categoria_id) REFERENCES categorias(id)
+    )""",
+    """CREATE TABLE movimientos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER,
+        tipo TEXT NOT NULL,
+        cantidad INTEGER NOT NULL,
+        fecha TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (producto_id) REFERENCES productos(id)
+    )""",
+]
+
+
+def baseline_db(db_file, migrations=0):
+    conn = sqlite3.connect(db_file)
+    for sql in BASELINE_SCHEMA:
+        conn.execute(sql)
+    conn.execute("INSERT INTO categorias (nombre) VALUES ('Tornillos')")
+    conn.executemany("INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, 1)",
+                     [('P-001', 'Tornillo 3mm', 0.5, 10), ('P-002', 'Tornillo 5mm', 0.8, 2)])
+    conn.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (?, 'entrada', ?)",
+                     [(1, 10), (2, 2)])
+    conn.commit()
+    if migrations:
+        assert migrate(conn, MIGRATIONS[:migrations]) == migrations
+    conn.close()
+
+
+@pytest.mark.parametrize('start', range(len(MIGRATIONS)))
+def test_migrates_to_latest(db_file, start):
+    baseline_db(db_file, start)
+    db = InventarioDB(db_file)
+    try:
+        assert schema_version(db.conn) == len(MIGRATIONS) == 9
+        # Los datos existentes llegan a las tablas que mantienen los triggers
+        assert db.count_products() == 2
+        assert db.categories.items() == [(1, 'Tornillos')]
+        assert db.inventory_summary()['productos'] == 2
+        assert set(db.change_counters()) == {'categorias', 'productos'}
+        if db.fts_enabled:
+            assert list(db.search_product_ids('5mm')) == [2]
+        assert db.set_category_threshold(1, 5)
+        assert db.alert_count() == 1
+    finally:
+        db.close()
+
+
+def schema(conn):
+    """Objetos del esquema con el SQL sin diferencias de espacios"""
+    rows = conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")
+    return sorted((type_, name, " ".join((sql or '').split())) for type_, name, sql in rows)
+
+
+def test_walks_every_step(db_file, tmp_path):
+    baseline_db(db_file)
+    conn = sqlite3.connect(db_file)
+    try:
+        previous = schema(conn)
+        for step in range(1, len(MIGRATIONS) + 1):
+            assert migrate(conn, MIGRATIONS[:step]) == step
+            assert schema_version(conn) == step
+            # Cada paso cambia el esquema, sin perder datos ni dejar la base dañada
+            current = schema(conn)
+            assert current != previous
+            previous = current
+            assert conn.execute("PRAGMA integrity_check").fetchone() == ('ok',)
+            assert conn.execute("SELECT COUNT(*) FROM productos").fetchone() == (2,)
+            assert conn.execute("SELECT COUNT(*) FROM movimientos").fetchone() == (2,)
+            assert not conn.in_transaction
+        # Lo que no son migraciones (índice FTS5, tablas de resumen) lo agrega create_tables
+        create_tables(conn)
+        assert schema_version(conn) == len(MIGRATIONS)
+        previous = schema(conn)
+    finally:
+        conn.close()
+
+    # El resultado es el mismo esquema que el de una base nueva
+    fresh = sqlite3.connect(str(tmp_path / 'nueva.db'))
+    try:
+        create_tables(fresh)
+        assert schema(fresh) == previous
+    finally:
+        fresh.close()
+
+
+@pytest.mark.parametrize('sql, index', [
+    ("SELECT id FROM productos ORDER BY nombre, id LIMIT 10", 'idx_productos_nombre'),
+    ("SELECT id FROM productos WHERE categoria_id = 1", 'idx_productos_categoria'),
+    ("SELECT id FROM movimientos WHERE producto_id = 1 ORDER BY fecha DESC, id DESC", 'idx_movimientos_producto'),
+    ("SELECT id FROM movimientos ORDER BY fecha DESC, id DESC LIMIT 10", 'idx_movimientos_fecha'),
+    ("SELECT id FROM movimientos WHERE tipo = 'salida' ORDER BY fecha DESC, id DESC", 'idx_movimientos_tipo_fecha'),
+])
+def test_upgraded_database_uses_the_indexes(db_file, sql, index):
+    baseline_db(db_file)
+    conn = sqlite3.connect(db_file)
+    # Con dos filas el planificador prefiere ordenar: hace falta algo de volumen
+    conn.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, ?, 1, ?)",
+                     [(n % 2 + 1, ('entrada', 'salida')[n % 2], f"2023-{n % 12 + 1:02d}-10")
+                      for n in range(2000)])
+    conn.commit()
+    conn.close()
+    InventarioDB(db_file).close()  # migra y ejecuta ANALYZE
+    conn = sqlite3.connect(db_file)
+    try:
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+        assert index in plan
+        assert 'TEMP B-TREE' not in plan
+    finally:
+        conn.close()
+
+
+def test_migrations_are_idempotent(db_file):
+    baseline_db(db_file)
+    InventarioDB(db_file).close()
+    conn = sqlite3.connect(db_file)
+    try:
+        create_tables(conn)
+        assert schema_version(conn) == len(MIGRATIONS)
+    finally:
+        conn.close()
+
+
+def test_newer_database_is_left_alone(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute(f"PRAGMA user_version = {len(MIGRATIONS) + 1}")
+    assert migrate(conn) == len(MIGRATIONS) + 1
+    conn.close()
+
+
+def test_counters_follow_writes(db):
+    before = db.change_counters()
+    db.insert_category('Tornillos')
+    producto = db.insert_product('P-1', 'Tornillo', 1.0, 5, 'Tornillos')
+    db.update_product(producto[0], 'P-1', 'Tornillo', 1.0, 7, 'Tornillos')
+    db.delete_product(producto[0])
+    after = db.change_counters()
+    assert after['categorias'] == before['categorias'] + 1
+    assert after['productos'] == before['productos'] + 3
+
+
+def test_import_bumps_product_counter_once_per_batch(db, tmp_path):
+    path = tmp_path / 'productos.csv'
+    path.write_text("codigo,nombre,precio,stock\n" +
+                    "".join(f"P-{i},Producto {i},1.5,{i}\n" for i in range(25)), encoding='utf-8')
+    before = db.change_counters()['productos']
+
+    report = import_products(db, str(path), batch=10)
+    assert report.inserted == 25
+    assert db.change_counters()['productos'] == before + 3
+    assert db.query_one("SELECT COUNT(*) FROM contadores_pausa")[0] == 0
+
+    cookie = db.query_one("PRAGMA schema_version")[0]
+    # La pausa es un dato: un lote no cambia el esquema (con varios lotes
+    # sí se quitan y se vuelven a crear los triggers del índice FTS5)
+    report = import_products(db, str(path), batch=100)
+    assert report.updated == 25
+    assert db.change_counters()['productos'] == before + 4
+    assert db.query_one("PRAGMA schema_version")[0] == cookie
+    # Fuera de la importación los triggers siguen contando cada cambio
+    db.execute("UPDATE productos SET precio = 2 WHERE codigo = 'P-1'")
+    db.conn.commit()
+    assert db.change_counters()['productos'] == before + 5
+
+
+def test_failed_batch_does_not_leave_the_counter_paused(db):
+    from inventario_core import counted_once
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            with counted_once(db):
+                raise RuntimeError("falla el lote")
+    assert db.query_one("SELECT COUNT(*) FROM contadores_pausa")[0] == 0
+    before = db.change_counters()['productos']
+    db.insert_category('Tornillos')
+    db.insert_product('P-1', 'Tornillo', 1.0, 1, 'Tornillos')
+    assert db.change_counters()['productos'] == before + 1
@@ -0,0 +1,74 @@
+import pytest
+
+from inventario_core import MovementBatchError, parse_movement_text
+
+
+def stock(db):
+    return {row[1]: row[4] for row in db.fetch_products_page(limit=100)}
+
+
+def movement_count(db):
+    return db.query_one("SELECT COUNT(*) FROM movimientos")[0]
+
+
+def test_batch_applies_all_lines(stocked):
+    result = stocked.apply_movements([('P-001', 'salida', 4), ('P-002', 'entrada', 6), ('P-001', 'entrada', 1)])
+    assert stock(stocked) == {'P-001': 7, 'P-002': 10}
+    assert result == {stocked.product_id_by_code('P-001'): 7, stocked.product_id_by_code('P-002'): 10}
+    assert stocked.inventory_summary()['unidades'] == 17
+
+
+def test_negative_stock_rejects_the_whole_batch(stocked):
+    before = movement_count(stocked)
+    with pytest.raises(MovementBatchError) as error:
+        stocked.apply_movements([('P-001', 'entrada', 5), ('P-002', 'salida', 5)])
+    assert error.value.errors == [(2, "Stock insuficiente de P-002: hay 4, salen 5")]
+    # Ni siquiera la entrada válida se aplicó
+    assert stock(stocked) == {'P-001': 10, 'P-002': 4}
+    assert movement_count(stocked) == before
+
+
+def test_lines_use_the_running_stock(stocked):
+    # La salida no puede apoyarse en una entrada posterior de la misma planilla
+    with pytest.raises(MovementBatchError) as error:
+        stocked.apply_movements([('P-002', 'salida', 3), ('P-002', 'salida', 3), ('P-002', 'entrada', 10)])
+    assert [line for line, _ in error.value.errors] == [2]
+    stocked.apply_movements([('P-002', 'entrada', 10), ('P-002', 'salida', 3), ('P-002', 'salida', 3)])
+    assert stock(stocked)['P-002'] == 8
+
+
+@pytest.mark.parametrize('line, message', [
+    (('P-001', 'robo', 1), "Tipo no válido"),
+    (('P-001', 'salida', 0), "mayor que cero"),
+    (('P-001', 'salida', -3), "mayor que cero"),
+    (('P-001', 'salida', 1.5), "mayor que cero"),
+    (('P-001', 'entrada', True), "mayor que cero"),
+    (('NO-EXISTE', 'entrada', 1), "No existe un producto"),
+])
+def test_invalid_lines(stocked, line, message):
+    with pytest.raises(MovementBatchError, match=message):
+        stocked.apply_movements([line])
+    assert stock(stocked) == {'P-001': 10, 'P-002': 4}
+
+
+def test_sheet_errors_reject_the_batch(stocked):
+    lines, numbers, errors = parse_movement_text("codigo;cantidad\nP-001;2\nP-002;abc\n;4\n", 'salida')
+    assert lines == [('P-001', 'salida', 2)]
+    assert numbers == [2]
+    assert errors == [(3, "La cantidad debe ser un número"), (4, "Falta el código")]
+    with pytest.raises(MovementBatchError) as error:
+        stocked.apply_movements(lines, numbers, errors)
+    assert [line for line, _ in error.value.errors] == [3, 4]
+    assert stock(stocked)['P-001'] == 10
+
+
+def test_empty_batch(db):
+    with pytest.raises(ValueError):
+        db.apply_movements([])
+
+
+def test_alerts_follow_movements(stocked):
+    stocked.set_category_threshold(stocked.categories.id('Tornillos'), 5)
+    assert stocked.alert_count() == 1
+    stocked.apply_movements([('P-002', 'entrada', 3), ('P-001', 'salida', 8)])
+    assert [row[1] for row in stocked.stock_alerts()] == ['P-001']
@@ -0,0 +1,101 @@
+import csv
+
+import pytest
+
+from inventario_core import (
+    MOVEMENT_SORTS, PRODUCT_SORT, PRODUCT_SORTS, export_products_csv, order_sql, sort_key, sort_order,
+)
+
+
+@pytest.fixture
+def varied(db):
+    db.insert_category('Tornillos')
+    for codigo, nombre, precio, stock in [('C', 'Arandela', 3.0, 5), ('A', 'Clavo', 1.0, 5),
+                                          ('B', 'Broca', 2.0, 1), ('D', 'Arandela', 0.5, 9)]:
+        db.insert_product(codigo, nombre, precio, stock, 'Tornillos')
+    return db
+
+
+def test_sort_order_parsing():
+    assert sort_order('precio', PRODUCT_SORTS, PRODUCT_SORT) == (('p.precio', 'p.id'), (3, 0), False)
+    assert sort_order('-stock', PRODUCT_SORTS, PRODUCT_SORT)[2] is True
+    assert sort_order(None, PRODUCT_SORTS, PRODUCT_SORT)[0] == ('p.nombre', 'p.id')
+    assert order_sql(('p.precio', 'p.id'), True) == "p.precio DESC, p.id DESC"
+    assert order_sql(('p.precio', 'p.id'), True, reverse=True) == "p.precio ASC, p.id ASC"
+
+
+@pytest.mark.parametrize('sort', ['categoria', 'precio; DROP TABLE productos', 'tipo'])
+def test_invalid_sort_is_rejected(varied, sort):
+    with pytest.raises(ValueError, match="Orden no válido"):
+        varied.fetch_products_page(sort=sort)
+    with pytest.raises(ValueError):
+        varied.search_product_ids('a', sort=sort)
+    assert varied.count_products() == 4
+
+
+def test_invalid_movement_sort(varied):
+    with pytest.raises(ValueError):
+        varied.fetch_movements_page(sort='precio')
+    assert sort_order('-tipo', MOVEMENT_SORTS, '-fecha')[2] is True
+
+
+@pytest.mark.parametrize('sort, expected', [
+    (None, ['C', 'D', 'B', 'A']),          # nombre, empate resuelto por id
+    ('-nombre', ['A', 'B', 'D', 'C']),
+    ('precio', ['D', 'A', 'B', 'C']),
+    ('-precio', ['C', 'B', 'A', 'D']),
+    ('stock', ['B', 'C', 'A', 'D']),
+    ('codigo', ['A', 'B', 'C', 'D']),
+])
+def test_pages_follow_the_sort(varied, sort, expected):
+    assert [row[1] for row in varied.fetch_products_page(sort=sort)] == expected
+    # Página a página con la clave de la última fila da el mismo orden
+    key = sort_key(sort, PRODUCT_SORTS, PRODUCT_SORT)
+    rows, after = [], None
+    while True:
+        page = varied.fetch_products_page(after, 1, sort=sort)
+        if not page:
+            break
+        rows += page
+        after = key(page[-1])
+    assert [row[1] for row in rows] == expected
+    assert [row[1] for rows in varied.iter_products(batch=3, sort=sort) for row in rows] == expected
+    # Todos los nombres tienen una 'a': la búsqueda ordenada da la misma lista
+    assert [varied.fetch_product(i)[1] for i in varied.search_product_ids('a', sort=sort or 'nombre')] == expected
+
+
+def test_export_uses_the_sort(varied, tmp_path):
+    path = tmp_path / 'productos.csv'
+    assert export_products_csv(varied, str(path), sort='-precio', batch=2) == 4
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = list(csv.reader(file))[1:]
+    assert [row[0] for row in rows] == ['C', 'B', 'A', 'D']
+
+
+def test_report_uses_the_sort(varied, tmp_path):
+    pytest.importorskip('fpdf')
+    from reportes import InventoryReport
+
+    sorts = []
+    iter_products = varied.iter_products
+
+    def spy(search=None, batch=1000, after=None, sort=None):
+        sorts.append(sort)
+        return iter_products(search, batch, after, sort)
+
+    varied.iter_products = spy
+    report = InventoryReport(varied, workers=1, sort='-precio')
+    stats = report.build(str(tmp_path / 'productos.pdf'))
+    assert stats['rows'] == 4
+    assert sorts == ['-precio']
+    assert (tmp_path / 'productos.pdf').read_bytes().startswith(b'%PDF')
+
+
+def test_cli_descending_sort():
+    import cli
+
+    # Con espacio argparse toma '-precio' por una opción: se escribe con '='
+    args = cli.build_parser().parse_args(['exportar', 'productos.csv', '--orden=-precio'])
+    assert args.orden == '-precio'
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['reporte', 'productos.pdf', '--orden=-categoria'])
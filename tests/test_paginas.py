@@ -0,0 +1,97 @@
+import pytest
+
+from inventario_core import PRODUCT_SORTS, sort_key
+from proyecto import ProductSource, SearchSource
+
+
+@pytest.fixture
+def catalog(db):
+    """130 productos con nombres y precios repetidos: el id desempata"""
+    db.insert_category('Tornillos')
+    categoria_id = db.categories.id('Tornillos')
+    names = ('Tornillo', 'Tuerca', 'Arandela')
+    with db.transaction():
+        db.executemany(
+            "INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, ?)",
+            [(f"P-{n:03d}", f"{names[n % 3]} {n % 40:02d}", float(n % 7), n % 11, categoria_id)
+             for n in range(130)],
+        )
+    return db
+
+
+def full(db, sort=None, search=None):
+    return db.fetch_products_page(limit=1000, search=search, sort=sort)
+
+
+def forward(db, limit, sort=None, search=None):
+    key = sort_key(sort, PRODUCT_SORTS, 'nombre')
+    rows, after = [], None
+    while True:
+        page = db.fetch_products_page(after, limit, search=search, sort=sort)
+        rows += page
+        if len(page) < limit:
+            return rows
+        after = key(page[-1])
+
+
+@pytest.mark.parametrize('sort', [None, '-nombre', 'precio', '-stock', 'codigo'])
+@pytest.mark.parametrize('limit', [1, 7, 50])
+def test_windows_cover_the_list_once(catalog, sort, limit):
+    rows = full(catalog, sort)
+    assert len(rows) == 130
+    assert forward(catalog, limit, sort) == rows
+
+
+@pytest.mark.parametrize('sort', [None, '-precio'])
+def test_reverse_window_ends_before_the_key(catalog, sort):
+    rows = full(catalog, sort)
+    key = sort_key(sort, PRODUCT_SORTS, 'nombre')
+    for end in (1, 20, 129):
+        page = catalog.fetch_products_page(key(rows[end]), 15, reverse=True, sort=sort)
+        assert page == rows[max(0, end - 15):end]
+
+
+@pytest.mark.parametrize('sort', [None, 'precio', '-stock'])
+@pytest.mark.parametrize('step', [1, 10, 37])
+def test_anchors_start_windows_anywhere(catalog, sort, step):
+    rows = full(catalog, sort)
+    key = sort_key(sort, PRODUCT_SORTS, 'nombre')
+    anchors = catalog.product_anchor_keys(step, sort=sort)
+    assert [tuple(anchor) for anchor in anchors] == [key(rows[n - 1]) for n in range(step, 131, step)]
+
+    # Como en VirtualList._jump: la fila de una posición sale del ancla más cercana y un desplazamiento
+    for target in (0, step, 64, 129):
+        i = target // step
+        after = tuple(anchors[i - 1]) if i else None
+        assert catalog.fetch_products_page(after, 5, target - i * step, sort=sort) == rows[target:target + 5]
+
+    positions = [1, 2, 65, 130]
+    keys = catalog.product_keys_at(positions, sort=sort)
+    assert [tuple(k) for k in keys] == [key(rows[n - 1]) for n in positions]
+
+
+def test_windows_with_a_search(catalog):
+    rows = full(catalog, search='tuerca')
+    assert len(rows) == 43
+    assert forward(catalog, 6, search='tuerca') == rows
+    anchors = catalog.product_anchor_keys(8, search='tuerca')
+    key = sort_key(None, PRODUCT_SORTS, 'nombre')
+    assert [tuple(anchor) for anchor in anchors] == [key(rows[n - 1]) for n in range(8, 44, 8)]
+
+
+def test_sources_page_the_same_way(catalog):
+    source = ProductSource(catalog, sort='-precio')
+    rows = full(catalog, '-precio')
+    assert source.count() == 130
+    page = source.page(source.key(rows[9]), 10)
+    assert page == rows[10:20]
+    assert source.page(source.key(rows[20]), 10, reverse=True) == rows[10:20]
+
+    # Resultado de búsqueda: la clave es la posición en la lista de id
+    ids = [row[0] for row in reversed(rows)]
+    search = SearchSource(catalog, ids)
+    assert [row[0] for row in search.page(None, 5)] == ids[:5]
+    assert [row[0] for row in search.page(4, 5)] == ids[5:10]
+    assert [row[0] for row in search.page(10, 5, reverse=True)] == ids[5:10]
+    assert search.anchor_keys(50) == [49, 99]
+    assert search.key(search.page(49, 1)[0]) == 50
@@ -0,0 +1,71 @@
+import re
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from reportes import InventoryReport  # noqa: E402
+
+
+@pytest.fixture
+def catalog(db):
+    """200 productos: nueve páginas de reporte"""
+    db.insert_category('Tornillos')
+    categoria_id = db.categories.id('Tornillos')
+    with db.transaction():
+        db.executemany(
+            "INSERT INTO productos (codigo, nombre, precio, stock, categoria_id) VALUES (?, ?, ?, ?, ?)",
+            [(f"P-{n:03d}", f"Tornillo {n:03d}", 0.5, n, categoria_id) for n in range(200)],
+        )
+    return db
+
+
+def read(path):
+    """(páginas, códigos en el orden en que aparecen, pies de página)"""
+    reader = pypdf.PdfReader(str(path))
+    text = "\n".join(page.extract_text() for page in reader.pages)
+    return len(reader.pages), re.findall(r"P-\d{3}", text), re.findall(r"Página (\d+) de (\d+)", text)
+
+
+def test_layout_and_plan(catalog):
+    report = InventoryReport(catalog, workers=3, chunk_pages=2)
+    layout = report.compute_layout()
+    assert layout['total_rows'] == 200
+    rows = layout['rows_first'] + (layout['table_pages'] - 1) * layout['rows_per_page']
+    assert rows >= 200 > rows - layout['rows_per_page']
+
+    jobs = report.plan(layout)
+    # Tramos contiguos que cubren todas las páginas, cada uno con su primera fila
+    assert jobs[0] == (1, 2, 0)
+    assert [first for first, _, _ in jobs[1:]] == [last + 1 for _, last, _ in jobs[:-1]]
+    assert jobs[-1][1] == layout['total_pages']
+    for first, _, start in jobs[1:]:
+        assert start == layout['rows_first'] + (first - 2) * layout['rows_per_page']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_every_row_once_in_order(catalog, tmp_path, workers):
+    path = tmp_path / 'reporte.pdf'
+    report = InventoryReport(catalog, workers=workers, chunk_pages=2)
+    stats = report.build(str(path))
+    assert stats['rows'] == 200
+
+    pages, codes, footers = read(path)
+    assert pages == stats['pages'] == report.compute_layout()['total_pages']
+    assert codes == [f"P-{n:03d}" for n in range(200)]
+    # La numeración sigue entre los tramos generados por procesos distintos
+    assert footers == [(str(n), str(pages)) for n in range(1, pages + 1)]
+
+
+def test_search_report(catalog, tmp_path):
+    path = tmp_path / 'reporte.pdf'
+    expected = [row[1] for row in catalog.fetch_products_page(limit=1000, search='tornillo 01')]
+    stats = InventoryReport(catalog, search='tornillo 01', workers=1).build(str(path))
+    assert (stats['rows'], stats['pages']) == (len(expected), 1)
+    assert read(path)[1] == expected
+
+
+def test_cancel(catalog, tmp_path):
+    path = tmp_path / 'reporte.pdf'
+    assert InventoryReport(catalog, workers=1, chunk_pages=2).build(str(path), cancelled=lambda: True) is None
+    assert not path.exists()
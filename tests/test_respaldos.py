@@ -0,0 +1,107 @@
+import gzip
+import os
+
+import pytest
+
+from inventario_core import InventarioDB, archive_movements, archive_path
+from respaldos import backup_database, restore_backup, rotate_backups, verify_backup
+
+
+@pytest.fixture
+def backups(tmp_path):
+    return str(tmp_path / 'respaldos')
+
+
+def test_backup_and_verify(stocked, db_file, backups):
+    stats = backup_database(db_file, backups)
+    [path] = stats['archivos']
+    assert path.endswith('.db.gz')
+    info = verify_backup(path, full=True)
+    assert info['productos'] == 2
+    assert info['categorias'] == 1
+
+
+def test_verify_rejects_damaged_backup(stocked, db_file, backups):
+    [path] = backup_database(db_file, backups)['archivos']
+    with open(path, 'r+b') as file:
+        file.seek(20)
+        file.write(b'\0' * 64)
+    with pytest.raises(ValueError):
+        verify_backup(path)
+
+    not_a_db = os.path.join(backups, 'inventario-20250101-000000.db.gz')
+    with gzip.open(not_a_db, 'wb') as file:
+        file.write(b'esto no es una base' * 100)
+    with pytest.raises(ValueError, match="dañado"):
+        verify_backup(not_a_db)
+
+
+def test_backups_in_the_same_second_do_not_overwrite(stocked, db_file, backups):
+    paths = [backup_database(db_file, backups, keep=None)['archivos'][0] for _ in range(3)]
+    assert len(set(paths)) == 3
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_rotation_keeps_newest(stocked, db_file, backups):
+    paths = [backup_database(db_file, backups, keep=None)['archivos'][0] for _ in range(4)]
+    removed = rotate_backups(backups, 'inventario', keep=2)
+    assert sorted(removed) == sorted(paths[:2])
+    assert sorted(os.listdir(backups)) == sorted(os.path.basename(path) for path in paths[2:])
+
+
+def test_restore(stocked, db_file, backups):
+    [path] = backup_database(db_file, backups)['archivos']
+    stocked.insert_product('P-003', 'Tuerca', 0.2, 7, 'Tornillos')
+    before = stocked.change_counters()
+    stocked.close()
+
+    result = restore_backup(path, db_file, backups)
+    # El respaldo de seguridad se toma en el mismo segundo y no pisa el elegido
+    assert result['respaldo_previo'] != [path]
+    assert os.path.exists(path)
+    assert verify_backup(result['respaldo_previo'][0])['productos'] == 3
+    assert verify_backup(path)['productos'] == 2
+
+    db = InventarioDB(db_file)
+    try:
+        assert db.count_products() == 2
+        after = db.change_counters()
+        # Los contadores nunca vuelven atrás al restaurar
+        assert all(after[nombre] > valor for nombre, valor in before.items())
+    finally:
+        db.close()
+
+
+def test_restore_missing_backup(db_file, backups):
+    with pytest.raises(ValueError):
+        restore_backup(os.path.join(backups, 'no-existe.db.gz'), db_file, backups)
+
+
+@pytest.mark.parametrize('keep_current', [True, False])
+def test_restore_without_archive_sets_the_current_one_aside(stocked, db_file, backups, keep_current):
+    # Respaldo tomado antes de archivar: no tiene archivo del historial
+    [path] = backup_database(db_file, backups)['archivos']
+    producto_id = stocked.product_id_by_code('P-001')
+    with stocked.transaction():
+        stocked.execute("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) "
+                        "VALUES (?, 'entrada', 1, '2023-01-10 12:00:00')", (producto_id,))
+    archive_movements(stocked, '2023-07-01')
+    stocked.close()
+    assert os.path.exists(archive_path(db_file))
+
+    result = restore_backup(path, db_file, backups, keep_current=keep_current)
+    assert result['historial'] is None
+    assert not os.path.exists(archive_path(db_file))
+    # El historial apartado sigue disponible como un respaldo más
+    aside = result['historial_apartado']
+    assert os.path.basename(aside).startswith('inventario_archivo-')
+    assert verify_backup(aside)['movimientos'] == 1
+    if keep_current:
+        assert aside in result['respaldo_previo']
+
+    db = InventarioDB(db_file)
+    try:
+        assert db.archive_cutoff() is None
+        assert not db.attach_archive()
+    finally:
+        db.close()
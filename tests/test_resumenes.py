@@ -0,0 +1,90 @@
+import pytest
+
+
+def totals(db):
+    """Lo que mantienen los triggers, sin las filas que quedaron en cero"""
+    categorias = {row[0]: tuple(row[1:]) for row in db.query(
+        "SELECT categoria_id, productos, unidades, valor FROM resumen_categorias WHERE productos > 0")}
+    productos = {row[0]: tuple(row[1:]) for row in db.query(
+        "SELECT producto_id, entradas, salidas, n_entradas, n_salidas, ultimo_movimiento FROM resumen_productos")}
+    tipos = {row[0]: tuple(row[1:]) for row in db.query(
+        "SELECT tipo, movimientos, cantidad FROM resumen_tipos WHERE movimientos > 0")}
+    return categorias, productos, tipos
+
+
+def aggregates(db):
+    """Los mismos totales calculados desde las tablas"""
+    categorias = {row[0]: (row[1], row[2], pytest.approx(row[3])) for row in db.query(
+        "SELECT IFNULL(categoria_id, 0), COUNT(*), SUM(stock), SUM(precio * stock) "
+        "FROM productos GROUP BY IFNULL(categoria_id, 0)")}
+    productos = {row[0]: tuple(row[1:]) for row in db.query(
+        """SELECT producto_id,
+                  SUM(CASE WHEN tipo = 'entrada' THEN cantidad ELSE 0 END),
+                  SUM(CASE WHEN tipo = 'salida' THEN cantidad ELSE 0 END),
+                  SUM(tipo = 'entrada'), SUM(tipo = 'salida'), MAX(fecha)
+           FROM movimientos GROUP BY producto_id""")}
+    tipos = {row[0]: tuple(row[1:]) for row in db.query(
+        "SELECT tipo, COUNT(*), SUM(cantidad) FROM movimientos GROUP BY tipo")}
+    return categorias, productos, tipos
+
+
+def check(db):
+    assert totals(db) == aggregates(db)
+
+
+@pytest.fixture
+def shop(stocked):
+    stocked.insert_category('Pinturas')
+    stocked.insert_product('PB-1', 'Pintura blanca', 12.5, 3, 'Pinturas')
+    return stocked
+
+
+def test_insert(shop):
+    check(shop)
+    summary = shop.inventory_summary()
+    assert summary['productos'] == 3
+    assert summary['unidades'] == 17
+    assert summary['valor'] == pytest.approx(0.5 * 10 + 0.8 * 4 + 12.5 * 3)
+    assert summary['entrada'] == (3, 17)
+
+
+def test_update_price_stock_and_category(shop):
+    producto_id = shop.product_id_by_code('P-001')
+    shop.update_product(producto_id, 'P-001', 'Tornillo 3mm', 0.75, 6, 'Pinturas')
+    check(shop)
+    assert shop.inventory_summary()['salida'] == (1, 4)
+    by_name = {row[0]: row[1:] for row in shop.category_summary()}
+    assert by_name['Pinturas'] == (2, 9, pytest.approx(12.5 * 3 + 0.75 * 6))
+    assert by_name['Tornillos'] == (1, 4, pytest.approx(0.8 * 4))
+
+
+def test_movements(shop):
+    shop.apply_movements([('P-001', 'salida', 3), ('PB-1', 'entrada', 5), ('P-001', 'entrada', 1)])
+    check(shop)
+    producto_id = shop.product_id_by_code('P-001')
+    entradas, salidas, n_entradas, n_salidas, _ = shop.product_summary(producto_id)
+    assert (entradas, salidas, n_entradas, n_salidas) == (11, 3, 2, 1)
+
+
+def test_delete_product_and_category(shop):
+    producto_id = shop.product_id_by_code('PB-1')
+    shop.apply_movements([('PB-1', 'salida', 1)])
+    shop.delete_product(producto_id)
+    check(shop)
+    assert shop.product_summary(producto_id) == (0, 0, 0, 0, None)
+
+    # Sin categoría los productos se cuentan aparte
+    shop.delete_category(shop.categories.id('Tornillos'))
+    check(shop)
+    assert shop.category_summary() == [('Sin categoría', 2, 14, pytest.approx(0.5 * 10 + 0.8 * 4))]
+
+
+def test_rebuild_matches_the_triggers(shop):
+    shop.apply_movements([('P-002', 'salida', 2)])
+    shop.update_product(shop.product_id_by_code('PB-1'), 'PB-1', 'Pintura blanca', 13.0, 3, 'Tornillos')
+    categorias, productos, tipos = totals(shop)
+    shop.rebuild_summaries()
+    rebuilt = totals(shop)
+    assert rebuilt[1:] == (productos, tipos)
+    assert rebuilt[0] == {key: (n, unidades, pytest.approx(valor))
+                          for key, (n, unidades, valor) in categorias.items()}
@@ -0,0 +1,198 @@
+import asyncio
+import http.client
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from servidor import InventarioServer
+
+
+@pytest.fixture
+def server(db_file):
+    """Servidor en un hilo con su propio bucle, en un puerto libre"""
+    server = InventarioServer(db_file, port=0, readers=2)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+        loop.run_until_complete(server.close())
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    yield server
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+def request(server, method, path, body=None, raw=None):
+    conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+    try:
+        data = raw if raw is not None else (json.dumps(body) if body is not None else None)
+        conn.request(method, path, data, {'Content-Type': 'application/json'} if data is not None else {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def test_create_and_read_product(server):
+    assert request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})[0] == 200
+    status, payload = request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1.5, 'stock': 3, 'categoria': 'Tornillos'})
+    assert status == 200
+    producto_id = payload['resultado'][0]
+    assert request(server, 'GET', f'/productos/{producto_id}')[1]['resultado'][1] == 'P-1'
+
+
+@pytest.mark.parametrize('raw', ['5', '[1, 2]', '"texto"', 'null'])
+def test_body_must_be_object(server, raw):
+    status, payload = request(server, 'POST', '/productos', raw=raw)
+    assert status == 400
+    assert 'objeto JSON' in payload['error']
+
+
+def test_invalid_json_body(server):
+    assert request(server, 'POST', '/productos', raw='{no es json')[0] == 400
+
+
+@pytest.mark.parametrize('path', ['/productos?despues=5', '/productos?despues=%22x%22',
+                                  '/movimientos?antes=5', '/productos/por-ids?ids=7'])
+def test_json_params_must_be_lists(server, path):
+    status, payload = request(server, 'GET', path)
+    assert status == 400
+    assert 'lista JSON' in payload['error']
+
+
+@pytest.mark.parametrize('stock', [1.5, True, 'diez'])
+def test_stock_must_be_integer(server, stock):
+    request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})
+    status, _ = request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': stock, 'categoria': 'Tornillos'})
+    assert status == 400
+    assert request(server, 'GET', '/productos/total')[1]['resultado'] == 0
+
+
+def test_integral_float_stock_is_accepted(server):
+    request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})
+    status, payload = request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': 2.0, 'categoria': 'Tornillos'})
+    assert status == 200
+    assert payload['resultado'][4] == 2
+
+
+def test_validation_error_is_400(server):
+    status, payload = request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': 1, 'categoria': 'No existe'})
+    assert status == 400
+    assert payload['error'] == "Categoría no válida"
+
+
+def test_unknown_route_and_method(server):
+    assert request(server, 'GET', '/nada')[0] == 404
+    assert request(server, 'DELETE', '/productos')[0] == 405
+
+
+def test_unexpected_error_is_500(server, monkeypatch):
+    def broken(query, body):
+        raise TypeError("roto")
+
+    monkeypatch.setattr(server, 'routes', [(m, p, broken if p.pattern == '/estado$' else f)
+                                           for m, p, f in server.routes])
+    status, payload = request(server, 'GET', '/estado')
+    assert status == 500
+    assert 'roto' in payload['error']
+    # La conexión sigue sirviendo peticiones
+    assert request(server, 'GET', '/productos/total')[0] == 200
+
+
+def test_batch_rejection_keeps_details(server):
+    request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})
+    request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': 2, 'categoria': 'Tornillos'})
+    status, payload = request(server, 'POST', '/movimientos/lote', {'lineas': [['P-1', 'salida', 5]]})
+    assert status == 400
+    assert payload['detalle'][0][0] == 1
+
+
+def test_failed_write_does_not_sink_its_group(db_file):
+    """Una escritura que lanza una excepción cualquiera solo falla ella"""
+    from inventario_core import InventarioDB
+
+    async def scenario():
+        server = InventarioServer(db_file, port=0, readers=1)
+        await server.start()
+        try:
+            await server.writer.submit(InventarioDB.insert_category, 'Tornillos')
+
+            def broken(db):
+                db.execute("INSERT INTO categorias (nombre) VALUES ('Fantasma')")
+                raise KeyError('fallo')
+
+            def broken_in_transaction(db):
+                with db.transaction():
+                    db.execute("INSERT INTO categorias (nombre) VALUES ('Fantasma 2')")
+                    raise KeyError('fallo')
+
+            # Encoladas juntas para que el escritor las confirme en un mismo grupo
+            results = await asyncio.gather(
+                server.writer.submit(InventarioDB.insert_category, 'Clavos'),
+                server.writer.submit(broken),
+                server.writer.submit(broken_in_transaction),
+                server.writer.submit(InventarioDB.insert_category, 'Tuercas'),
+                return_exceptions=True,
+            )
+            assert results[0][1] == 'Clavos'
+            assert isinstance(results[1], KeyError)
+            assert isinstance(results[2], KeyError)
+            assert results[3][1] == 'Tuercas'
+            return await server.readers.run(lambda db: [nombre for _, nombre in db.categories.items()])
+        finally:
+            await server.close()
+
+    assert asyncio.run(scenario()) == ['Clavos', 'Tornillos', 'Tuercas']
+
+
+def test_delete_after_archive_created_elsewhere(server, db_file):
+    """cli.py archivar crea el archivo con el servidor ya en marcha"""
+    from inventario_core import InventarioDB, archive_movements, archive_path
+
+    request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})
+    producto_id = request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': 2, 'categoria': 'Tornillos'})[1]['resultado'][0]
+    db = InventarioDB(db_file)
+    try:
+        with db.transaction():
+            db.execute("UPDATE movimientos SET fecha = '2023-01-10 12:00:00'")
+        archive_movements(db, '2024-01-01')
+    finally:
+        db.close()
+
+    assert request(server, 'DELETE', f'/productos/{producto_id}')[0] == 200
+    conn = sqlite3.connect(archive_path(db_file))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM movimientos").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('path', ['/productos/buscar?q=%20%20', '/productos/indice?q=%20', '/productos/buscar'])
+def test_blank_search_is_400(server, path):
+    status, payload = request(server, 'GET', path)
+    assert status == 400
+    assert payload['error'] == "Falta el parámetro q"
+
+
+def test_blank_filter_lists_everything(server):
+    request(server, 'POST', '/categorias', {'nombre': 'Tornillos'})
+    request(server, 'POST', '/productos', {
+        'codigo': 'P-1', 'nombre': 'Tornillo', 'precio': 1, 'stock': 2, 'categoria': 'Tornillos'})
+    assert request(server, 'GET', '/productos/total?buscar=%20')[1]['resultado'] == 1
+    assert len(request(server, 'GET', '/productos?buscar=%20%20')[1]['resultado']) == 1